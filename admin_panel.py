@@ -1,11 +1,18 @@
 import logging
+from datetime import date, datetime
 from aiogram import Bot, types, F, Router
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from sqlalchemy import select, delete
 from database import DatabaseManager, Category, Title, Product, Size, ProductSize, Order, Settings
-from config import ADMIN_IDS, BOT2_TOKEN
+from catalog_cache import catalog_cache
+from keyboard_cache import keyboard_cache
+from catalog_service import delete_category, delete_title, link_size_to_all_products, link_all_sizes_to_product
+from order_service import OrderFilter, list_orders
+from shop_stats import get_shop_stats, revenue_by_day, revenue_by_delivery_method
+from config import ADMIN_IDS, BOT2_TOKEN, DELIVERY_METHODS
 
 # Роутер админ-панели (подключается в главный dp)
 router = Router()
@@ -35,6 +42,8 @@ class AdminStates(StatesGroup):
     waiting_description_text = State()
     waiting_description_photo = State()
     waiting_description_video = State()
+    waiting_orders_period = State()
+    waiting_orders_user = State()
 
 def is_admin(user_id):
     """Проверка прав администратора"""
@@ -47,15 +56,17 @@ def get_admin_keyboard():
         [InlineKeyboardButton(text="🛍️ Управление товарами", callback_data="admin_products")],
         [InlineKeyboardButton(text="📏 Управление размерами", callback_data="admin_sizes")],
         [InlineKeyboardButton(text="📝 Описание товаров", callback_data="admin_desc")],
+        [InlineKeyboardButton(text="📋 Заказы", callback_data="admin_orders")],
         [InlineKeyboardButton(text="🔙 Выход", callback_data="exit_admin")]
     ])
     
     return keyboard
 
-def get_categories_admin_keyboard():
+@keyboard_cache.cached
+async def get_categories_admin_keyboard():
     """Клавиатура управления категориями"""
-    with DatabaseManager.get_session() as db:
-        categories = db.query(Category).all()
+    async with DatabaseManager.get_async_session() as db:
+        categories = (await db.execute(select(Category.id, Category.name))).all()
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Добавить категорию", callback_data="add_category")],
@@ -66,10 +77,11 @@ def get_categories_admin_keyboard():
     
     return keyboard
 
-def get_titles_admin_keyboard():
+@keyboard_cache.cached
+async def get_titles_admin_keyboard():
     """Клавиатура управления тайтлами"""
-    with DatabaseManager.get_session() as db:
-        titles = db.query(Title).all()
+    async with DatabaseManager.get_async_session() as db:
+        titles = (await db.execute(select(Title.id, Title.name))).all()
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Добавить тайтл", callback_data="add_title")],
@@ -98,10 +110,11 @@ def get_title_edit_keyboard(title_id: int):
     ])
     return keyboard
 
-def get_products_admin_keyboard():
+@keyboard_cache.cached
+async def get_products_admin_keyboard():
     """Клавиатура управления товарами"""
-    with DatabaseManager.get_session() as db:
-        products = db.query(Product).all()
+    async with DatabaseManager.get_async_session() as db:
+        products = (await db.execute(select(Product.id, Product.name, Product.is_active))).all()
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Добавить товар", callback_data="add_product")],
@@ -126,10 +139,11 @@ def get_product_edit_keyboard(product_id: int, is_active: bool):
     ])
     return keyboard
 
-def get_sizes_admin_keyboard():
+@keyboard_cache.cached
+async def get_sizes_admin_keyboard():
     """Клавиатура управления размерами"""
-    with DatabaseManager.get_session() as db:
-        sizes = db.query(Size).all()
+    async with DatabaseManager.get_async_session() as db:
+        sizes = (await db.execute(select(Size.id, Size.name, Size.price))).all()
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Добавить размер", callback_data="add_size")],
@@ -154,17 +168,18 @@ DEFAULT_SIZES = [
     ("Настенная панель 55см", 7090.0),
 ]
 
-def ensure_default_sizes():
+async def ensure_default_sizes():
     """Создает дефолтные размеры, если их нет"""
-    with DatabaseManager.get_session() as db:
-        existing = {s.name for s in db.query(Size).all()}
+    async with DatabaseManager.get_async_session() as db:
+        existing = {s.name for s in (await db.execute(select(Size))).scalars().all()}
         created = 0
         for name, price in DEFAULT_SIZES:
             if name not in existing:
                 db.add(Size(name=name, price=price))
                 created += 1
         if created:
-            db.commit()
+            await db.commit()
+            catalog_cache.invalidate_sizes()
 
 # Обработчики админ команд
 @router.message(Command("admin"))
@@ -174,7 +189,7 @@ async def handle_admin_start(message: types.Message):
         await message.answer("❌ У вас нет прав администратора.")
         return
     # Гарантируем наличие дефолтных размеров
-    ensure_default_sizes()
+    await ensure_default_sizes()
     
     admin_text = """Привет, админ 👋  
 Что будем делать?"""
@@ -200,7 +215,7 @@ async def process_admin_categories(callback: types.CallbackQuery):
 
 Выберите действие:"""
     
-    await callback.message.edit_text(categories_text, reply_markup=get_categories_admin_keyboard())
+    await callback.message.edit_text(categories_text, reply_markup=await get_categories_admin_keyboard())
 
 @router.callback_query(F.data == "admin_titles")
 async def process_admin_titles(callback: types.CallbackQuery):
@@ -213,7 +228,7 @@ async def process_admin_titles(callback: types.CallbackQuery):
 
 Выберите действие:"""
     
-    await callback.message.edit_text(titles_text, reply_markup=get_titles_admin_keyboard())
+    await callback.message.edit_text(titles_text, reply_markup=await get_titles_admin_keyboard())
 
 @router.callback_query(F.data == "admin_products")
 async def process_admin_products(callback: types.CallbackQuery):
@@ -226,7 +241,7 @@ async def process_admin_products(callback: types.CallbackQuery):
 
 Выберите действие:"""
     
-    await callback.message.edit_text(products_text, reply_markup=get_products_admin_keyboard())
+    await callback.message.edit_text(products_text, reply_markup=await get_products_admin_keyboard())
 
 # ==============================
 # Описание товаров: текст и медиа
@@ -245,8 +260,8 @@ async def process_admin_desc(callback: types.CallbackQuery):
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
-    with DatabaseManager.get_session() as db:
-        s = db.query(Settings).filter(Settings.id == 1).first()
+    async with DatabaseManager.get_async_session() as db:
+        s = await db.get(Settings, 1)
     text = s.description_text if s and s.description_text else "Текст описания не задан."
     media_info = []
     if s and s.desc_photo_file_id:
@@ -272,14 +287,14 @@ async def process_desc_edit_text(callback: types.CallbackQuery, state: FSMContex
 @router.message(AdminStates.waiting_description_text)
 async def process_desc_text_message(message: types.Message, state: FSMContext):
     text = message.text or ""
-    with DatabaseManager.get_session() as db:
-        s = db.query(Settings).filter(Settings.id == 1).first()
+    async with DatabaseManager.get_async_session() as db:
+        s = await db.get(Settings, 1)
         if not s:
             s = Settings(id=1, description_text=text)
             db.add(s)
         else:
             s.description_text = text
-        db.commit()
+        await db.commit()
     await state.clear()
     await message.answer("✅ Текст описания обновлен.", reply_markup=get_desc_keyboard())
 
@@ -295,14 +310,14 @@ async def process_desc_set_photo(callback: types.CallbackQuery, state: FSMContex
 @router.message(AdminStates.waiting_description_photo, F.photo)
 async def process_desc_photo_message(message: types.Message, state: FSMContext):
     file_id = message.photo[-1].file_id
-    with DatabaseManager.get_session() as db:
-        s = db.query(Settings).filter(Settings.id == 1).first()
+    async with DatabaseManager.get_async_session() as db:
+        s = await db.get(Settings, 1)
         if not s:
             s = Settings(id=1, desc_photo_file_id=file_id)
             db.add(s)
         else:
             s.desc_photo_file_id = file_id
-        db.commit()
+        await db.commit()
     await state.clear()
     await message.answer("✅ Фото для описания установлено.", reply_markup=get_desc_keyboard())
 
@@ -311,11 +326,11 @@ async def process_desc_clear_photo(callback: types.CallbackQuery):
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
-    with DatabaseManager.get_session() as db:
-        s = db.query(Settings).filter(Settings.id == 1).first()
+    async with DatabaseManager.get_async_session() as db:
+        s = await db.get(Settings, 1)
         if s:
             s.desc_photo_file_id = None
-            db.commit()
+            await db.commit()
     await callback.message.edit_text("✅ Фото для описания удалено.", reply_markup=get_desc_keyboard())
 
 @router.callback_query(F.data == "desc_set_video")
@@ -330,14 +345,14 @@ async def process_desc_set_video(callback: types.CallbackQuery, state: FSMContex
 @router.message(AdminStates.waiting_description_video, F.video)
 async def process_desc_video_message(message: types.Message, state: FSMContext):
     file_id = message.video.file_id
-    with DatabaseManager.get_session() as db:
-        s = db.query(Settings).filter(Settings.id == 1).first()
+    async with DatabaseManager.get_async_session() as db:
+        s = await db.get(Settings, 1)
         if not s:
             s = Settings(id=1, desc_video_file_id=file_id)
             db.add(s)
         else:
             s.desc_video_file_id = file_id
-        db.commit()
+        await db.commit()
     await state.clear()
     await message.answer("✅ Видео для описания установлено.", reply_markup=get_desc_keyboard())
 
@@ -346,11 +361,11 @@ async def process_desc_clear_video(callback: types.CallbackQuery):
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
-    with DatabaseManager.get_session() as db:
-        s = db.query(Settings).filter(Settings.id == 1).first()
+    async with DatabaseManager.get_async_session() as db:
+        s = await db.get(Settings, 1)
         if s:
             s.desc_video_file_id = None
-            db.commit()
+            await db.commit()
     await callback.message.edit_text("✅ Видео для описания удалено.", reply_markup=get_desc_keyboard())
 
 # ==============================
@@ -362,8 +377,8 @@ async def process_edit_category(callback: types.CallbackQuery):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     category_id = int(callback.data.split("_")[2])
-    with DatabaseManager.get_session() as db:
-        cat = db.query(Category).filter(Category.id == category_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        cat = await db.get(Category, category_id)
     if not cat:
         await callback.answer("❌ Категория не найдена.", show_alert=True)
         return
@@ -390,14 +405,15 @@ async def process_new_category_name(message: types.Message, state: FSMContext):
         await message.answer("❌ Не удалось определить категорию. Попробуйте снова.")
         await state.clear()
         return
-    with DatabaseManager.get_session() as db:
-        cat = db.query(Category).filter(Category.id == category_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        cat = await db.get(Category, category_id)
         if not cat:
             await message.answer("❌ Категория не найдена.")
             await state.clear()
             return
         cat.name = new_name
-        db.commit()
+        await db.commit()
+    catalog_cache.invalidate_categories()
     await state.clear()
     await message.answer(f"✅ Категория переименована: {new_name}", reply_markup=get_category_edit_keyboard(category_id))
 
@@ -408,27 +424,18 @@ async def process_delete_category(callback: types.CallbackQuery):
         return
     category_id = int(callback.data.split("_")[2])
     try:
-        with DatabaseManager.get_session() as db:
-            # Находим все тайтлы категории
-            titles = db.query(Title).filter(Title.category_id == category_id).all()
-            for title in titles:
-                # Находим и удаляем товары и их размеры
-                products = db.query(Product).filter(Product.title_id == title.id).all()
-                for product in products:
-                    db.query(ProductSize).filter(ProductSize.product_id == product.id).delete()
-                    db.delete(product)
-                # Удаляем тайтл
-                db.delete(title)
-            # Удаляем категорию
-            deleted = db.query(Category).filter(Category.id == category_id).delete()
-            db.commit()
+        async with DatabaseManager.get_async_session() as db:
+            # Тайтлы, товары и связи размеров удаляются вместе с категорией
+            deleted = await delete_category(db, category_id)
+            await db.commit()
+        catalog_cache.invalidate_category_tree(category_id)
         if deleted:
-            await callback.message.edit_text("✅ Категория удалена.", reply_markup=get_categories_admin_keyboard())
+            await callback.message.edit_text("✅ Категория удалена.", reply_markup=await get_categories_admin_keyboard())
         else:
-            await callback.message.edit_text("❌ Категория не найдена.", reply_markup=get_categories_admin_keyboard())
+            await callback.message.edit_text("❌ Категория не найдена.", reply_markup=await get_categories_admin_keyboard())
     except Exception as e:
         logger.error(f"Ошибка удаления категории: {e}")
-        await callback.message.edit_text("❌ Произошла ошибка при удалении категории.", reply_markup=get_categories_admin_keyboard())
+        await callback.message.edit_text("❌ Произошла ошибка при удалении категории.", reply_markup=await get_categories_admin_keyboard())
 
 # ==============================
 # Тайтлы: редактирование/удаление
@@ -439,8 +446,8 @@ async def process_edit_title(callback: types.CallbackQuery):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     title_id = int(callback.data.split("_")[2])
-    with DatabaseManager.get_session() as db:
-        title = db.query(Title).filter(Title.id == title_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        title = await db.get(Title, title_id)
     if not title:
         await callback.answer("❌ Тайтл не найден.", show_alert=True)
         return
@@ -467,14 +474,15 @@ async def process_new_title_name(message: types.Message, state: FSMContext):
         await message.answer("❌ Не удалось определить тайтл. Попробуйте снова.")
         await state.clear()
         return
-    with DatabaseManager.get_session() as db:
-        title = db.query(Title).filter(Title.id == title_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        title = await db.get(Title, title_id)
         if not title:
             await message.answer("❌ Тайтл не найден.")
             await state.clear()
             return
         title.name = new_name
-        db.commit()
+        await db.commit()
+    catalog_cache.invalidate_titles()
     await state.clear()
     await message.answer(f"✅ Тайтл переименован: {new_name}", reply_markup=get_title_edit_keyboard(title_id))
 
@@ -485,22 +493,18 @@ async def process_delete_title(callback: types.CallbackQuery):
         return
     title_id = int(callback.data.split("_")[2])
     try:
-        with DatabaseManager.get_session() as db:
-            # Удалить товары и их размеры
-            products = db.query(Product).filter(Product.title_id == title_id).all()
-            for product in products:
-                db.query(ProductSize).filter(ProductSize.product_id == product.id).delete()
-                db.delete(product)
-            # Удалить тайтл
-            deleted = db.query(Title).filter(Title.id == title_id).delete()
-            db.commit()
+        async with DatabaseManager.get_async_session() as db:
+            # Товары и связи размеров удаляются вместе с тайтлом
+            deleted = await delete_title(db, title_id)
+            await db.commit()
+        catalog_cache.invalidate_title_tree(title_id)
         if deleted:
-            await callback.message.edit_text("✅ Тайтл удален.", reply_markup=get_titles_admin_keyboard())
+            await callback.message.edit_text("✅ Тайтл удален.", reply_markup=await get_titles_admin_keyboard())
         else:
-            await callback.message.edit_text("❌ Тайтл не найден.", reply_markup=get_titles_admin_keyboard())
+            await callback.message.edit_text("❌ Тайтл не найден.", reply_markup=await get_titles_admin_keyboard())
     except Exception as e:
         logger.error(f"Ошибка удаления тайтла: {e}")
-        await callback.message.edit_text("❌ Произошла ошибка при удалении тайтла.", reply_markup=get_titles_admin_keyboard())
+        await callback.message.edit_text("❌ Произошла ошибка при удалении тайтла.", reply_markup=await get_titles_admin_keyboard())
 
 @router.callback_query(F.data.startswith("edit_product_"))
 async def process_edit_product(callback: types.CallbackQuery):
@@ -509,8 +513,8 @@ async def process_edit_product(callback: types.CallbackQuery):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     product_id = int(callback.data.split("_")[2])
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        product = await db.get(Product, product_id)
     if not product:
         await callback.answer("❌ Товар не найден.", show_alert=True)
         return
@@ -524,15 +528,16 @@ async def process_toggle_active(callback: types.CallbackQuery):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     product_id = int(callback.data.split("_")[2])
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        product = await db.get(Product, product_id)
         if not product:
             await callback.answer("❌ Товар не найден.", show_alert=True)
             return
         product.is_active = not bool(product.is_active)
-        db.commit()
+        await db.commit()
         is_active = product.is_active
         name = product.name
+        catalog_cache.invalidate_product(product_id, product.title_id)
     await callback.message.edit_text(
         f"🛍️ {name}\n\nСтатус: {'активен' if is_active else 'выключен'}",
         reply_markup=get_product_edit_keyboard(product_id, is_active)
@@ -560,15 +565,16 @@ async def process_new_product_name(message: types.Message, state: FSMContext):
         await message.answer("❌ Не удалось определить товар. Попробуйте снова.")
         await state.clear()
         return
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        product = await db.get(Product, product_id)
         if not product:
             await message.answer("❌ Товар не найден.")
             await state.clear()
             return
         product.name = new_name
-        db.commit()
+        await db.commit()
         is_active = product.is_active
+        catalog_cache.invalidate_product(product_id, product.title_id)
     await state.clear()
     await message.answer(
         f"✅ Название обновлено: {new_name}",
@@ -598,16 +604,17 @@ async def process_new_product_photo(message: types.Message, state: FSMContext):
         await message.answer("❌ Не удалось определить товар. Попробуйте снова.")
         await state.clear()
         return
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        product = await db.get(Product, product_id)
         if not product:
             await message.answer("❌ Товар не найден.")
             await state.clear()
             return
         product.photo_url = photo_file_id
-        db.commit()
+        await db.commit()
         is_active = product.is_active
         name = product.name
+        catalog_cache.invalidate_product(product_id, product.title_id)
     await state.clear()
     await message.answer(
         f"✅ Фото для товара '{name}' обновлено.",
@@ -622,19 +629,21 @@ async def process_delete_product(callback: types.CallbackQuery):
         return
     product_id = int(callback.data.split("_")[2])
     try:
-        with DatabaseManager.get_session() as db:
+        async with DatabaseManager.get_async_session() as db:
+            product = (await db.execute(select(Product.title_id).where(Product.id == product_id))).first()
             # Удаляем связи размеров
-            db.query(ProductSize).filter(ProductSize.product_id == product_id).delete()
+            await db.execute(delete(ProductSize).where(ProductSize.product_id == product_id))
             # Удаляем товар
-            deleted = db.query(Product).filter(Product.id == product_id).delete()
-            db.commit()
+            deleted = (await db.execute(delete(Product).where(Product.id == product_id))).rowcount
+            await db.commit()
+        catalog_cache.invalidate_product(product_id, product.title_id if product else None)
         if deleted:
-            await callback.message.edit_text("✅ Товар удален.", reply_markup=get_products_admin_keyboard())
+            await callback.message.edit_text("✅ Товар удален.", reply_markup=await get_products_admin_keyboard())
         else:
-            await callback.message.edit_text("❌ Товар не найден.", reply_markup=get_products_admin_keyboard())
+            await callback.message.edit_text("❌ Товар не найден.", reply_markup=await get_products_admin_keyboard())
     except Exception as e:
         logger.error(f"Ошибка удаления товара: {e}")
-        await callback.message.edit_text("❌ Произошла ошибка при удалении товара.", reply_markup=get_products_admin_keyboard())
+        await callback.message.edit_text("❌ Произошла ошибка при удалении товара.", reply_markup=await get_products_admin_keyboard())
 
 @router.callback_query(F.data == "admin_sizes")
 async def process_admin_sizes(callback: types.CallbackQuery):
@@ -647,7 +656,7 @@ async def process_admin_sizes(callback: types.CallbackQuery):
 
 Выберите действие:"""
     
-    await callback.message.edit_text(sizes_text, reply_markup=get_sizes_admin_keyboard())
+    await callback.message.edit_text(sizes_text, reply_markup=await get_sizes_admin_keyboard())
 
 # Добавление категории
 @router.callback_query(F.data == "add_category")
@@ -675,9 +684,9 @@ async def process_category_name(message: types.Message, state: FSMContext):
     category_name = message.text.strip()
     
     try:
-        with DatabaseManager.get_session() as db:
+        async with DatabaseManager.get_async_session() as db:
             # Проверяем, не существует ли уже такая категория
-            existing = db.query(Category).filter(Category.name == category_name).first()
+            existing = (await db.execute(select(Category).where(Category.name == category_name))).scalars().first()
             if existing:
                 await message.answer("❌ Категория с таким названием уже существует!")
                 return
@@ -685,7 +694,8 @@ async def process_category_name(message: types.Message, state: FSMContext):
             # Создаем новую категорию
             category = Category(name=category_name)
             db.add(category)
-            db.commit()
+            await db.commit()
+            catalog_cache.invalidate_categories()
             
             await message.answer(f"✅ Категория '{category_name}' успешно добавлена!")
             
@@ -704,8 +714,8 @@ async def process_add_title(callback: types.CallbackQuery, state: FSMContext):
         return
     
     # Получаем список категорий для выбора
-    with DatabaseManager.get_session() as db:
-        categories = db.query(Category).all()
+    async with DatabaseManager.get_async_session() as db:
+        categories = (await db.execute(select(Category))).scalars().all()
     
     if not categories:
         await callback.answer("❌ Сначала добавьте категории!", show_alert=True)
@@ -748,11 +758,12 @@ async def process_title_name(message: types.Message, state: FSMContext):
     category_id = data['category_id']
     
     try:
-        with DatabaseManager.get_session() as db:
+        async with DatabaseManager.get_async_session() as db:
             # Создаем новый тайтл
             title = Title(name=title_name, category_id=category_id)
             db.add(title)
-            db.commit()
+            await db.commit()
+            catalog_cache.invalidate_titles()
             
             await message.answer(f"✅ Тайтл '{title_name}' успешно добавлен!")
             
@@ -771,8 +782,8 @@ async def process_add_product(callback: types.CallbackQuery, state: FSMContext):
         return
     
     # Получаем список тайтлов для выбора
-    with DatabaseManager.get_session() as db:
-        titles = db.query(Title).all()
+    async with DatabaseManager.get_async_session() as db:
+        titles = (await db.execute(select(Title))).scalars().all()
     
     if not titles:
         await callback.answer("❌ Сначала добавьте тайтлы!", show_alert=True)
@@ -839,18 +850,15 @@ async def process_product_photo(message: types.Message, state: FSMContext):
     title_id = data['title_id']
     
     try:
-        with DatabaseManager.get_session() as db:
+        async with DatabaseManager.get_async_session() as db:
             # Создаем новый товар
             product = Product(name=product_name, title_id=title_id, photo_url=photo_file_id, is_active=True)
             db.add(product)
-            db.commit()
-            db.refresh(product)
-            # Автопривязка всех размеров к новому товару
-            sizes = db.query(Size).all()
-            for sz in sizes:
-                link = ProductSize(product_id=product.id, size_id=sz.id)
-                db.add(link)
-            db.commit()
+            await db.flush()
+            # Автопривязка всех размеров к новому товару — в той же транзакции
+            await link_all_sizes_to_product(db, product.id)
+            await db.commit()
+            catalog_cache.invalidate_title_products(title_id)
             
             await message.answer(f"✅ Товар '{product_name}' успешно добавлен!")
             
@@ -868,18 +876,15 @@ async def process_skip_photo(callback: types.CallbackQuery, state: FSMContext):
     title_id = data['title_id']
     
     try:
-        with DatabaseManager.get_session() as db:
+        async with DatabaseManager.get_async_session() as db:
             # Создаем новый товар без фото
             product = Product(name=product_name, title_id=title_id, is_active=True)
             db.add(product)
-            db.commit()
-            db.refresh(product)
-            # Автопривязка всех размеров к новому товару
-            sizes = db.query(Size).all()
-            for sz in sizes:
-                link = ProductSize(product_id=product.id, size_id=sz.id)
-                db.add(link)
-            db.commit()
+            await db.flush()
+            # Автопривязка всех размеров к новому товару — в той же транзакции
+            await link_all_sizes_to_product(db, product.id)
+            await db.commit()
+            catalog_cache.invalidate_title_products(title_id)
             
             await callback.message.edit_text(f"✅ Товар '{product_name}' успешно добавлен!")
             
@@ -935,18 +940,15 @@ async def process_size_price(message: types.Message, state: FSMContext):
         data = await state.get_data()
         size_name = data['size_name']
         
-        with DatabaseManager.get_session() as db:
+        async with DatabaseManager.get_async_session() as db:
             # Создаем новый размер
             size = Size(name=size_name, price=price)
             db.add(size)
-            db.commit()
-            db.refresh(size)
-            # Автопривязка нового размера ко всем существующим товарам
-            products = db.query(Product).all()
-            for product in products:
-                link = ProductSize(product_id=product.id, size_id=size.id)
-                db.add(link)
-            db.commit()
+            await db.flush()
+            # Автопривязка нового размера ко всем существующим товарам — в той же транзакции
+            await link_size_to_all_products(db, size.id)
+            await db.commit()
+            catalog_cache.link_size_to_all(size.id)
             
             await message.answer(f"✅ Размер '{size_name}' с ценой {price}₽ успешно добавлен!")
             
@@ -968,8 +970,8 @@ async def process_link_product_size(callback: types.CallbackQuery, state: FSMCon
         return
     
     # Получаем список товаров для выбора
-    with DatabaseManager.get_session() as db:
-        products = db.query(Product).filter(Product.is_active == True).all()
+    async with DatabaseManager.get_async_session() as db:
+        products = (await db.execute(select(Product).where(Product.is_active == True))).scalars().all()
     
     if not products:
         await callback.answer("❌ Сначала добавьте товары!", show_alert=True)
@@ -992,8 +994,8 @@ async def process_select_product_for_size(callback: types.CallbackQuery, state:
     product_id = int(callback.data.split("_")[2])
     
     # Получаем список размеров для выбора
-    with DatabaseManager.get_session() as db:
-        sizes = db.query(Size).all()
+    async with DatabaseManager.get_async_session() as db:
+        sizes = (await db.execute(select(Size))).scalars().all()
     
     if not sizes:
         await callback.answer("❌ Сначала добавьте размеры!", show_alert=True)
@@ -1020,12 +1022,12 @@ async def process_select_size_for_product(callback: types.CallbackQuery, state:
     product_id = data['product_id']
     
     try:
-        with DatabaseManager.get_session() as db:
+        async with DatabaseManager.get_async_session() as db:
             # Проверяем, не связаны ли уже товар и размер
-            existing = db.query(ProductSize).filter(
+            existing = (await db.execute(select(ProductSize).where(
                 ProductSize.product_id == product_id,
                 ProductSize.size_id == size_id
-            ).first()
+            ))).scalars().first()
             
             if existing:
                 await callback.answer("❌ Этот товар уже связан с данным размером!", show_alert=True)
@@ -1034,11 +1036,12 @@ async def process_select_size_for_product(callback: types.CallbackQuery, state:
             # Создаем связь
             product_size = ProductSize(product_id=product_id, size_id=size_id)
             db.add(product_size)
-            db.commit()
+            await db.commit()
+            catalog_cache.link_product_size(product_id, size_id)
             
             # Получаем названия для подтверждения
-            product = db.query(Product).filter(Product.id == product_id).first()
-            size = db.query(Size).filter(Size.id == size_id).first()
+            product = await db.get(Product, product_id)
+            size = await db.get(Size, size_id)
             
             await callback.message.edit_text(
                 f"✅ Товар '{product.name}' успешно связан с размером '{size.name}'!"
@@ -1066,8 +1069,8 @@ async def process_edit_size(callback: types.CallbackQuery):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     size_id = int(callback.data.split("_")[2])
-    with DatabaseManager.get_session() as db:
-        size = db.query(Size).filter(Size.id == size_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        size = await db.get(Size, size_id)
     if not size:
         await callback.answer("❌ Размер не найден.", show_alert=True)
         return
@@ -1094,14 +1097,15 @@ async def process_new_size_name(message: types.Message, state: FSMContext):
         await message.answer("❌ Не удалось определить размер. Попробуйте снова.")
         await state.clear()
         return
-    with DatabaseManager.get_session() as db:
-        size = db.query(Size).filter(Size.id == size_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        size = await db.get(Size, size_id)
         if not size:
             await message.answer("❌ Размер не найден.")
             await state.clear()
             return
         size.name = new_name
-        db.commit()
+        await db.commit()
+    catalog_cache.invalidate_sizes()
     await state.clear()
     await message.answer(f"✅ Название размера обновлено: {new_name}", reply_markup=get_size_edit_keyboard(size_id))
 
@@ -1129,14 +1133,15 @@ async def process_new_size_price(message: types.Message, state: FSMContext):
         await message.answer("❌ Не удалось определить размер. Попробуйте снова.")
         await state.clear()
         return
-    with DatabaseManager.get_session() as db:
-        size = db.query(Size).filter(Size.id == size_id).first()
+    async with DatabaseManager.get_async_session() as db:
+        size = await db.get(Size, size_id)
         if not size:
             await message.answer("❌ Размер не найден.")
             await state.clear()
             return
         size.price = new_price
-        db.commit()
+        await db.commit()
+    catalog_cache.invalidate_sizes()
     await state.clear()
     await message.answer(f"✅ Цена размера обновлена: {new_price}₽", reply_markup=get_size_edit_keyboard(size_id))
 
@@ -1147,17 +1152,18 @@ async def process_delete_size(callback: types.CallbackQuery):
         return
     size_id = int(callback.data.split("_")[2])
     try:
-        with DatabaseManager.get_session() as db:
-            db.query(ProductSize).filter(ProductSize.size_id == size_id).delete()
-            deleted = db.query(Size).filter(Size.id == size_id).delete()
-            db.commit()
+        async with DatabaseManager.get_async_session() as db:
+            await db.execute(delete(ProductSize).where(ProductSize.size_id == size_id))
+            deleted = (await db.execute(delete(Size).where(Size.id == size_id))).rowcount
+            await db.commit()
+        catalog_cache.invalidate_sizes()
         if deleted:
-            await callback.message.edit_text("✅ Размер удален.", reply_markup=get_sizes_admin_keyboard())
+            await callback.message.edit_text("✅ Размер удален.", reply_markup=await get_sizes_admin_keyboard())
         else:
-            await callback.message.edit_text("❌ Размер не найден.", reply_markup=get_sizes_admin_keyboard())
+            await callback.message.edit_text("❌ Размер не найден.", reply_markup=await get_sizes_admin_keyboard())
     except Exception as e:
         logger.error(f"Ошибка удаления размера: {e}")
-        await callback.message.edit_text("❌ Произошла ошибка при удалении размера.", reply_markup=get_sizes_admin_keyboard())
+        await callback.message.edit_text("❌ Произошла ошибка при удалении размера.", reply_markup=await get_sizes_admin_keyboard())
 
 # Отмена админ действий
 @router.callback_query(F.data == "cancel_admin")
@@ -1171,40 +1177,175 @@ async def process_cancel_admin(callback: types.CallbackQuery, state: FSMContext)
     await callback.message.edit_text(admin_text, reply_markup=get_admin_keyboard())
 
 # Просмотр заказов
+ORDERS_PAGE_SIZE = 10
+ORDER_STATUS_EMOJI = {
+    "pending": "⏳",
+    "paid": "✅",
+    "expired": "⌛",
+    "shipped": "🚚",
+    "delivered": "📦"
+}
+# Формат курсора страницы в callback_data: created_at последнего заказа и его id
+ORDERS_CURSOR_FORMAT = "%Y%m%d%H%M%S%f"
+
+def _orders_filter(data: dict) -> OrderFilter:
+    """Фильтр заказов из данных FSM админа"""
+    raw = data.get('orders_filter') or {}
+    return OrderFilter(
+        status=raw.get('status'),
+        date_from=date.fromisoformat(raw['date_from']) if raw.get('date_from') else None,
+        date_to=date.fromisoformat(raw['date_to']) if raw.get('date_to') else None,
+        user_id=raw.get('user_id')
+    )
+
+async def _update_orders_filter(state: FSMContext, **changes):
+    data = await state.get_data()
+    raw = dict(data.get('orders_filter') or {})
+    raw.update(changes)
+    await state.update_data(orders_filter=raw)
+
+def get_orders_keyboard(filters: OrderFilter, next_cursor) -> InlineKeyboardMarkup:
+    """Фильтры по статусу, периоду, покупателю и листание вперёд"""
+    status_row = [
+        InlineKeyboardButton(
+            text=("• " if filters.status == status else "") + (ORDER_STATUS_EMOJI.get(status) or "Все"),
+            callback_data=f"orders_status_{status or 'all'}"
+        )
+        for status in (None, *ORDER_STATUS_EMOJI)
+    ]
+    rows = [status_row, [
+        InlineKeyboardButton(text="📅 Период", callback_data="orders_period"),
+        InlineKeyboardButton(text="👤 Покупатель", callback_data="orders_user"),
+    ]]
+    paging = [InlineKeyboardButton(text="⏮ В начало", callback_data="admin_orders")]
+    if next_cursor:
+        created_at, order_id = next_cursor
+        paging.append(InlineKeyboardButton(
+            text="▶️ Дальше", callback_data=f"orders_page_{created_at.strftime(ORDERS_CURSOR_FORMAT)}_{order_id}"
+        ))
+    rows.append(paging)
+    rows.append([InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+async def render_orders_page(state: FSMContext, after=None):
+    """Текст и клавиатура страницы заказов с текущим фильтром"""
+    filters = _orders_filter(await state.get_data())
+    orders, next_cursor = await list_orders(filters, after, ORDERS_PAGE_SIZE)
+    
+    conditions = []
+    if filters.status:
+        conditions.append(f"статус {ORDER_STATUS_EMOJI.get(filters.status, '')} {filters.status}")
+    if filters.date_from or filters.date_to:
+        date_from = filters.date_from.strftime('%d.%m.%Y') if filters.date_from else '…'
+        date_to = filters.date_to.strftime('%d.%m.%Y') if filters.date_to else '…'
+        conditions.append(f"период {date_from}–{date_to}")
+    if filters.user_id:
+        conditions.append(f"покупатель {filters.user_id}")
+    orders_text = "📋 Заказы" + (f" ({', '.join(conditions)})" if conditions else "") + ":\n\n"
+    
+    if not orders:
+        orders_text += "Заказов не найдено." if after is None else "Больше заказов нет."
+    for order in orders:
+        status_emoji = ORDER_STATUS_EMOJI.get(order.status, "❓")
+        orders_text += f"{status_emoji} Заказ #{order.id}\n"
+        orders_text += f"👤 Пользователь: @{order.username or 'без username'} ({order.user_id})\n"
+        orders_text += f"💰 Сумма: {order.total_price}₽\n"
+        orders_text += f"📅 Дата: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+    return orders_text, get_orders_keyboard(filters, next_cursor)
+
 @router.callback_query(F.data == "admin_orders")
-async def process_admin_orders(callback: types.CallbackQuery):
-    """Просмотр заказов"""
+async def process_admin_orders(callback: types.CallbackQuery, state: FSMContext):
+    """Просмотр заказов: первая страница с текущим фильтром"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
-    
-    with DatabaseManager.get_session() as db:
-        orders = db.query(Order).order_by(Order.created_at.desc()).limit(10).all()
-    
-    if not orders:
-        orders_text = "📋 Заказы\n\nЗаказов пока нет."
-    else:
-        orders_text = "📋 Последние заказы:\n\n"
-        
-        for order in orders:
-            status_emoji = {
-                "pending": "⏳",
-                "paid": "✅",
-                "shipped": "🚚",
-                "delivered": "📦"
-            }.get(order.status, "❓")
-            
-            orders_text += f"{status_emoji} Заказ #{order.id}\n"
-            orders_text += f"👤 Пользователь: @{order.username or 'без username'}\n"
-            orders_text += f"💰 Сумма: {order.total_price}₽\n"
-            orders_text += f"📅 Дата: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
-    ])
-    
+    # «Отмена» ввода периода или покупателя тоже ведёт сюда
+    await state.set_state(None)
+    orders_text, keyboard = await render_orders_page(state)
+    await callback.message.edit_text(orders_text, reply_markup=keyboard)
+
+@router.callback_query(F.data.startswith("orders_page_"))
+async def process_orders_page(callback: types.CallbackQuery, state: FSMContext):
+    """Следующая страница заказов после заказа из курсора"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    _, _, created_at, order_id = callback.data.split("_")
+    after = (datetime.strptime(created_at, ORDERS_CURSOR_FORMAT), int(order_id))
+    orders_text, keyboard = await render_orders_page(state, after)
     await callback.message.edit_text(orders_text, reply_markup=keyboard)
 
+@router.callback_query(F.data.startswith("orders_status_"))
+async def process_orders_status(callback: types.CallbackQuery, state: FSMContext):
+    """Фильтр заказов по статусу"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    status = callback.data.split("_")[2]
+    await _update_orders_filter(state, status=None if status == "all" else status)
+    orders_text, keyboard = await render_orders_page(state)
+    await callback.message.edit_text(orders_text, reply_markup=keyboard)
+
+@router.callback_query(F.data == "orders_period")
+async def process_orders_period(callback: types.CallbackQuery, state: FSMContext):
+    """Запрос периода для фильтра заказов"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    await state.set_state(AdminStates.waiting_orders_period)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="❌ Отмена", callback_data="admin_orders")]])
+    await callback.message.edit_text(
+        "📅 Введите период в формате ДД.ММ.ГГГГ-ДД.ММ.ГГГГ (или одну дату).\nОтправьте «-», чтобы сбросить период.",
+        reply_markup=keyboard
+    )
+
+@router.message(AdminStates.waiting_orders_period)
+async def process_orders_period_input(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    try:
+        if text == "-":
+            date_from = date_to = None
+        else:
+            parts = [datetime.strptime(part.strip(), "%d.%m.%Y").date() for part in text.split("-")]
+            if len(parts) not in (1, 2):
+                raise ValueError(text)
+            date_from, date_to = parts[0], parts[-1]
+    except ValueError:
+        await message.answer("❌ Не понял период. Пример: 01.05.2024-31.05.2024")
+        return
+    await _update_orders_filter(
+        state,
+        date_from=date_from.isoformat() if date_from else None,
+        date_to=date_to.isoformat() if date_to else None
+    )
+    await state.set_state(None)
+    orders_text, keyboard = await render_orders_page(state)
+    await message.answer(orders_text, reply_markup=keyboard)
+
+@router.callback_query(F.data == "orders_user")
+async def process_orders_user(callback: types.CallbackQuery, state: FSMContext):
+    """Запрос покупателя для фильтра заказов"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    await state.set_state(AdminStates.waiting_orders_user)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="❌ Отмена", callback_data="admin_orders")]])
+    await callback.message.edit_text(
+        "👤 Введите Telegram ID покупателя.\nОтправьте «-», чтобы сбросить фильтр.",
+        reply_markup=keyboard
+    )
+
+@router.message(AdminStates.waiting_orders_user)
+async def process_orders_user_input(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    if text != "-" and not text.isdigit():
+        await message.answer("❌ ID покупателя — это число.")
+        return
+    await _update_orders_filter(state, user_id=None if text == "-" else int(text))
+    await state.set_state(None)
+    orders_text, keyboard = await render_orders_page(state)
+    await message.answer(orders_text, reply_markup=keyboard)
+
 # Статистика
 @router.callback_query(F.data == "admin_stats")
 async def process_admin_stats(callback: types.CallbackQuery):
@@ -1213,25 +1354,32 @@ async def process_admin_stats(callback: types.CallbackQuery):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    with DatabaseManager.get_session() as db:
-        categories_count = db.query(Category).count()
-        titles_count = db.query(Title).count()
-        products_count = db.query(Product).count()
-        sizes_count = db.query(Size).count()
-        orders_count = db.query(Order).count()
-        
-        total_revenue = db.query(Order).filter(Order.status == "paid").with_entities(
-            db.func.sum(Order.total_price)
-        ).scalar() or 0
+    # Счётчики и сводки поддерживают триггеры — таблицы заказов и каталога не сканируются
+    stats = await get_shop_stats()
+    if stats is None:
+        await callback.answer("❌ Статистика недоступна.", show_alert=True)
+        return
     
     stats_text = f"""📊 Статистика
 
-📂 Категории: {categories_count}
-📖 Тайтлы: {titles_count}
-🛍️ Товары: {products_count}
-📏 Размеры: {sizes_count}
-📋 Заказы: {orders_count}
-💰 Общая выручка: {total_revenue}₽"""
+📂 Категории: {stats.categories}
+📖 Тайтлы: {stats.titles}
+🛍️ Товары: {stats.products}
+📏 Размеры: {stats.sizes}
+📋 Заказы: {stats.orders}
+💰 Общая выручка: {stats.revenue:.0f}₽"""
+    
+    days = await revenue_by_day(7)
+    if days:
+        stats_text += "\n\n📅 Выручка за 7 дней:\n" + "\n".join(
+            f"{row.key}: {row.revenue:.0f}₽ ({row.paid_orders} опл.)" for row in days
+        )
+    methods = [row for row in await revenue_by_delivery_method() if row.paid_orders]
+    if methods:
+        stats_text += "\n\n🚚 По способам доставки:\n" + "\n".join(
+            f"{DELIVERY_METHODS.get(row.key, {}).get('name', row.key or '—')}: {row.revenue:.0f}₽ ({row.paid_orders} опл.)"
+            for row in methods
+        )
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
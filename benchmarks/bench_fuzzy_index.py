@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Замер нечёткого индекса (fuzzy_index.py) на синтетических каталогах разного размера.
+
+    python benchmarks/bench_fuzzy_index.py                 # 1k, 10k, 100k товаров
+    python benchmarks/bench_fuzzy_index.py --sizes 500000
+
+Названия собираются из случайных слов на кириллице и латинице, словарь
+растёт вместе с каталогом (по слову на 5 товаров). Запросы — слова из
+каталога с опечаткой (одна правка), часть — в транслите. Печатает время сборки,
+медиану и 99-й перцентиль поиска и время добавления/удаления товара.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_index import FuzzyIndex, _CYRILLIC_TO_LATIN
+
+CYRILLIC_SYLLABLES = ["ка", "ра", "ми", "то", "ле", "ви", "на", "го", "ше", "ру", "зо", "да", "эр", "ен", "ль", "йе"]
+LATIN_SYLLABLES = ["ka", "ro", "mi", "te", "le", "vi", "na", "go", "she", "ru", "zo", "da", "wi", "tch", "er", "al"]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list[str]:
+    words = set()
+    while len(words) < size:
+        syllables = CYRILLIC_SYLLABLES if rng.random() < 0.7 else LATIN_SYLLABLES
+        word = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        words.add(word.capitalize())
+    return sorted(words)
+
+
+def make_catalog(products: int, rng: random.Random) -> list[tuple[int, str]]:
+    """(id, «товар · тайтл») — как их индексирует поиск каталога"""
+    vocabulary = make_vocabulary(max(500, products // 5), rng)
+    titles = [" ".join(rng.sample(vocabulary, 2)) for _ in range(max(10, products // 100))]
+    return [
+        (product_id, f"{' '.join(rng.sample(vocabulary, rng.randint(1, 3)))} {rng.choice(titles)}")
+        for product_id in range(1, products + 1)
+    ]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """Одна случайная правка: замена, пропуск или перестановка буквы"""
+    i = rng.randrange(len(word))
+    kind = rng.choice(("replace", "drop", "swap"))
+    if kind == "replace":
+        return word[:i] + rng.choice("аеиоуkrstn") + word[i + 1:]
+    if kind == "drop" and len(word) > 3:
+        return word[:i] + word[i + 1:]
+    if i + 1 < len(word):
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def make_queries(catalog: list[tuple[int, str]], count: int, rng: random.Random) -> list[str]:
+    queries = []
+    for _, text in rng.sample(catalog, count):
+        word = rng.choice(text.split()).lower()
+        if rng.random() < 0.3:
+            word = "".join(_CYRILLIC_TO_LATIN.get(ch, ch) for ch in word)
+        queries.append(typo(word, rng) if len(word) > 3 else word)
+    return queries
+
+
+def bench(products: int, queries: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    catalog = make_catalog(products, rng)
+    index = FuzzyIndex()
+
+    started = time.perf_counter()
+    index.add_many(catalog)
+    build = time.perf_counter() - started
+
+    lookups = []
+    for query in make_queries(catalog, queries, rng):
+        started = time.perf_counter()
+        index.search(query, 10)
+        lookups.append(time.perf_counter() - started)
+
+    updates = []
+    for product_id, text in rng.sample(catalog, min(1000, products)):
+        started = time.perf_counter()
+        index.remove(product_id)
+        index.add(product_id, text)
+        updates.append(time.perf_counter() - started)
+
+    lookups.sort()
+    return {
+        "products": products,
+        "build_s": round(build, 3),
+        "lookup_median_ms": round(statistics.median(lookups) * 1000, 3),
+        "lookup_p99_ms": round(lookups[int(len(lookups) * 0.99) - 1] * 1000, 3),
+        "update_median_ms": round(statistics.median(updates) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'товаров':>10} {'сборка, с':>10} {'поиск p50, мс':>14} {'поиск p99, мс':>14} {'обновление, мс':>15}")
+    for size in args.sizes:
+        r = bench(size, min(args.queries, size), args.seed)
+        print(f"{r['products']:>10} {r['build_s']:>10} {r['lookup_median_ms']:>14} "
+              f"{r['lookup_p99_ms']:>14} {r['update_median_ms']:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Замер CPU-времени на сборку клавиатур каталога: без кэша клавиатур и с ним.
+
+    python benchmarks/bench_keyboards.py
+    python benchmarks/bench_keyboards.py --categories 50 --titles 100 --products 200 --sizes 10
+
+Работает на временной БД с синтетическим каталогом. Данные каталога в обоих
+случаях уже лежат в catalog_cache, так что «без кэша» — это только сборка
+InlineKeyboardMarkup (для админских списков — ещё и чтение из БД, как
+в обработчике). Печатает микросекунды процессорного времени на один показ.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_keyboards_'), 'bench.db')}")
+os.environ.setdefault("BOT1_TOKEN", "123456:BENCH_TOKEN_BOT1")
+os.environ.setdefault("BOT2_TOKEN", "654321:BENCH_TOKEN_BOT2")
+
+from database import DatabaseManager, Category, Title, Product, Size, ProductSize  # noqa: E402
+
+
+def seed(categories: int, titles: int, products: int, sizes: int) -> tuple[int, int, int]:
+    """Каталог: titles тайтлов в первой категории, products товаров в первом тайтле, sizes размеров у товаров"""
+    with DatabaseManager.get_session() as db:
+        category_rows = [Category(name=f"Категория {i}") for i in range(categories)]
+        db.add_all(category_rows)
+        db.flush()
+        title_rows = [Title(name=f"Тайтл {i}", category_id=category_rows[0].id) for i in range(titles)]
+        size_rows = [Size(name=f"Размер {i}", price=1000.0 + i * 500) for i in range(sizes)]
+        db.add_all(title_rows + size_rows)
+        db.flush()
+        product_rows = [Product(name=f"Товар {i}", title_id=title_rows[0].id, is_active=True) for i in range(products)]
+        db.add_all(product_rows)
+        db.flush()
+        db.add_all([ProductSize(product_id=p.id, size_id=s.id) for p in product_rows for s in size_rows])
+        db.commit()
+        return category_rows[0].id, title_rows[0].id, product_rows[0].id
+
+
+async def cpu_per_call(func, args, rounds: int) -> float:
+    """Микросекунды процессорного времени на один вызов"""
+    await func(*args)
+    started = time.process_time()
+    for _ in range(rounds):
+        await func(*args)
+    return (time.process_time() - started) / rounds * 1e6
+
+
+async def run(args):
+    category_id, title_id, product_id = seed(args.categories, args.titles, args.products, args.sizes)
+    import admin_panel
+    import bot1_main
+    import bot2_catalog
+    from screen_loaders import load_category_screen, load_title_screen, load_product_screen
+
+    category = (await load_category_screen(category_id),)
+    title = (await load_title_screen(title_id),)
+    product = (await load_product_screen(product_id),)
+    screens = [
+        ("бот 1: категории", bot1_main.get_categories_keyboard, ()),
+        ("бот 1: тайтлы", bot1_main.get_titles_keyboard, category),
+        ("бот 1: размеры", bot1_main.get_product_sizes_keyboard, product),
+        ("бот 2: категории", bot2_catalog.get_categories_keyboard, ()),
+        ("бот 2: тайтлы", bot2_catalog.get_titles_keyboard, category),
+        ("бот 2: товары", bot2_catalog.get_products_keyboard, title),
+        ("бот 2: размеры", bot2_catalog.get_product_sizes_keyboard, product),
+        ("админка: товары", admin_panel.get_products_admin_keyboard, ()),
+        ("админка: размеры", admin_panel.get_sizes_admin_keyboard, ()),
+    ]
+    print(f"{'экран':<20} {'без кэша, мкс':>14} {'с кэшем, мкс':>13} {'ускорение':>10}")
+    for name, keyboard, call_args in screens:
+        before = await cpu_per_call(keyboard.__wrapped__, call_args, args.rounds)
+        after = await cpu_per_call(keyboard, call_args, args.rounds)
+        print(f"{name:<20} {before:>14.1f} {after:>13.1f} {before / after:>9.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--titles", type=int, default=40)
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--sizes", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=300)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Замеры горячих функций ботов на синтетическом каталоге с отчётом в JSON.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --products 200000 --orders 1000000 --database /tmp/big.db
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<прошлый отчёт>.json
+
+Каталог создаёт generate_catalog.generate: во временной БД — каждый раз,
+в --database — только если она пустая, чтобы большой каталог
+переиспользовать между прогонами. Удаления в админке откатываются после
+каждого раунда, оформление заказа добавляет по заказу на раунд.
+
+Каждый замер — раунды, пока не наберётся --min-rounds и не выйдет
+--max-time секунд. В отчёт (по образцу pytest-benchmark) попадают
+min/max/mean/median/stddev в секундах, объёмы данных, коммит и окружение;
+по умолчанию он пишется в benchmarks/results/. --compare печатает
+изменение медиан относительно прошлого отчёта.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+
+
+class FakeGateway:
+    """Платёжный шлюз без сети: замер оформления заказа не зависит от Юкассы"""
+
+    async def create_payment(self, order_id, amount, description, return_url):
+        from payment_gateway import PaymentInfo
+        return PaymentInfo(f"bench-{order_id}", "pending", False, f"https://pay.example/{order_id}", {})
+
+
+async def measure(func, min_rounds: int, max_time: float) -> list[float]:
+    """Длительности раундов func(round) в секундах; первый вызов — прогрев, не учитывается"""
+    await func(0)
+    timings = []
+    deadline = time.perf_counter() + max_time
+    while len(timings) < min_rounds or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await func(len(timings) + 1)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def stats(timings: list[float]) -> dict:
+    return {
+        "min": min(timings),
+        "max": max(timings),
+        "mean": statistics.fmean(timings),
+        "median": statistics.median(timings),
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "rounds": len(timings),
+    }
+
+
+def commit_info() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"id": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"id": None, "dirty": None}
+
+
+async def catalog_ids():
+    """Последняя категория, её первый тайтл и первый активный товар тайтла"""
+    from sqlalchemy import func, select
+    from database import DatabaseManager, Category, Title, Product
+    async with DatabaseManager.get_async_session() as db:
+        category_id = (await db.execute(select(func.max(Category.id)))).scalar()
+        title_id = (await db.execute(
+            select(Title.id).where(Title.category_id == category_id).order_by(Title.id).limit(1)
+        )).scalar()
+        product_id = (await db.execute(
+            select(Product.id).where(Product.title_id == title_id, Product.is_active == True).order_by(Product.id).limit(1)
+        )).scalar()
+    return category_id, title_id, product_id
+
+
+async def build_suite(category_id: int, title_id: int, product_id: int):
+    """(группа, имя, func(round)) для каждого замера"""
+    import admin_panel
+    import bot1_main
+    import bot2_catalog
+    import catalog_service
+    import shop_stats
+    from catalog_cache import catalog_cache
+    from database import DatabaseManager
+    from order_service import checkout_order
+    from screen_loaders import load_category_screen, load_title_screen, load_product_screen
+
+    async def cold(load, *args):
+        catalog_cache.invalidate()
+        return await load(*args)
+
+    async def warm(load, *args):
+        # Тёплый экран товара — с готовой матрицей размеров, которая строится в фоне
+        await catalog_cache.wait_size_matrix()
+        return await load(*args)
+
+    async def size_matrix():
+        catalog_cache.invalidate()
+        await catalog_cache.wait_size_matrix()
+
+    async def rolled_back(delete, entity_id):
+        async with DatabaseManager.get_async_session() as db:
+            await delete(db, entity_id)
+            await db.rollback()
+
+    gateway = FakeGateway()
+    draft = {
+        "order_data": {"items": [{"product_id": product_id, "size_id": 1, "product_name": "Товар",
+                                  "size_name": "Размер", "price": 2500}]},
+        "final_price": 2450.0, "discount_amount": 250.0, "delivery_method": "cdek", "delivery_price": 200.0,
+        "customer_name": "Бенчмарк", "customer_phone": "+70000000000", "customer_address": "Москва",
+    }
+    checkout_user = int(time.time() * 1000) % 10**9
+
+    suite = [
+        ("catalog", "title_page_cold", lambda i: cold(load_title_screen, title_id, bot1_main.PAGE_SIZE)),
+        ("catalog", "title_page_warm", lambda i: load_title_screen(title_id, bot1_main.PAGE_SIZE)),
+        ("catalog", "category_screen_cold", lambda i: cold(load_category_screen, category_id)),
+        ("catalog", "product_screen_cold", lambda i: cold(load_product_screen, product_id)),
+        ("catalog", "product_screen_warm", lambda i: warm(load_product_screen, product_id)),
+        ("catalog", "size_matrix_build", lambda i: size_matrix()),
+    ]
+
+    async def no_screen():
+        return ()
+
+    async def category():
+        return (await load_category_screen(category_id),)
+
+    async def title():
+        return (await load_title_screen(title_id),)
+
+    async def product():
+        return (await load_product_screen(product_id),)
+
+    async def with_screen(keyboard, screen):
+        # Экран читается в каждом раунде (тёплый — из catalog_cache): загруженный
+        # заранее устаревает после холодных замеров, и его клавиатура не кэшируется
+        return await keyboard(*await screen())
+
+    keyboards = [
+        ("bot1.categories", bot1_main.get_categories_keyboard, no_screen),
+        ("bot1.titles", bot1_main.get_titles_keyboard, category),
+        ("bot1.product_sizes", bot1_main.get_product_sizes_keyboard, product),
+        ("bot2.products", bot2_catalog.get_products_keyboard, title),
+        ("admin.categories", admin_panel.get_categories_admin_keyboard, no_screen),
+        ("admin.products", admin_panel.get_products_admin_keyboard, no_screen),
+        ("admin.sizes", admin_panel.get_sizes_admin_keyboard, no_screen),
+    ]
+    for name, keyboard, screen in keyboards:
+        suite.append(("keyboards", f"{name}_build", lambda i, k=keyboard, s=screen: with_screen(k.__wrapped__, s)))
+        suite.append(("keyboards", f"{name}_cached", lambda i, k=keyboard, s=screen: with_screen(k, s)))
+
+    suite += [
+        ("admin", "delete_title", lambda i: rolled_back(catalog_service.delete_title, title_id)),
+        ("admin", "delete_category", lambda i: rolled_back(catalog_service.delete_category, category_id)),
+        ("stats", "shop_stats", lambda i: shop_stats.get_shop_stats()),
+        ("stats", "revenue_by_day_30", lambda i: shop_stats.revenue_by_day(30)),
+        ("stats", "revenue_by_delivery_method", lambda i: shop_stats.revenue_by_delivery_method()),
+        ("orders", "checkout_order", lambda i: checkout_order(
+            checkout_user + i, "bench", dict(draft, customer_address=f"Москва {i}"), "https://t.me/bench", gateway
+        )),
+    ]
+    return suite
+
+
+def compare(report: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {f"{b['group']}.{b['name']}": b["stats"]["median"] for b in json.load(f)["benchmarks"]}
+    print(f"\nСравнение с {baseline_path}:")
+    print(f"{'замер':<45} {'было, мс':>10} {'стало, мс':>10} {'изменение':>10}")
+    for bench in report["benchmarks"]:
+        name = f"{bench['group']}.{bench['name']}"
+        now = bench["stats"]["median"]
+        if name not in baseline:
+            print(f"{name:<45} {'—':>10} {now * 1e3:>10.3f} {'новый':>10}")
+            continue
+        before = baseline[name]
+        print(f"{name:<45} {before * 1e3:>10.3f} {now * 1e3:>10.3f} {(now / before - 1) * 100:>+9.1f}%")
+
+
+async def run(args) -> dict:
+    from generate_catalog import Volumes, generate
+    from sqlalchemy import func, select
+    from database import DatabaseManager, Product
+
+    volumes = Volumes(args.categories, args.titles, args.products, args.sizes, args.orders)
+    with DatabaseManager.get_session() as db:
+        empty = not db.scalar(select(func.count(Product.id)))
+    generate_seconds = None
+    if empty:
+        started = time.perf_counter()
+        generate(volumes, seed=args.seed)
+        generate_seconds = time.perf_counter() - started
+        print(f"Каталог создан за {generate_seconds:.1f} с")
+
+    suite = await build_suite(*await catalog_ids())
+    results = []
+    print(f"{'замер':<45} {'медиана, мс':>12} {'min, мс':>10} {'раундов':>8}")
+    for group, name, func_ in suite:
+        if args.only and args.only not in f"{group}.{name}":
+            continue
+        timings = await measure(func_, args.min_rounds, args.max_time)
+        result = {"group": group, "name": name, "stats": stats(timings)}
+        results.append(result)
+        s = result["stats"]
+        print(f"{group + '.' + name:<45} {s['median'] * 1e3:>12.3f} {s['min'] * 1e3:>10.3f} {s['rounds']:>8}")
+
+    return {
+        "datetime": datetime.now().isoformat(timespec="seconds"),
+        "commit_info": commit_info(),
+        "machine_info": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "cpu_count": os.cpu_count(),
+        },
+        "volumes": volumes._asdict(),
+        "generated": empty,
+        "generate_seconds": generate_seconds,
+        "options": {"min_rounds": args.min_rounds, "max_time": args.max_time},
+        "benchmarks": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--titles", type=int, default=500)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", help="файл SQLite; пустой заполняется, заполненный переиспользуется")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--max-time", type=float, default=1.0, help="секунд на один замер")
+    parser.add_argument("--only", help="только замеры, в имени которых есть эта подстрока")
+    parser.add_argument("--output", help="путь к отчёту JSON (по умолчанию benchmarks/results/)")
+    parser.add_argument("--compare", help="прошлый отчёт для сравнения медиан")
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix="bench_suite_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(database)}"
+    os.environ.setdefault("BOT1_TOKEN", "123456:BENCH_TOKEN_BOT1")
+    os.environ.setdefault("BOT2_TOKEN", "654321:BENCH_TOKEN_BOT2")
+
+    report = asyncio.run(run(args))
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (report["commit_info"]["id"] or "nocommit")[:8]
+        output = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nОтчёт: {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,25 @@ import asyncio
 import logging
 from aiogram import Bot, Dispatcher, types, F, Router
 from aiogram.enums import ParseMode
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from database import DatabaseManager, Order, Category, Title, Product, Size, ProductSize, Settings
-from config import BOT1_TOKEN, BOT2_TOKEN, COMPANY_INFO, FAQ_ITEMS, DELIVERY_METHODS, ADMIN_IDS
-from yookassa import Configuration, Payment
+from aiogram.fsm.storage.memory import SimpleEventIsolation
+from database import DatabaseManager, Order, Category, Title, Product, Size, Settings
+from catalog_cache import catalog_cache
+from keyboard_cache import keyboard_cache
+from screen_loaders import CategoryScreen, ProductScreen, load_category_screen, load_title_screen, load_product_screen
+from config import BOT1_TOKEN, BOT2_TOKEN, COMPANY_INFO, FAQ_ITEMS, DELIVERY_METHODS, ADMIN_IDS, BOT1_USERNAME, YOOKASSA_RETURN_URL, PAYMENT_WEBHOOK_PORT
+from payment_gateway import payment_gateway
+from payment_reconciler import payment_reconciler
+from payment_webhook import start_payment_webhook
+from order_service import get_manager_link, get_contact_manager_keyboard, payment_thanks_text, checkout_order
 import admin_panel
-import uuid
-import json
+from rate_limiter import install_rate_limiter
+from fsm_storage import fsm_storage
+from order_drafts import load_draft, items_preview, DEEP_LINK_PREFIX
+from catalog_search import catalog_search, get_search_results_keyboard
 import math
 
 # Настройка логирования
@@ -19,7 +28,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и роутера
-bot = Bot(token=BOT1_TOKEN)
+bot = install_rate_limiter(Bot(token=BOT1_TOKEN))
 router = Router()
 
 # Состояния для FSM
@@ -30,9 +39,11 @@ class OrderStates(StatesGroup):
     waiting_for_delivery = State()
     confirming_order = State()
 
-# Настройка Юкассы
-Configuration.account_id = "your_shop_id"  # Замените на ваш shop_id
-Configuration.secret_key = "your_secret_key"  # Замените на ваш secret_key
+async def get_return_url() -> str:
+    """Куда Юкасса вернёт покупателя после оплаты"""
+    if YOOKASSA_RETURN_URL:
+        return YOOKASSA_RETURN_URL
+    return f"https://t.me/{BOT1_USERNAME or (await bot.me()).username}"
 
 # Клавиатуры и константы
 PAGE_SIZE = 10
@@ -47,18 +58,6 @@ async def safe_edit_message(message: types.Message, text: str, reply_markup: Inl
     except Exception:
         await message.answer(text, reply_markup=reply_markup)
 
-def get_manager_link(order_id: int | None = None) -> str:
-    """Возвращает ссылку на менеджера с нужной реф-меткой."""
-    if order_id:
-        return f"https://t.me/kxrmxx_shop_bot?start=tgbot_zakaz_{order_id}"
-    return "https://t.me/kxrmxx_shop_bot?start=iz_bota_ne_oformil"
-
-def get_contact_manager_keyboard(order_id: int | None = None) -> InlineKeyboardMarkup:
-    """Клавиатура с кнопкой связи с менеджером."""
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🧑‍💼 Связаться с менеджером", url=get_manager_link(order_id))]
-    ])
-
 # Скрываемое описание товара (спойлер)
 PRODUCT_SPOILER_TEXT = (
     "<b>Подробнее о наших ночниках</b>\n"
@@ -95,69 +94,66 @@ def get_product_info_keyboard(product_id: int):
 # ======================
 # Каталог: клавиатуры
 # ======================
-def get_categories_keyboard():
+@keyboard_cache.cached
+async def get_categories_keyboard():
     """Клавиатура категорий"""
-    with DatabaseManager.get_session() as db:
-        categories = db.query(Category).all()
+    categories = await catalog_cache.categories()
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=f"📂 {cat.name}", callback_data=f"category_{cat.id}")]
         for cat in categories
     ] + [[InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_main")]])
     return keyboard
 
-def get_titles_keyboard(category_id: int):
+@keyboard_cache.cached(key=lambda screen: screen.category_id)
+async def get_titles_keyboard(screen: CategoryScreen):
     """Клавиатура тайтлов для категории"""
-    with DatabaseManager.get_session() as db:
-        titles = db.query(Title).filter(Title.category_id == category_id).all()
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=f"📖 {title.name}", callback_data=f"title_{title.id}")]
-        for title in titles
+        for title in screen.titles
     ] + [[InlineKeyboardButton(text="🔙 К категориям", callback_data="catalog")]])
     return keyboard
 
-def get_products_nav_keyboard(title_id: int, page: int, total_pages: int):
-    """Клавиатура навигации по страницам товаров"""
+def get_products_nav_keyboard(title_id: int, page: int, total_pages: int,
+                              first_id: int | None = None, last_id: int | None = None):
+    """Клавиатура навигации по страницам товаров.
+
+    В callback_data передаётся курсор: a<id> — товары после последнего показанного,
+    b<id> — товары перед первым показанным.
+    """
     buttons = []
     row = []
-    if page > 1:
-        row.append(InlineKeyboardButton(text="⬅️ Предыдущая", callback_data=f"products_page_{title_id}_{page-1}"))
-    if page < total_pages:
-        row.append(InlineKeyboardButton(text="➡️ Следующая", callback_data=f"products_page_{title_id}_{page+1}"))
+    if page > 1 and first_id is not None:
+        row.append(InlineKeyboardButton(text="⬅️ Предыдущая", callback_data=f"products_page_{title_id}_{page-1}_b{first_id}"))
+    if page < total_pages and last_id is not None:
+        row.append(InlineKeyboardButton(text="➡️ Следующая", callback_data=f"products_page_{title_id}_{page+1}_a{last_id}"))
     if row:
         buttons.append(row)
     buttons.append([InlineKeyboardButton(text="🔙 К тайтлам", callback_data=f"back_to_titles_{title_id}")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-def paginate_products(title_id: int, page: int):
-    """Возвращает список продуктов для страницы и общее число страниц"""
-    with DatabaseManager.get_session() as db:
-        q = db.query(Product).filter(
-            Product.title_id == title_id,
-            Product.is_active == True
-        )
-        total = q.count()
-        total_pages = max(1, math.ceil(total / PAGE_SIZE))
-        offset = (page - 1) * PAGE_SIZE
-        products = q.order_by(Product.id.desc()).offset(offset).limit(PAGE_SIZE).all()
-    return products, total_pages
-
-async def show_products_page(callback: types.CallbackQuery, title_id: int, page: int):
+async def show_products_page(callback: types.CallbackQuery, title_id: int, page: int,
+                             after_id: int | None = None, before_id: int | None = None):
     """Отображает страницу с товарами (до 10 карточек) и навигацию"""
-    with DatabaseManager.get_session() as db:
-        title = db.query(Title).filter(Title.id == title_id).first()
-    products, total_pages = paginate_products(title_id, page)
+    if page <= 1:
+        # Первая страница всегда полная, даже если курсор «назад» устарел
+        page, after_id, before_id = 1, None, None
+    screen = await load_title_screen(title_id, PAGE_SIZE, after_id=after_id, before_id=before_id)
+    title, products = screen.title, screen.products
+    total_pages = max(1, math.ceil(screen.total / PAGE_SIZE))
+    page = min(page, total_pages)
+    first_id = products[0].id if products else None
+    last_id = products[-1].id if products else None
+    nav_kb = get_products_nav_keyboard(title_id, page, total_pages, first_id, last_id)
     # Удаляем предыдущий текст и показываем заголовок + пагинацию
     header = f"Вот наши работы по «{title.name}» ✨\nСтраница {page}/{total_pages}"
     try:
-        await callback.message.edit_text(header, reply_markup=get_products_nav_keyboard(title_id, page, total_pages))
+        await callback.message.edit_text(header, reply_markup=nav_kb)
     except Exception:
         # если нельзя отредактировать (например, фото), отправим новое сообщение
-        await callback.message.answer(header, reply_markup=get_products_nav_keyboard(title_id, page, total_pages))
+        await callback.message.answer(header, reply_markup=nav_kb)
     # Отправляем карточки товаров
     for product in products:
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📦 Открыть размеры", callback_data=f"product_{product.id}")]
-        ])
+        kb = await get_product_card_keyboard(product.id)
         if getattr(product, 'photo_url', None):
             try:
                 await callback.message.answer_photo(photo=product.photo_url, caption=f"🛍️ {product.name}", reply_markup=kb)
@@ -166,18 +162,23 @@ async def show_products_page(callback: types.CallbackQuery, title_id: int, page:
         else:
             await callback.message.answer(f"🛍️ {product.name}", reply_markup=kb)
 
-def get_product_sizes_keyboard(product_id: int):
+@keyboard_cache.cached
+async def get_product_card_keyboard(product_id: int):
+    """Кнопка под карточкой товара на странице тайтла"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📦 Открыть размеры", callback_data=f"product_{product_id}")]
+    ])
+
+@keyboard_cache.cached(key=lambda screen: screen.product_id)
+async def get_product_sizes_keyboard(screen: ProductScreen):
     """Клавиатура размеров для товара"""
-    with DatabaseManager.get_session() as db:
-        product_sizes = db.query(ProductSize, Size).join(Size).filter(
-            ProductSize.product_id == product_id
-        ).all()
+    product_id = screen.product_id
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
             text=f"📏 {sz.name} - {sz.price}₽",
             callback_data=f"add_to_cart_{product_id}_{sz.id}"
         )]
-        for ps, sz in product_sizes
+        for sz in screen.sizes
     ] + [
         [InlineKeyboardButton(text="ℹ️ Подробнее", callback_data=f"product_info_{product_id}")],
         [InlineKeyboardButton(text="🔙 К товарам", callback_data=f"back_to_products_{product_id}")]
@@ -201,7 +202,6 @@ def get_payment_keyboard(payment_url):
     """Клавиатура для оплаты"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="💳 Оплатить", url=payment_url)],
-        [InlineKeyboardButton(text="✅ Я оплатил", callback_data="confirm_payment")],
         [InlineKeyboardButton(text="❌ Отменить заказ", callback_data="cancel_order")],
         [InlineKeyboardButton(text="🔙 Главное меню", callback_data="back_to_main")]
     ])
@@ -209,8 +209,12 @@ def get_payment_keyboard(payment_url):
 
 # Обработчики команд
 @router.message(Command("start"))
-async def cmd_start(message: types.Message):
-    """Обработчик команды /start"""
+async def cmd_start(message: types.Message, state: FSMContext, command: CommandObject):
+    """Обработчик команды /start (в том числе перехода из бота каталога: /start order_<token>)"""
+    if command.args and command.args.startswith(DEEP_LINK_PREFIX):
+        await process_order_from_catalog(message, state, command.args[len(DEEP_LINK_PREFIX):])
+        return
+    
     welcome_text = f"""
 Привет 👋  
 Добро пожаловать в {COMPANY_INFO['name']}! Мы создаём индивидуальные ночники и настенные панели по любым вашим любимым героям ✨  
@@ -225,6 +229,18 @@ async def cmd_start(message: types.Message):
         reply_markup=get_main_keyboard()
     )
 
+@router.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject):
+    """Поиск товара по названию товара, тайтла или категории: /search эрен"""
+    if not command.args:
+        await message.answer("🔎 Напишите, что ищете, после команды. Например: /search эрен")
+        return
+    products = await catalog_search.search(command.args)
+    if not products:
+        await message.answer("😔 Ничего не нашлось. Попробуйте другое название или загляните в каталог.", reply_markup=get_main_keyboard())
+        return
+    await message.answer(f"🔎 Нашлось по запросу «{command.args}»:", reply_markup=await get_search_results_keyboard(products))
+
 # ======================
 # Админ панель (вызов из основного бота)
 # ======================
@@ -243,30 +259,28 @@ async def process_catalog(callback: types.CallbackQuery):
     catalog_text = """📂 Выберите категорию:
 
 Здесь вы найдете ночники разных тематик и стилей."""
-    await safe_edit_message(callback.message, catalog_text, reply_markup=get_categories_keyboard())
+    await safe_edit_message(callback.message, catalog_text, reply_markup=await get_categories_keyboard())
 
 @router.callback_query(F.data.startswith("category_"))
 async def process_category(callback: types.CallbackQuery):
     """Показ тайтлов в категории"""
     category_id = int(callback.data.split("_")[1])
-    with DatabaseManager.get_session() as db:
-        category = db.query(Category).filter(Category.id == category_id).first()
-        titles = db.query(Title).filter(Title.category_id == category_id).all()
-    if not titles:
-        titles_text = f"📂 {category.name}\n\nВ этой категории пока нет тайтлов."
+    screen = await load_category_screen(category_id)
+    if not screen.titles:
+        titles_text = f"📂 {screen.category.name}\n\nВ этой категории пока нет тайтлов."
     else:
         titles_text = f"Крутой выбор 🔥  \nТеперь выберите тайтл из списка 👇"
-    await safe_edit_message(callback.message, titles_text, reply_markup=get_titles_keyboard(category_id))
+    await safe_edit_message(callback.message, titles_text, reply_markup=await get_titles_keyboard(screen))
 
 @router.callback_query(F.data.startswith("back_to_titles_"))
 async def process_back_to_titles(callback: types.CallbackQuery):
     """Возврат к тайтлам выбранной категории"""
     # параметр содержит title_id, нам нужен category по этому title
     title_id = int(callback.data.split("_")[3])
-    with DatabaseManager.get_session() as db:
-        title = db.query(Title).filter(Title.id == title_id).first()
+    title = await catalog_cache.title(title_id)
     if title:
-        await safe_edit_message(callback.message, "Выберите тайтл:", reply_markup=get_titles_keyboard(title.category_id))
+        screen = await load_category_screen(title.category_id)
+        await safe_edit_message(callback.message, "Выберите тайтл:", reply_markup=await get_titles_keyboard(screen))
     else:
         await process_catalog(callback)
 
@@ -283,14 +297,23 @@ async def process_products_page(callback: types.CallbackQuery):
     parts = callback.data.split("_")
     title_id = int(parts[2])
     page = int(parts[3])
-    await show_products_page(callback, title_id, page)
+    after_id = before_id = None
+    if len(parts) > 4:
+        cursor = parts[4]
+        if cursor.startswith("a"):
+            after_id = int(cursor[1:])
+        elif cursor.startswith("b"):
+            before_id = int(cursor[1:])
+    elif page > 1:
+        # Кнопки старого формата без курсора: начинаем с первой страницы
+        page = 1
+    await show_products_page(callback, title_id, page, after_id=after_id, before_id=before_id)
 
 @router.callback_query(F.data.startswith("back_to_products_"))
 async def process_back_to_products(callback: types.CallbackQuery):
     """Возврат к товарам для тайтла товара"""
     product_id = int(callback.data.split("_")[3])
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
+    product = await catalog_cache.product(product_id)
     if not product:
         await process_catalog(callback)
         return
@@ -303,21 +326,10 @@ async def process_product(callback: types.CallbackQuery):
     """Показ товара и его размеров"""
     parts = callback.data.split("_")
     product_id = int(parts[1])
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        product_sizes = db.query(ProductSize, Size).join(Size).filter(
-            ProductSize.product_id == product_id
-        ).all()
-        # Если у товара нет связей размеров (наследие), автопривяжем все размеры
-        if not product_sizes:
-            sizes_all = db.query(Size).all()
-            for sz in sizes_all:
-                db.add(ProductSize(product_id=product.id, size_id=sz.id))
-            db.commit()
-            product_sizes = db.query(ProductSize, Size).join(Size).filter(
-                ProductSize.product_id == product_id
-            ).all()
-    if not product_sizes:
+    # Товары без связей размеров (наследие) привязаны миграцией 5, здесь только чтение
+    screen = await load_product_screen(product_id)
+    product = screen.product
+    if not screen.sizes:
         product_text = f"""🛍️ {product.name}
 
 ❌ У этого товара пока нет доступных размеров."""
@@ -326,7 +338,7 @@ async def process_product(callback: types.CallbackQuery):
 
 📏 Выберите размер:"""
     # Пытаемся показать фото (file_id предпочтительно). Если не получится — показываем текст.
-    kb = get_product_sizes_keyboard(product_id)
+    kb = await get_product_sizes_keyboard(screen)
     sent = False
     if product.photo_url:
         try:
@@ -347,9 +359,9 @@ async def process_product(callback: types.CallbackQuery):
 async def process_product_info(callback: types.CallbackQuery):
     """Показывает скрываемое описание товара по запросу пользователя"""
     product_id = int(callback.data.split("_")[2])
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        settings = db.query(Settings).filter(Settings.id == 1).first()
+    product = await catalog_cache.product(product_id)
+    async with DatabaseManager.get_async_session() as db:
+        settings = await db.get(Settings, 1)
     title = f"🛍️ {product.name}\n\n" if product else ""
     desc_text = (settings.description_text if settings and settings.description_text else PRODUCT_SPOILER_TEXT)
     photo_id = settings.desc_photo_file_id if settings else None
@@ -385,15 +397,12 @@ async def process_product_info(callback: types.CallbackQuery):
 async def process_back_to_sizes(callback: types.CallbackQuery):
     """Возврат из окна описания к размерам для конкретного товара"""
     product_id = int(callback.data.split("_")[3])
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        product_sizes = db.query(ProductSize, Size).join(Size).filter(
-            ProductSize.product_id == product_id
-        ).all()
+    screen = await load_product_screen(product_id)
+    product = screen.product
     if not product:
         await process_catalog(callback)
         return
-    if not product_sizes:
+    if not screen.sizes:
         product_text = f"""🛍️ {product.name}
 
 ❌ У этого товара пока нет доступных размеров."""
@@ -401,7 +410,7 @@ async def process_back_to_sizes(callback: types.CallbackQuery):
         product_text = f"""🛍️ {product.name}
 
 📏 Выберите размер:"""
-    kb = get_product_sizes_keyboard(product_id)
+    kb = await get_product_sizes_keyboard(screen)
     # Если у товара есть фото — покажем карточку с фото, как в process_product
     if getattr(product, 'photo_url', None):
         try:
@@ -477,9 +486,11 @@ async def process_add_to_cart(callback: types.CallbackQuery, state: FSMContext):
     parts = callback.data.split("_")
     product_id = int(parts[3])
     size_id = int(parts[4])
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        size = db.query(Size).filter(Size.id == size_id).first()
+    if not await catalog_cache.has_size(product_id, size_id):
+        await callback.answer("❌ Этот размер больше недоступен для товара", show_alert=True)
+        return
+    product = await catalog_cache.product(product_id)
+    size = await catalog_cache.size(size_id)
     # Собираем order_data в формате, который уже понимает текущий флоу
     order_data = {
         'user_id': callback.from_user.id,
@@ -589,24 +600,33 @@ async def process_back_to_main(callback: types.CallbackQuery, state: FSMContext)
     await safe_edit_message(callback.message, welcome_text, reply_markup=get_main_keyboard())
 
 # Обработка заказа от бота каталога
-@router.message(F.text.startswith("ORDER_DATA:"))
-async def process_order_from_catalog(message: types.Message, state: FSMContext):
-    """Обработка данных заказа от бота каталога"""
+async def process_order_from_catalog(message: types.Message, state: FSMContext, token: str):
+    """Загрузка черновика заказа, сохранённого ботом каталога"""
     try:
-        # Парсим данные заказа
-        order_data = json.loads(message.text.replace("ORDER_DATA:", ""))
+        draft = await load_draft(token, message.from_user.id)
+        if draft is None:
+            await message.answer(
+                "❌ Ссылка на заказ устарела. Соберите корзину в каталоге заново.",
+                reply_markup=get_main_keyboard()
+            )
+            return
+        
+        # Новый заказ: данные прошлого незавершённого оформления не нужны
+        await state.clear()
+        order_data = {
+            'user_id': draft.user_id,
+            'username': draft.username or "",
+            'items': draft.items
+        }
         
         # Сохраняем данные заказа в состоянии
         await state.update_data(order_data=order_data)
         
         # Формируем сообщение с выбранными товарами
         items_text = "Вы выбрали:\n\n"
-        total_price = 0
         
-        for item in order_data['items']:
-            items_text += f"• {item['product_name']} · {item['size_name']}\n"
-            items_text += f"  Цена: {item['price']} ₽\n\n"
-            total_price += item['price']
+        items_text += items_preview(order_data['items'], "• {product_name} · {size_name}\n  Цена: {price} ₽\n\n")
+        total_price = sum(item['price'] for item in order_data['items'])
         
         items_text += f"💰 Итого товаров: {total_price} ₽\n"
         items_text += f"🎁 Скидка {COMPANY_INFO['discount_percent']}%: -{total_price * COMPANY_INFO['discount_percent'] / 100} ₽\n\n"
@@ -700,62 +720,24 @@ async def process_create_payment(callback: types.CallbackQuery, state: FSMContex
     try:
         # Получаем данные заказа
         data = await state.get_data()
-        order_data = data['order_data']
         final_price = data['final_price']
-        delivery_method = data['delivery_method']
-        delivery_price = data['delivery_price']
-        customer_name = data.get('customer_name')
-        customer_phone = data.get('customer_phone')
-        customer_address = data.get('customer_address')
         
-        # Создаем заказ в базе данных
-        with DatabaseManager.get_session() as db:
-            # Вкладываем данные клиента в items[0], чтобы не менять схему БД
-            items_enriched = [dict(order_data['items'][0])]
-            items_enriched[0]['customer_name'] = customer_name
-            items_enriched[0]['customer_phone'] = customer_phone
-            items_enriched[0]['customer_address'] = customer_address
-            order = Order(
-                user_id=callback.from_user.id,
-                username=callback.from_user.username or "",
-                items=items_enriched,
-                delivery_method=delivery_method,
-                delivery_price=delivery_price,
-                total_price=final_price,
-                discount_amount=data['discount_amount'],
-                status="pending"
-            )
-            db.add(order)
-            db.commit()
-            db.refresh(order)
-            
-            order_id = order.id
-        
-        # Создаем платеж в Юкассе
-        payment = Payment.create({
-            "amount": {"value": f"{final_price:.2f}", "currency": "RUB"},
-            "confirmation": {"type": "redirect", "return_url": f"https://t.me/your_bot"},
-            "capture": True,
-            "description": f"Заказ #{order_id} - Ночники"
-        }, str(uuid.uuid4()))
-        
-        # Обновляем заказ с данными платежа
-        with DatabaseManager.get_session() as db:
-            db_order = db.query(Order).filter(Order.id == order_id).first()
-            db_order.payment_url = payment.confirmation.confirmation_url
-            db_order.payment_id = payment.id
-            db.commit()
+        # Повторное нажатие с тем же черновиком вернёт уже созданный заказ и ссылку
+        checkout = await checkout_order(
+            callback.from_user.id, callback.from_user.username or "", data, await get_return_url()
+        )
+        order_id = checkout.order_id
         
         payment_text = f"""💳 Оплата заказа #{order_id}
 
 Сумма к оплате: **{final_price:.0f} ₽**
 
-Нажмите на кнопку ниже для перехода к оплате:"""
+Нажмите на кнопку ниже для перехода к оплате. Как только оплата пройдёт, бот сам пришлёт подтверждение."""
         
-        # Сохраняем в состоянии, чтобы проверить оплату по кнопке "Я оплатил"
-        await state.update_data(order_id=order_id, payment_id=payment.id)
+        # Номер заказа в состоянии: сверка платежей сбросит состояние после оплаты
+        await state.update_data(order_id=order_id, payment_id=checkout.payment_id)
 
-        await safe_edit_message(callback.message, payment_text, reply_markup=get_payment_keyboard(payment.confirmation.confirmation_url))
+        await safe_edit_message(callback.message, payment_text, reply_markup=get_payment_keyboard(checkout.payment_url))
         
     except Exception as e:
         logger.error(f"Ошибка создания платежа: {e}")
@@ -763,35 +745,19 @@ async def process_create_payment(callback: types.CallbackQuery, state: FSMContex
 
 @router.callback_query(F.data == "confirm_payment")
 async def process_confirm_payment(callback: types.CallbackQuery, state: FSMContext):
-    """Проверка статуса оплаты и завершение оформления"""
+    """Кнопка «Я оплатил» из старых сообщений: статус берётся из БД, его обновляет сверка платежей"""
     try:
         data = await state.get_data()
         order_id = data.get('order_id')
-        payment_id = data.get('payment_id')
-        if not order_id or not payment_id:
+        if not order_id:
             await callback.message.answer("❌ Не найден активный заказ для проверки оплаты.")
             return
-        # Проверяем статус платежа в Юкассе
-        payment_obj = Payment.find_one(payment_id)
-        status = getattr(payment_obj, 'status', None)
-        if status != 'succeeded':
-            await callback.message.answer("⏳ Оплата ещё не найдена. Если вы уже оплатили, подождите минутку и нажмите кнопку снова.")
+        async with DatabaseManager.get_async_session() as db:
+            order = await db.get(Order, order_id)
+        if order is None or order.status != 'paid':
+            await callback.message.answer("⏳ Оплата ещё не поступила. Как только она пройдёт, бот сам пришлёт подтверждение.")
             return
-        # Обновляем заказ: помечаем оплаченным
-        with DatabaseManager.get_session() as db:
-            order = db.query(Order).filter(Order.id == order_id).first()
-            if order:
-                order.status = 'paid'
-                db.commit()
-        # Отправляем благодарность и ссылку менеджера с рефметкой
-        manager_link = get_manager_link(order_id)
-        thank_text = (
-            "Спасибо за заказ ❤️\n"
-            f"Ваш ночник уже взяли в работу. Номер заказа: {order_id}\n\n"
-            "Перейдите, пожалуйста, по ссылке, чтобы наш менеджер подтвердил ваш заказ:\n\n"
-            f"{manager_link}"
-        )
-        await callback.message.answer(thank_text, reply_markup=get_contact_manager_keyboard(order_id))
+        await callback.message.answer(payment_thanks_text(order_id), reply_markup=get_contact_manager_keyboard(order_id))
         await state.clear()
     except Exception as e:
         logger.error(f"Ошибка при подтверждении оплаты: {e}")
@@ -808,15 +774,29 @@ async def process_cancel_order(callback: types.CallbackQuery, state: FSMContext)
     
     await safe_edit_message(callback.message, cancel_text, reply_markup=get_main_keyboard())
 
+# Диспетчер: общий для polling и webhook (webhook_server.py).
+# Состояния — в БД, обновления одного пользователя обрабатываются по очереди
+dp = Dispatcher(storage=fsm_storage, events_isolation=SimpleEventIsolation())
+fsm_storage.setup(dp)
+dp.startup.register(payment_reconciler.start)
+dp.shutdown.register(payment_reconciler.close)
+dp.shutdown.register(payment_gateway.close)
+dp.include_router(router)
+dp.include_router(admin_panel.router)
+
 # Функция для запуска бота
 async def main():
     """Запуск бота"""
     logger.info("Запуск основного бота...")
-    # Создаем диспетчер и подключаем роутеры
-    dp = Dispatcher()
-    dp.include_router(router)
-    dp.include_router(admin_panel.router)
-    await dp.start_polling(bot)
+    # Если бот раньше работал через вебхук, getUpdates без этого не отдаст обновления
+    await bot.delete_webhook()
+    # Уведомления Юкассы принимаются рядом с ботом, если задан порт
+    payment_runner = await start_payment_webhook(bot) if PAYMENT_WEBHOOK_PORT else None
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if payment_runner is not None:
+            await payment_runner.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,24 +1,34 @@
 import asyncio
 import logging
-import json
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultArticle, InputTextMessageContent
+)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from database import DatabaseManager, Category, Title, Product, Size, ProductSize
-from config import BOT2_TOKEN, ADMIN_IDS, BOT1_TOKEN
+from aiogram.fsm.storage.memory import SimpleEventIsolation
+from catalog_cache import catalog_cache
+from keyboard_cache import keyboard_cache
+from screen_loaders import CategoryScreen, TitleScreen, ProductScreen, load_category_screen, load_title_screen, load_product_screen
+from cart_store import cart_store
+from order_drafts import create_draft, items_preview, DEEP_LINK_PREFIX, ITEMS_PREVIEW_LIMIT
+from catalog_search import catalog_search, get_search_results_keyboard, PRODUCT_DEEP_LINK_PREFIX
+from fsm_storage import fsm_storage
+from rate_limiter import install_rate_limiter
+from config import BOT2_TOKEN, ADMIN_IDS, BOT1_TOKEN, BOT1_USERNAME, SEARCH_INLINE_LIMIT, SEARCH_INLINE_CACHE_TIME
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Инициализация бота
-bot = Bot(token=BOT2_TOKEN)
-bot1 = Bot(token=BOT1_TOKEN)  # Бот для отправки заказов
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+bot = install_rate_limiter(Bot(token=BOT2_TOKEN))
+dp = Dispatcher(storage=fsm_storage, events_isolation=SimpleEventIsolation())
+fsm_storage.setup(dp)
+# Корзины пишутся в БД фоном: запускаем и дописываем остаток вместе с диспетчером
+dp.startup.register(cart_store.start)
+dp.shutdown.register(cart_store.close)
 
 # Состояния для FSM
 class AdminStates(StatesGroup):
@@ -35,47 +45,19 @@ class CartStates(StatesGroup):
     viewing_product = State()
     viewing_cart = State()
 
-# Класс для работы с корзиной
-class Cart:
-    def __init__(self):
-        self.items = []
-    
-    def add_item(self, product_id, size_id, product_name, size_name, price):
-        """Добавление товара в корзину"""
-        item = {
-            'product_id': product_id,
-            'size_id': size_id,
-            'product_name': product_name,
-            'size_name': size_name,
-            'price': price
-        }
-        self.items.append(item)
-    
-    def remove_item(self, index):
-        """Удаление товара из корзины"""
-        if 0 <= index < len(self.items):
-            self.items.pop(index)
-    
-    def clear(self):
-        """Очистка корзины"""
-        self.items = []
-    
-    def get_total_price(self):
-        """Получение общей стоимости"""
-        return sum(item['price'] for item in self.items)
-    
-    def is_empty(self):
-        """Проверка на пустоту корзины"""
-        return len(self.items) == 0
-
-# Словарь для хранения корзин пользователей
-user_carts = {}
-
-def get_user_cart(user_id):
-    """Получение корзины пользователя"""
-    if user_id not in user_carts:
-        user_carts[user_id] = Cart()
-    return user_carts[user_id]
+# Имя основного бота для ссылки на оформление заказа
+_bot1_username = BOT1_USERNAME
+
+async def get_bot1_username():
+    """Имя основного бота: из BOT1_USERNAME или один раз через getMe"""
+    global _bot1_username
+    if not _bot1_username:
+        bot1 = Bot(token=BOT1_TOKEN)
+        try:
+            _bot1_username = (await bot1.get_me()).username
+        finally:
+            await bot1.session.close()
+    return _bot1_username
 
 # Клавиатуры
 def get_main_keyboard():
@@ -86,10 +68,10 @@ def get_main_keyboard():
     ])
     return keyboard
 
-def get_categories_keyboard():
+@keyboard_cache.cached
+async def get_categories_keyboard():
     """Клавиатура категорий"""
-    with DatabaseManager.get_session() as db:
-        categories = db.query(Category).all()
+    categories = await catalog_cache.categories()
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=f"📂 {cat.name}", callback_data=f"category_{cat.id}")] 
@@ -98,55 +80,41 @@ def get_categories_keyboard():
     
     return keyboard
 
-def get_titles_keyboard(category_id):
+@keyboard_cache.cached(key=lambda screen: screen.category_id)
+async def get_titles_keyboard(screen: CategoryScreen):
     """Клавиатура тайтлов для категории"""
-    with DatabaseManager.get_session() as db:
-        titles = db.query(Title).filter(Title.category_id == category_id).all()
-    
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=f"📖 {title.name}", callback_data=f"title_{title.id}")] 
-        for title in titles
+        for title in screen.titles
     ] + [[InlineKeyboardButton(text="🔙 К категориям", callback_data="back_to_categories")]])
     
     return keyboard
 
-def get_products_keyboard(title_id):
+@keyboard_cache.cached(key=lambda screen: screen.title_id)
+async def get_products_keyboard(screen: TitleScreen):
     """Клавиатура товаров для тайтла"""
-    with DatabaseManager.get_session() as db:
-        products = db.query(Product).filter(
-            Product.title_id == title_id,
-            Product.is_active == True
-        ).all()
-    
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=f"🛍️ {product.name}", callback_data=f"product_{product.id}")] 
-        for product in products
+        for product in screen.products
     ] + [[InlineKeyboardButton(text="🔙 К тайтлам", callback_data=f"back_to_titles")]])
     
     return keyboard
 
-def get_product_sizes_keyboard(product_id, user_id):
+@keyboard_cache.cached(key=lambda screen: screen.product_id)
+async def get_product_sizes_keyboard(screen: ProductScreen):
     """Клавиатура размеров для товара"""
-    with DatabaseManager.get_session() as db:
-        product_sizes = db.query(ProductSize, Size).join(Size).filter(
-            ProductSize.product_id == product_id
-        ).all()
-    
-    # product_sizes возвращает список кортежей (ProductSize, Size)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
             text=f"📏 {sz.name} - {sz.price}₽",
-            callback_data=f"add_to_cart_{product_id}_{sz.id}"
+            callback_data=f"add_to_cart_{screen.product_id}_{sz.id}"
         )]
-        for ps, sz in product_sizes
+        for sz in screen.sizes
     ] + [[InlineKeyboardButton(text="🔙 К товарам", callback_data="back_to_products")]])
     
     return keyboard
 
-def get_cart_keyboard(user_id):
+def get_cart_keyboard(cart):
     """Клавиатура корзины"""
-    cart = get_user_cart(user_id)
-    
     if cart.is_empty():
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔙 Главное меню", callback_data="main_menu")]
@@ -162,8 +130,14 @@ def get_cart_keyboard(user_id):
 
 # Обработчики команд
 @dp.message(Command("start"))
-async def cmd_start(message: types.Message):
-    """Обработчик команды /start"""
+async def cmd_start(message: types.Message, command: CommandObject):
+    """Обработчик команды /start (в том числе перехода из inline-поиска: /start product_<id>)"""
+    if command.args and command.args.startswith(PRODUCT_DEEP_LINK_PREFIX):
+        product_id = command.args[len(PRODUCT_DEEP_LINK_PREFIX):]
+        if product_id.isdigit():
+            await send_product(message, int(product_id))
+            return
+    
     welcome_text = """Привет 👋  
 Я — каталог ночников!  
 
@@ -193,62 +167,70 @@ async def process_catalog(callback: types.CallbackQuery):
 
 Здесь вы найдете ночники разных тематик и стилей."""
     
-    await callback.message.edit_text(catalog_text, reply_markup=get_categories_keyboard())
+    await callback.message.edit_text(catalog_text, reply_markup=await get_categories_keyboard())
 
 @dp.callback_query(F.data.startswith("category_"))
 async def process_category(callback: types.CallbackQuery):
     """Показ тайтлов в категории"""
     category_id = int(callback.data.split("_")[1])
     
-    with DatabaseManager.get_session() as db:
-        category = db.query(Category).filter(Category.id == category_id).first()
-        titles = db.query(Title).filter(Title.category_id == category_id).all()
+    screen = await load_category_screen(category_id)
     
-    if not titles:
-        titles_text = f"📂 {category.name}\n\nВ этой категории пока нет тайтлов."
+    if not screen.titles:
+        titles_text = f"📂 {screen.category.name}\n\nВ этой категории пока нет тайтлов."
     else:
         titles_text = f"Крутой выбор 🔥  \nТеперь выберите тайтл из списка 👇"
     
-    await callback.message.edit_text(titles_text, reply_markup=get_titles_keyboard(category_id))
+    await callback.message.edit_text(titles_text, reply_markup=await get_titles_keyboard(screen))
 
 @dp.callback_query(F.data.startswith("title_"))
 async def process_title(callback: types.CallbackQuery):
     """Показ товаров в тайтле"""
     title_id = int(callback.data.split("_")[1])
     
-    with DatabaseManager.get_session() as db:
-        title = db.query(Title).filter(Title.id == title_id).first()
-        products = db.query(Product).filter(
-            Product.title_id == title_id,
-            Product.is_active == True
-        ).all()
+    screen = await load_title_screen(title_id)
+    title = screen.title
     
-    if not products:
+    if not screen.products:
         products_text = f"📖 {title.name}\n\nВ этом тайтле пока нет товаров."
     else:
         products_text = f"Вот наши работы по «{title.name}» ✨  \n\nВыберите модель и размер:"
     
-    await callback.message.edit_text(products_text, reply_markup=get_products_keyboard(title_id))
+    await callback.message.edit_text(products_text, reply_markup=await get_products_keyboard(screen))
+
+def get_product_text(screen: ProductScreen) -> str:
+    """Текст карточки товара"""
+    product = screen.product
+    if not screen.sizes:
+        return f"""🛍️ {product.name}
+
+❌ У этого товара пока нет доступных размеров."""
+    return f"""🛍️ {product.name}
+
+📏 Выберите размер:"""
+
+async def send_product(message: types.Message, product_id: int):
+    """Карточка товара новым сообщением"""
+    screen = await load_product_screen(product_id)
+    product = screen.product
+    if not product or not product.is_active:
+        await message.answer("❌ Товар не найден. Загляните в каталог:", reply_markup=get_main_keyboard())
+        return
+    product_text = get_product_text(screen)
+    keyboard = await get_product_sizes_keyboard(screen)
+    if product.photo_url:
+        await message.answer_photo(photo=product.photo_url, caption=product_text, reply_markup=keyboard)
+    else:
+        await message.answer(product_text, reply_markup=keyboard)
 
 @dp.callback_query(F.data.startswith("product_"))
 async def process_product(callback: types.CallbackQuery):
     """Показ товара и его размеров"""
     product_id = int(callback.data.split("_")[1])
     
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        product_sizes = db.query(ProductSize, Size).join(Size).filter(
-            ProductSize.product_id == product_id
-        ).all()
-    
-    if not product_sizes:
-        product_text = f"""🛍️ {product.name}
-
-❌ У этого товара пока нет доступных размеров."""
-    else:
-        product_text = f"""🛍️ {product.name}
-
-📏 Выберите размер:"""
+    screen = await load_product_screen(product_id)
+    product = screen.product
+    product_text = get_product_text(screen)
     
     # Отправляем фото товара, если есть
     if product.photo_url:
@@ -256,12 +238,12 @@ async def process_product(callback: types.CallbackQuery):
         await callback.message.answer_photo(
             photo=product.photo_url,
             caption=product_text,
-            reply_markup=get_product_sizes_keyboard(product_id, callback.from_user.id)
+            reply_markup=await get_product_sizes_keyboard(screen)
         )
     else:
         await callback.message.edit_text(
             product_text,
-            reply_markup=get_product_sizes_keyboard(product_id, callback.from_user.id)
+            reply_markup=await get_product_sizes_keyboard(screen)
         )
 
 @dp.callback_query(F.data.startswith("add_to_cart_"))
@@ -270,14 +252,17 @@ async def process_add_to_cart(callback: types.CallbackQuery):
     parts = callback.data.split("_")
     product_id = int(parts[3])
     size_id = int(parts[4])
+    if not await catalog_cache.has_size(product_id, size_id):
+        await callback.answer("❌ Этот размер больше недоступен для товара", show_alert=True)
+        return
     
-    with DatabaseManager.get_session() as db:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        size = db.query(Size).filter(Size.id == size_id).first()
+    product = await catalog_cache.product(product_id)
+    size = await catalog_cache.size(size_id)
     
     # Добавляем товар в корзину
-    cart = get_user_cart(callback.from_user.id)
+    cart = await cart_store.get(callback.from_user.id)
     cart.add_item(product_id, size_id, product.name, size.name, size.price)
+    await cart_store.save(callback.from_user.id, cart)
     
     success_text = f"""✅ {product.name} · {size.name} добавлен в корзину!  
 
@@ -293,7 +278,7 @@ async def process_add_to_cart(callback: types.CallbackQuery):
 @dp.callback_query(F.data == "cart")
 async def process_cart(callback: types.CallbackQuery):
     """Показ корзины"""
-    cart = get_user_cart(callback.from_user.id)
+    cart = await cart_store.get(callback.from_user.id)
     
     if cart.is_empty():
         cart_text = """🛒 Ваша корзина пуста
@@ -302,64 +287,51 @@ async def process_cart(callback: types.CallbackQuery):
     else:
         cart_text = "Ваша корзина 🛒  \n\n"
         
-        for i, item in enumerate(cart.items, 1):
+        for i, item in enumerate(cart.items[:ITEMS_PREVIEW_LIMIT], 1):
             cart_text += f"{i}. {item['product_name']}\n"
             cart_text += f"   📏 {item['size_name']}\n"
             cart_text += f"   💰 {item['price']} ₽\n\n"
+        if len(cart.items) > ITEMS_PREVIEW_LIMIT:
+            cart_text += f"… и ещё {len(cart.items) - ITEMS_PREVIEW_LIMIT} шт.\n\n"
         
         cart_text += f"💳 Итого: {cart.get_total_price()} ₽"
     
-    await callback.message.edit_text(cart_text, reply_markup=get_cart_keyboard(callback.from_user.id))
+    await callback.message.edit_text(cart_text, reply_markup=get_cart_keyboard(cart))
 
 @dp.callback_query(F.data == "checkout")
 async def process_checkout(callback: types.CallbackQuery):
     """Оформление заказа"""
-    cart = get_user_cart(callback.from_user.id)
+    cart = await cart_store.get(callback.from_user.id)
     
     if cart.is_empty():
         await callback.answer("❌ Корзина пуста!", show_alert=True)
         return
     
-    # Формируем данные заказа
-    order_data = {
-        'user_id': callback.from_user.id,
-        'username': callback.from_user.username or "",
-        'items': cart.items
-    }
-    
     try:
-        # Отправляем заказ в основной бот
-        order_message = f"ORDER_DATA:{json.dumps(order_data)}"
-        await bot1.send_message(chat_id=callback.from_user.id, text=order_message)
-        
-        checkout_text = f"""✅ Заказ отправлен в основной бот!
-
-🛒 Ваши товары:
-"""
-        
-        for item in cart.items:
-            checkout_text += f"• {item['product_name']} · {item['size_name']} - {item['price']} ₽\n"
-        
-        checkout_text += f"\n💳 Итого: {cart.get_total_price()} ₽\n\n"
-        checkout_text += "Перейдите в основной бот для завершения заказа и оплаты! 🚀"
-        
+        # Сохраняем корзину черновиком: основной бот прочитает его по ссылке из БД
+        token = await create_draft(callback.from_user.id, callback.from_user.username or "", cart.items)
+        order_url = f"https://t.me/{await get_bot1_username()}?start={DEEP_LINK_PREFIX}{token}"
     except Exception as e:
-        logger.error(f"Ошибка отправки заказа в основной бот: {e}")
-        checkout_text = """✅ Заказ оформлен!
+        logger.error(f"Ошибка сохранения черновика заказа: {e}")
+        await callback.answer("❌ Не удалось оформить заказ. Попробуйте еще раз.", show_alert=True)
+        return
+    
+    checkout_text = f"""✅ Заказ готов к оформлению!
 
 🛒 Ваши товары:
 """
-        
-        for item in cart.items:
-            checkout_text += f"• {item['product_name']} · {item['size_name']} - {item['price']} ₽\n"
-        
-        checkout_text += f"\n💳 Итого: {cart.get_total_price()} ₽\n\n"
-        checkout_text += "Обратитесь в основной бот для завершения заказа!"
+    
+    checkout_text += items_preview(cart.items)
+    
+    checkout_text += f"\n💳 Итого: {cart.get_total_price()} ₽\n\n"
+    checkout_text += "Перейдите в основной бот для завершения заказа и оплаты! 🚀"
     
     # Очищаем корзину
     cart.clear()
+    await cart_store.save(callback.from_user.id, cart)
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🚀 Перейти к оформлению", url=order_url)],
         [InlineKeyboardButton(text="🔙 Главное меню", callback_data="main_menu")]
     ])
     
@@ -368,8 +340,9 @@ async def process_checkout(callback: types.CallbackQuery):
 @dp.callback_query(F.data == "clear_cart")
 async def process_clear_cart(callback: types.CallbackQuery):
     """Очистка корзины"""
-    cart = get_user_cart(callback.from_user.id)
+    cart = await cart_store.get(callback.from_user.id)
     cart.clear()
+    await cart_store.save(callback.from_user.id, cart)
     
     clear_text = """🗑️ Корзина очищена
 
@@ -385,7 +358,7 @@ async def process_back_to_categories(callback: types.CallbackQuery):
 
 Здесь вы найдете ночники разных тематик и стилей."""
     
-    await callback.message.edit_text(catalog_text, reply_markup=get_categories_keyboard())
+    await callback.message.edit_text(catalog_text, reply_markup=await get_categories_keyboard())
 
 @dp.callback_query(F.data == "back_to_titles")
 async def process_back_to_titles(callback: types.CallbackQuery):
@@ -396,7 +369,7 @@ async def process_back_to_titles(callback: types.CallbackQuery):
 
 Здесь вы найдете ночники разных тематик и стилей."""
     
-    await callback.message.edit_text(catalog_text, reply_markup=get_categories_keyboard())
+    await callback.message.edit_text(catalog_text, reply_markup=await get_categories_keyboard())
 
 @dp.callback_query(F.data == "back_to_products")
 async def process_back_to_products(callback: types.CallbackQuery):
@@ -407,7 +380,43 @@ async def process_back_to_products(callback: types.CallbackQuery):
 
 Здесь вы найдете ночники разных тематик и стилей."""
     
-    await callback.message.edit_text(catalog_text, reply_markup=get_categories_keyboard())
+    await callback.message.edit_text(catalog_text, reply_markup=await get_categories_keyboard())
+
+# Поиск
+@dp.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject):
+    """Поиск товара по названию товара, тайтла или категории: /search эрен"""
+    if not command.args:
+        await message.answer("🔎 Напишите, что ищете, после команды. Например: /search эрен")
+        return
+    products = await catalog_search.search(command.args)
+    if not products:
+        await message.answer("😔 Ничего не нашлось. Попробуйте другое название или загляните в каталог.", reply_markup=get_main_keyboard())
+        return
+    await message.answer(f"🔎 Нашлось по запросу «{command.args}»:", reply_markup=await get_search_results_keyboard(products))
+
+@dp.inline_query()
+async def process_inline_search(inline_query: types.InlineQuery):
+    """Inline-поиск: @бот_каталога эрен — товар открывается в боте по ссылке /start product_<id>"""
+    products = await catalog_search.search(inline_query.query, SEARCH_INLINE_LIMIT)
+    username = (await bot.me()).username
+    results = []
+    for product in products:
+        title = await catalog_cache.title(product.title_id)
+        link = f"https://t.me/{username}?start={PRODUCT_DEEP_LINK_PREFIX}{product.id}"
+        results.append(InlineQueryResultArticle(
+            id=str(product.id),
+            title=product.name,
+            description=title.name if title else None,
+            input_message_content=InputTextMessageContent(
+                message_text=f"🛍️ {product.name}" + (f" · {title.name}" if title else "")
+            ),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="👉 Открыть в каталоге", url=link)]
+            ])
+        ))
+    # Ответ одинаков для всех пользователей — Telegram может отдавать его из своего кэша
+    await inline_query.answer(results, cache_time=SEARCH_INLINE_CACHE_TIME, is_personal=False)
 
 # Админ команды
 @dp.message(Command("admin"))
@@ -425,6 +434,8 @@ async def cmd_admin(message: types.Message):
 async def main():
     """Запуск бота каталога"""
     logger.info("Запуск бота каталога...")
+    # Если бот раньше работал через вебхук, getUpdates без этого не отдаст обновления
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
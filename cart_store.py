@@ -0,0 +1,225 @@
+"""
+Хранилище корзин бота каталога.
+
+Два варианта с одинаковым интерфейсом (get / save / flush / start / close):
+- MemoryCartStore — корзины только в памяти процесса: LRU с ограничением
+  числа корзин и TTL с последнего изменения;
+- DatabaseCartStore — корзины в таблице carts. Корзина читается из БД при
+  первом обращении пользователя, изменения копятся и записываются одной
+  транзакцией раз в CART_FLUSH_INTERVAL секунд или сразу, как только их
+  набралось CART_FLUSH_BATCH. Горячие корзины держит тот же LRU, поэтому
+  память не растёт вместе с аудиторией, а корзины переживают перезапуск.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete
+from database import DatabaseManager, CartRecord
+from config import CART_BACKEND, CART_MAX_SIZE, CART_TTL, CART_FLUSH_INTERVAL, CART_FLUSH_BATCH
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять из БД корзины старше CART_TTL
+PURGE_INTERVAL = 3600
+
+
+# Класс для работы с корзиной
+class Cart:
+    def __init__(self, items: Optional[list] = None):
+        self.items = items or []
+
+    def add_item(self, product_id, size_id, product_name, size_name, price):
+        """Добавление товара в корзину"""
+        item = {
+            'product_id': product_id,
+            'size_id': size_id,
+            'product_name': product_name,
+            'size_name': size_name,
+            'price': price
+        }
+        self.items.append(item)
+
+    def remove_item(self, index):
+        """Удаление товара из корзины"""
+        if 0 <= index < len(self.items):
+            self.items.pop(index)
+
+    def clear(self):
+        """Очистка корзины"""
+        self.items = []
+
+    def get_total_price(self):
+        """Получение общей стоимости"""
+        return sum(item['price'] for item in self.items)
+
+    def is_empty(self):
+        """Проверка на пустоту корзины"""
+        return len(self.items) == 0
+
+
+class MemoryCartStore:
+    """Корзины в памяти: не больше max_size штук, каждая живёт ttl секунд с последнего изменения"""
+
+    def __init__(self, max_size: int = CART_MAX_SIZE, ttl: float = CART_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._carts: OrderedDict[int, tuple[Cart, float]] = OrderedDict()  # user_id -> (корзина, истекает)
+
+    def __len__(self) -> int:
+        return len(self._carts)
+
+    def peek(self, user_id: int) -> Optional[Cart]:
+        """Живая корзина из памяти или None"""
+        entry = self._carts.get(user_id)
+        if entry is None:
+            return None
+        cart, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._carts[user_id]
+            return None
+        self._carts.move_to_end(user_id)
+        return cart
+
+    def put(self, user_id: int, cart: Cart):
+        """Кладёт корзину в память, вытесняя давно не используемые"""
+        self._carts[user_id] = (cart, time.monotonic() + self.ttl)
+        self._carts.move_to_end(user_id)
+        while len(self._carts) > self.max_size:
+            self._carts.popitem(last=False)
+
+    async def get(self, user_id: int) -> Cart:
+        """Корзина пользователя (новая, если её нет или она истекла)"""
+        cart = self.peek(user_id)
+        if cart is None:
+            cart = Cart()
+            self.put(user_id, cart)
+        return cart
+
+    async def save(self, user_id: int, cart: Cart):
+        """Фиксирует изменение корзины"""
+        self.put(user_id, cart)
+
+    async def flush(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class DatabaseCartStore:
+    """Корзины в БД с ленивой загрузкой и пакетной записью изменений"""
+
+    def __init__(self, session_factory=DatabaseManager.get_async_session, max_size: int = CART_MAX_SIZE,
+                 ttl: float = CART_TTL, flush_interval: float = CART_FLUSH_INTERVAL,
+                 flush_batch: int = CART_FLUSH_BATCH):
+        self._session_factory = session_factory
+        self._cache = MemoryCartStore(max_size, ttl)
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        # Изменённые, но ещё не записанные корзины; вытеснение из LRU их не теряет
+        self._dirty: dict[int, Cart] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge = time.monotonic()
+
+    def _cached(self, user_id: int) -> Optional[Cart]:
+        cart = self._dirty.get(user_id)
+        return cart if cart is not None else self._cache.peek(user_id)
+
+    async def get(self, user_id: int) -> Cart:
+        """Корзина пользователя: из памяти, иначе из БД"""
+        cart = self._cached(user_id)
+        if cart is not None:
+            return cart
+        async with self._session_factory() as db:
+            record = await db.get(CartRecord, user_id)
+        # Пока шёл запрос, корзину мог загрузить или изменить параллельный обработчик
+        cart = self._cached(user_id)
+        if cart is not None:
+            return cart
+        fresh = record is not None and record.updated_at > datetime.utcnow() - timedelta(seconds=self.ttl)
+        cart = Cart(list(record.items or [])) if fresh else Cart()
+        self._cache.put(user_id, cart)
+        return cart
+
+    async def save(self, user_id: int, cart: Cart):
+        """Ставит корзину в очередь на запись"""
+        self._cache.put(user_id, cart)
+        self._dirty[user_id] = cart
+        if len(self._dirty) >= self.flush_batch:
+            await self.flush()
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            now = datetime.utcnow()
+            records = [
+                CartRecord(user_id=user_id, items=list(cart.items), updated_at=now)
+                for user_id, cart in batch.items() if not cart.is_empty()
+            ]
+            try:
+                async with self._session_factory() as db:
+                    await db.execute(delete(CartRecord).where(CartRecord.user_id.in_(list(batch))))
+                    db.add_all(records)
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи корзин: {e}")
+                # Вернём в очередь, не затирая более свежие изменения
+                for user_id, cart in batch.items():
+                    self._dirty.setdefault(user_id, cart)
+
+    async def purge_expired(self):
+        """Удаляет из БД корзины, не менявшиеся дольше ttl"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        async with self._session_factory() as db:
+            await db.execute(delete(CartRecord).where(CartRecord.updated_at < cutoff))
+            await db.commit()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                try:
+                    await self.purge_expired()
+                except Exception as e:
+                    logger.error(f"Ошибка очистки старых корзин: {e}")
+
+    async def start(self):
+        """Запускает фоновую запись (при старте диспетчера)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Останавливает фоновую запись и сохраняет остаток (при остановке диспетчера)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def create_cart_store(backend: str = CART_BACKEND):
+    """Хранилище корзин по настройке CART_BACKEND"""
+    if backend == "memory":
+        return MemoryCartStore()
+    return DatabaseCartStore()
+
+
+# Общий экземпляр для бота каталога
+cart_store = create_cart_store()
@@ -0,0 +1,606 @@
+"""
+Кэш каталога в памяти процесса (категории → тайтлы → товары → размеры).
+
+Каталог меняется только из админ-панели, поэтому экраны обоих ботов читают
+данные отсюда, а не из БД. Каждый срез загружается при первом обращении
+(read-through) и сбрасывается обработчиками записи в admin_panel.
+
+Если боты запущены отдельными процессами, правки из админки другого
+процесса видны по версии каталога: триггеры поднимают её в той же
+транзакции, что и правку, и пишут изменённые строки в журнал
+catalog_changes (миграция 10). Массовые правки catalog_service пишут
+одну запись на всю правку (каскад тайтла или категории, привязка размера
+ко всем товарам). Перед чтением кэш не чаще раза в check_interval секунд
+сверяет версию и сбрасывает только затронутые срезы.
+
+Размеров немного и они общие для всех товаров, поэтому связи товар-размер
+хранятся матрицей: строка из пары байт на товар (по id), бит на размер в
+порядке id размеров, младший бит — «строка загружена». Матрица строится
+одним запросом, размеры товара — это маска из строки и готовый список
+размеров для неё. Запрос идёт по всем связям, поэтому матрица строится в
+фоновой задаче: пока её нет (в начале работы и после полного сброса),
+размеры товара читаются прямым запросом по индексу.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import Context, ContextVar
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple, Optional
+from sqlalchemy import case, func, select
+from database import DatabaseManager, Category, Title, Product, Size, ProductSize, CatalogVersion, CatalogChange
+from migrations import CATALOG_CHANGES_KEEP
+from config import CATALOG_VERSION_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз перестраивать матрицу размеров, если каталог меняется во время загрузки
+MATRIX_LOAD_ATTEMPTS = 3
+
+
+class CategoryRow(NamedTuple):
+    id: int
+    name: str
+
+
+class TitleRow(NamedTuple):
+    id: int
+    name: str
+    category_id: int
+
+
+class ProductRow(NamedTuple):
+    id: int
+    name: str
+    photo_url: Optional[str]
+    title_id: int
+    is_active: bool
+
+
+class SizeRow(NamedTuple):
+    id: int
+    name: str
+    price: float
+
+
+# Сессия, общая для всех промахов внутри CatalogCache.batch() (у каждой задачи asyncio своя)
+_batch_session: ContextVar[Optional["_SharedSession"]] = ContextVar("catalog_batch_session", default=None)
+
+
+class _SharedSession:
+    """Сессия, которая открывается при первом промахе внутри batch() и закрывается в его конце"""
+
+    def __init__(self, owner, session_factory):
+        self.owner = owner
+        self._session_factory = session_factory
+        self._session = None
+
+    async def __aenter__(self):
+        if self._session is None:
+            self._session = self._session_factory()
+            await self._session.__aenter__()
+        return self._session
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.__aexit__(None, None, None)
+
+
+def _build_matrix(masks, max_id: int, width: int) -> bytearray:
+    """Матрица из масок товаров: все товары до max_id известны, без связей — пустая строка"""
+    matrix = bytearray((b"\x01" + bytes(width - 1)) * (max_id + 1))
+    for product_id, mask in masks:
+        if product_id <= max_id:
+            matrix[product_id * width:(product_id + 1) * width] = (mask | 1).to_bytes(width, "little")
+    return matrix
+
+
+def _desc_id(product: ProductRow) -> int:
+    """Ключ для бинарного поиска по списку товаров, отсортированному по убыванию id"""
+    return -product.id
+
+
+class CatalogCache:
+    """Снимок каталога с ленивой загрузкой срезов"""
+
+    def __init__(self, session_factory=DatabaseManager.get_async_session, check_interval: float | None = None):
+        self._session_factory = session_factory
+        # None — правки из других процессов не отслеживаются
+        self._check_interval = check_interval
+        self._next_check = 0.0
+        self._db_version: Optional[int] = None
+        # Растёт при каждом сбросе: загрузка, начатая до сброса, не сохраняется в снимок
+        self._generation = 0
+        # Производные индексы, которым нужно знать, что именно сброшено
+        self._listeners = []
+        self._matrix_task: Optional[asyncio.Task] = None
+        self.invalidate()
+
+    @property
+    def generation(self) -> int:
+        """Номер версии снимка: меняется при каждом сбросе (по нему сбрасываются производные кэши)"""
+        return self._generation
+
+    def _session(self):
+        shared = _batch_session.get()
+        return shared if shared is not None and shared.owner is self else self._session_factory()
+
+    @asynccontextmanager
+    async def batch(self):
+        """Все срезы, которых нет в снимке, дочитываются внутри блока в одной сессии БД"""
+        current = _batch_session.get()
+        if current is not None and current.owner is self:
+            yield
+            return
+        shared = _SharedSession(self, self._session_factory)
+        token = _batch_session.set(shared)
+        try:
+            yield
+        finally:
+            _batch_session.reset(token)
+            await shared.close()
+
+    def add_listener(self, callback):
+        """Подписывает callback(kind, key) на сбросы: ("all", None), ("titles", None),
+        ("title_products", title_id), ("product", product_id)"""
+        self._listeners.append(callback)
+
+    def _notify(self, kind: str, key: int | None = None):
+        for callback in self._listeners:
+            callback(kind, key)
+
+    # ======================
+    # Сброс срезов
+    # ======================
+    def invalidate(self):
+        """Полностью сбрасывает снимок"""
+        self._generation += 1
+        self._categories: Optional[dict[int, CategoryRow]] = None
+        self._titles: Optional[dict[int, TitleRow]] = None
+        self._titles_by_category: dict[int, list[TitleRow]] = {}
+        self._products: dict[int, Optional[ProductRow]] = {}
+        self._active_by_title: dict[int, list[ProductRow]] = {}
+        self._sizes: Optional[dict[int, SizeRow]] = None
+        # Матрица товар × размер: бит размера по его месту в _size_ids, бит 0 — строка известна
+        self._size_ids: tuple[int, ...] = ()
+        self._size_bits: dict[int, int] = {}
+        self._matrix: Optional[bytearray] = None
+        self._row_width = 1
+        self._sizes_by_mask: dict[int, list[SizeRow]] = {}
+        self._notify("all")
+
+    def invalidate_categories(self):
+        """Сбрасывает список категорий"""
+        self._generation += 1
+        self._categories = None
+
+    def invalidate_titles(self):
+        """Сбрасывает тайтлы (вместе с группировкой по категориям)"""
+        self._generation += 1
+        self._titles = None
+        self._titles_by_category = {}
+        self._notify("titles")
+
+    def invalidate_title_products(self, title_id: int):
+        """Сбрасывает список активных товаров тайтла"""
+        self._generation += 1
+        self._active_by_title.pop(title_id, None)
+        self._notify("title_products", title_id)
+
+    def invalidate_product(self, product_id: int, title_id: int | None = None):
+        """Сбрасывает товар, его размеры и список товаров его тайтла"""
+        self._generation += 1
+        cached = self._products.pop(product_id, None)
+        self._forget_row(product_id)
+        self._notify("product", product_id)
+        for tid in {title_id, cached.title_id if cached else None}:
+            if tid is not None:
+                self.invalidate_title_products(tid)
+
+    def invalidate_product_sizes(self, product_id: int):
+        """Сбрасывает размеры товара"""
+        self._generation += 1
+        self._forget_row(product_id)
+
+    def invalidate_sizes(self):
+        """Сбрасывает размеры; матрица перестраивается, только если изменился сам список размеров"""
+        self._generation += 1
+        self._sizes = None
+        self._sizes_by_mask = {}
+
+    def invalidate_title_tree(self, title_id: int):
+        """Сбрасывает тайтлы и известные товары тайтла (после каскадного удаления тайтла)"""
+        self.invalidate_titles()
+        product_ids = {p.id for p in self._active_by_title.get(title_id, ())}
+        product_ids.update(pid for pid, p in self._products.items() if p is not None and p.title_id == title_id)
+        for product_id in product_ids:
+            self.invalidate_product(product_id)
+        self.invalidate_title_products(title_id)
+
+    def invalidate_category_tree(self, category_id: int):
+        """Сбрасывает категории, тайтлы и товары категории (после каскадного удаления категории)"""
+        if self._titles is None:
+            # Тайтлы категории неизвестны — сбрасываются все товары, матрица и размеры остаются
+            self._generation += 1
+            self._products = {}
+            self._active_by_title = {}
+            self._notify("all")
+        else:
+            for title in self._titles_by_category.get(category_id, []):
+                self.invalidate_title_tree(title.id)
+        self.invalidate_categories()
+        self.invalidate_titles()
+
+    def link_size_to_all(self, size_id: int):
+        """Отмечает в матрице размер у всех товаров (после привязки размера ко всем товарам)"""
+        self.invalidate_sizes()
+        bit = self._size_bit(size_id)
+        if self._matrix is None or bit is None:
+            # Новый размер: биты сдвинутся, и матрица перестроится при загрузке размеров
+            return
+        byte, value = divmod(bit.bit_length() - 1, 8)
+        rows = self._matrix[byte::self._row_width]
+        self._matrix[byte::self._row_width] = bytes(b | (1 << value) for b in rows)
+
+    def link_product_size(self, product_id: int, size_id: int):
+        """Отмечает в матрице новую связь товар-размер (вместо перечитывания строки товара)"""
+        self._generation += 1
+        mask = self._row(product_id)
+        bit = self._size_bit(size_id)
+        if mask is None or bit is None:
+            self._forget_row(product_id)
+        else:
+            self._set_row(product_id, mask | bit)
+
+    # ======================
+    # Правки из других процессов
+    # ======================
+    async def refresh(self):
+        """Сверяет версию каталога в БД (не чаще раза в check_interval) и сбрасывает изменённые срезы"""
+        if self._check_interval is None or time.monotonic() < self._next_check:
+            return
+        self._next_check = time.monotonic() + self._check_interval
+        known = self._db_version
+        try:
+            async with self._session() as db:
+                version = (await db.execute(
+                    select(CatalogVersion.version).where(CatalogVersion.id == 1)
+                )).scalar() or 0
+                if known is None or version == known:
+                    changes = []
+                elif version - known > CATALOG_CHANGES_KEEP:
+                    changes = None
+                else:
+                    changes = (await db.execute(
+                        select(CatalogChange.version, CatalogChange.kind, CatalogChange.key, CatalogChange.title_id)
+                        .where(CatalogChange.version > known)
+                        .order_by(CatalogChange.version)
+                    )).all()
+        except Exception as e:
+            logger.error(f"Ошибка проверки версии каталога: {e}")
+            return
+        if known is not None and version != known:
+            if not changes or changes[0].version != known + 1:
+                # Журнал уже обрезан — что менялось, неизвестно
+                self.invalidate()
+            else:
+                self._apply_changes(changes)
+                version = max(version, changes[-1].version)
+        self._db_version = version
+
+    def _apply_changes(self, changes):
+        kinds = {change.kind for change in changes}
+        if "catalog" in kinds:
+            self.invalidate()
+            return
+        if "category" in kinds:
+            self.invalidate_categories()
+        if "title" in kinds:
+            self.invalidate_titles()
+        if "size" in kinds:
+            self.invalidate_sizes()
+        for change in changes:
+            if change.kind == "product":
+                self.invalidate_product(change.key, change.title_id)
+            elif change.kind == "product_sizes":
+                self.invalidate_product_sizes(change.key)
+            elif change.kind == "title_tree":
+                self.invalidate_title_tree(change.key)
+            elif change.kind == "category_tree":
+                self.invalidate_category_tree(change.key)
+            elif change.kind == "size_products":
+                self.link_size_to_all(change.key)
+
+    # ======================
+    # Чтение
+    # ======================
+    async def _load_categories(self) -> dict[int, CategoryRow]:
+        await self.refresh()
+        if self._categories is not None:
+            return self._categories
+        generation = self._generation
+        async with self._session() as db:
+            rows = (await db.execute(select(Category.id, Category.name).order_by(Category.id))).all()
+        categories = {r.id: CategoryRow(r.id, r.name) for r in rows}
+        if generation == self._generation:
+            self._categories = categories
+        return categories
+
+    async def categories(self) -> list[CategoryRow]:
+        """Все категории"""
+        return list((await self._load_categories()).values())
+
+    async def category(self, category_id: int) -> Optional[CategoryRow]:
+        """Категория по id"""
+        return (await self._load_categories()).get(category_id)
+
+    async def _load_titles(self) -> tuple[dict[int, TitleRow], dict[int, list[TitleRow]]]:
+        await self.refresh()
+        if self._titles is not None:
+            return self._titles, self._titles_by_category
+        generation = self._generation
+        async with self._session() as db:
+            rows = (await db.execute(select(Title.id, Title.name, Title.category_id).order_by(Title.id))).all()
+        titles = {r.id: TitleRow(r.id, r.name, r.category_id) for r in rows}
+        by_category: dict[int, list[TitleRow]] = {}
+        for t in titles.values():
+            by_category.setdefault(t.category_id, []).append(t)
+        if generation == self._generation:
+            self._titles, self._titles_by_category = titles, by_category
+        return titles, by_category
+
+    async def titles(self, category_id: int) -> list[TitleRow]:
+        """Тайтлы категории"""
+        _, by_category = await self._load_titles()
+        return list(by_category.get(category_id, []))
+
+    async def title(self, title_id: int) -> Optional[TitleRow]:
+        """Тайтл по id"""
+        titles, _ = await self._load_titles()
+        return titles.get(title_id)
+
+    async def products(self, title_id: int) -> list[ProductRow]:
+        """Активные товары тайтла, новые первыми"""
+        await self.refresh()
+        if title_id in self._active_by_title:
+            return self._active_by_title[title_id]
+        generation = self._generation
+        async with self._session() as db:
+            rows = (await db.execute(select(
+                Product.id, Product.name, Product.photo_url, Product.title_id, Product.is_active
+            ).where(
+                Product.title_id == title_id,
+                Product.is_active == True
+            ).order_by(Product.id.desc()))).all()
+        products = [ProductRow(r.id, r.name, r.photo_url, r.title_id, bool(r.is_active)) for r in rows]
+        if generation == self._generation:
+            self._active_by_title[title_id] = products
+            for p in products:
+                self._products[p.id] = p
+        return products
+
+    async def products_page(self, title_id: int, limit: int, after_id: int | None = None,
+                            before_id: int | None = None) -> tuple[list[ProductRow], int]:
+        """Страница активных товаров тайтла по курсору (keyset) и общее число товаров.
+
+        after_id — следующие товары после последнего показанного,
+        before_id — предыдущие товары перед первым показанным.
+        Позиция курсора ищется бинарным поиском, поэтому глубокая страница
+        стоит столько же, сколько первая.
+        """
+        products = await self.products(title_id)
+        if after_id is not None:
+            start = bisect_right(products, -after_id, key=_desc_id)
+            page = products[start:start + limit]
+        elif before_id is not None:
+            end = bisect_left(products, -before_id, key=_desc_id)
+            page = products[max(0, end - limit):end]
+        else:
+            page = products[:limit]
+        return page, len(products)
+
+    async def product(self, product_id: int) -> Optional[ProductRow]:
+        """Товар по id (в том числе выключенный)"""
+        await self.refresh()
+        if product_id in self._products:
+            return self._products[product_id]
+        generation = self._generation
+        async with self._session() as db:
+            r = (await db.execute(select(
+                Product.id, Product.name, Product.photo_url, Product.title_id, Product.is_active
+            ).where(Product.id == product_id))).first()
+        product = ProductRow(r.id, r.name, r.photo_url, r.title_id, bool(r.is_active)) if r else None
+        if generation == self._generation:
+            self._products[product_id] = product
+        return product
+
+    def _store_sizes(self, rows):
+        sizes = {r.id: SizeRow(r.id, r.name, r.price) for r in rows}
+        self._sizes = sizes
+        self._sizes_by_mask = {}
+        if tuple(sizes) != self._size_ids:
+            # Добавлен или удалён размер — биты сдвинулись, матрица строится заново
+            self._size_ids = tuple(sizes)
+            self._size_bits = {size_id: 2 << i for i, size_id in enumerate(self._size_ids)}
+            self._row_width = (len(sizes) + 8) // 8
+            self._matrix = None
+        return sizes
+
+    async def _load_sizes(self) -> dict[int, SizeRow]:
+        await self.refresh()
+        if self._sizes is not None:
+            return self._sizes
+        generation = self._generation
+        async with self._session() as db:
+            rows = (await db.execute(select(Size.id, Size.name, Size.price).order_by(Size.id))).all()
+        if generation == self._generation:
+            return self._store_sizes(rows)
+        return {r.id: SizeRow(r.id, r.name, r.price) for r in rows}
+
+    async def sizes(self) -> list[SizeRow]:
+        """Все размеры"""
+        return list((await self._load_sizes()).values())
+
+    async def size(self, size_id: int) -> Optional[SizeRow]:
+        """Размер по id"""
+        return (await self._load_sizes()).get(size_id)
+
+    def _size_bit(self, size_id: int) -> Optional[int]:
+        return self._size_bits.get(size_id)
+
+    def _row(self, product_id: int) -> Optional[int]:
+        """Маска размеров товара; None, если строка не загружена"""
+        offset = product_id * self._row_width
+        if self._matrix is None or offset + self._row_width > len(self._matrix):
+            return None
+        mask = int.from_bytes(self._matrix[offset:offset + self._row_width], "little")
+        return mask if mask & 1 else None
+
+    def _set_row(self, product_id: int, mask: int):
+        offset = product_id * self._row_width
+        if offset + self._row_width > len(self._matrix):
+            self._matrix.extend(bytes(offset + self._row_width - len(self._matrix)))
+        self._matrix[offset:offset + self._row_width] = (mask | 1).to_bytes(self._row_width, "little")
+
+    def _forget_row(self, product_id: int):
+        if self._row(product_id) is not None:
+            offset = product_id * self._row_width
+            self._matrix[offset:offset + self._row_width] = bytes(self._row_width)
+
+    def _mask(self, size_ids) -> int:
+        mask = 1
+        for size_id in size_ids:
+            mask |= self._size_bit(size_id) or 0
+        return mask
+
+    def _schedule_size_matrix(self):
+        """Запускает построение матрицы в фоне, если оно ещё не идёт"""
+        if self._matrix_task is None or self._matrix_task.done():
+            # Свой контекст: фоновая загрузка не должна взять сессию batch() экрана, который её запустил
+            self._matrix_task = asyncio.get_running_loop().create_task(self._load_size_matrix(), context=Context())
+
+    async def wait_size_matrix(self) -> bool:
+        """Дожидается матрицы размеров, при необходимости запуская построение (для замеров и тестов);
+        False, если каталог менялся во время каждой попытки загрузки"""
+        if self._matrix_task is not None and not self._matrix_task.done():
+            await self._matrix_task
+        if self._matrix is None:
+            self._schedule_size_matrix()
+            await self._matrix_task
+        return self._matrix is not None
+
+    async def _load_size_matrix(self) -> bool:
+        """Размеры и матрица в снимке; False, если каталог менялся во время каждой попытки загрузки"""
+        try:
+            for _ in range(MATRIX_LOAD_ATTEMPTS):
+                await self.refresh()
+                if self._matrix is not None and self._sizes is not None:
+                    return True
+                if await self._try_load_size_matrix():
+                    return True
+        except Exception as e:
+            logger.error(f"Ошибка построения матрицы размеров: {e}")
+        return False
+
+    async def _try_load_size_matrix(self) -> bool:
+        """Строит матрицу по всем связям товар-размер (вместе с размерами — одна сессия)"""
+        generation = self._generation
+        async with self._session() as db:
+            if self._sizes is None:
+                rows = (await db.execute(select(Size.id, Size.name, Size.price).order_by(Size.id))).all()
+                if generation != self._generation:
+                    return False
+                self._store_sizes(rows)
+            if self._matrix is not None:
+                return True
+            max_id = (await db.execute(select(func.max(Product.id)))).scalar() or 0
+            if not self._size_bits:
+                masks = []
+            elif len(self._size_ids) <= 62:
+                # Маски собирает SQLite: строка на товар, а не на каждую связь
+                bit = case(self._size_bits, value=ProductSize.size_id, else_=0)
+                masks = (await db.execute(
+                    select(ProductSize.product_id, func.sum(bit)).group_by(ProductSize.product_id)
+                )).all()
+            else:
+                # Маска не помещается в 64-битное целое SQLite — собираем по связям
+                merged: dict[int, int] = {}
+                for product_id, size_id in await db.execute(select(ProductSize.product_id, ProductSize.size_id)):
+                    merged[product_id] = merged.get(product_id, 0) | self._size_bits.get(size_id, 0)
+                masks = merged.items()
+        if generation != self._generation:
+            return False
+        width = self._row_width
+        # Сборка строк по всем товарам — в потоке, чтобы не держать цикл событий
+        matrix = await asyncio.to_thread(_build_matrix, masks, max_id, width)
+        if generation != self._generation:
+            return False
+        self._matrix = matrix
+        logger.info(f"Матрица размеров каталога: {max_id + 1} строк по {width} байт")
+        return True
+
+    async def _product_mask(self, product_id: int) -> Optional[int]:
+        """Маска размеров товара; None, пока матрица строится в фоне"""
+        await self.refresh()
+        if self._matrix is not None and self._sizes is None:
+            # Размеры сброшены: если их список не изменился, матрица остаётся
+            await self._load_sizes()
+        if self._matrix is None or self._sizes is None:
+            self._schedule_size_matrix()
+            return None
+        mask = self._row(product_id)
+        if mask is not None:
+            return mask
+        # Строка не загружена: новый или изменённый товар
+        generation = self._generation
+        async with self._session() as db:
+            size_ids = (await db.execute(
+                select(ProductSize.size_id).where(ProductSize.product_id == product_id)
+            )).scalars().all()
+        mask = self._mask(size_ids)
+        if generation == self._generation and self._matrix is not None:
+            self._set_row(product_id, mask)
+        return mask
+
+    async def _query_product_sizes(self, product_id: int) -> list[SizeRow]:
+        """Размеры товара прямым запросом по индексу связей, в обход матрицы"""
+        async with self._session() as db:
+            rows = (await db.execute(
+                select(Size.id, Size.name, Size.price)
+                .join(ProductSize, ProductSize.size_id == Size.id)
+                .where(ProductSize.product_id == product_id)
+                .order_by(Size.id)
+            )).all()
+        return [SizeRow(r.id, r.name, r.price) for r in rows]
+
+    async def product_sizes(self, product_id: int) -> list[SizeRow]:
+        """Размеры, привязанные к товару, в порядке id размеров"""
+        mask = await self._product_mask(product_id)
+        if mask is None:
+            return await self._query_product_sizes(product_id)
+        if mask in self._sizes_by_mask:
+            return self._sizes_by_mask[mask]
+        size_ids = [size_id for i, size_id in enumerate(self._size_ids) if mask & (2 << i)]
+        if self._sizes is None:
+            # Размеры сбросили, пока читалась строка, — список собирается без кэширования
+            sizes = await self._load_sizes()
+            return [sizes[size_id] for size_id in size_ids if size_id in sizes]
+        rows = [self._sizes[size_id] for size_id in size_ids if size_id in self._sizes]
+        self._sizes_by_mask[mask] = rows
+        return rows
+
+    async def has_size(self, product_id: int, size_id: int) -> bool:
+        """Привязан ли размер к товару"""
+        mask = await self._product_mask(product_id)
+        if mask is None:
+            return any(size.id == size_id for size in await self._query_product_sizes(product_id))
+        bit = self._size_bit(size_id)
+        return bit is not None and bool(mask & bit)
+
+# Общий экземпляр для ботов и админ-панели
+catalog_cache = CatalogCache(check_interval=CATALOG_VERSION_CHECK_INTERVAL)
@@ -0,0 +1,208 @@
+"""
+Поиск товаров по названиям товара, тайтла и категории.
+
+Ищет по полнотекстовому индексу FTS5 product_search, который триггеры SQLite
+держат в актуальном состоянии при правках в админке (миграция 9). Каждое
+слово запроса ищется как префикс: «эре йег» найдёт «Эрен Йегер».
+Если FTS ничего не нашёл, запрос ищется в нечётком индексе (fuzzy_index.py):
+он прощает опечатки и транслит («геральд», «geralt» найдут «Геральт»).
+Индекс строится в памяти при первом нечётком поиске и дальше обновляется
+по событиям сброса catalog_cache — перечитываются только изменённые товары
+и тайтлы. Результаты кэшируются по запросу и сбрасываются вместе со
+снимком catalog_cache, который админка сбрасывает при любой правке каталога.
+"""
+
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import select, text
+from catalog_cache import catalog_cache, ProductRow
+from database import DatabaseManager, Product, Title
+from fuzzy_index import FuzzyIndex
+from config import SEARCH_RESULTS_LIMIT, SEARCH_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Больше слов в запросе не нужно: названия короткие
+MAX_QUERY_WORDS = 8
+
+# Столько товаров добавляется в нечёткий индекс между передачами управления циклу событий
+FUZZY_BUILD_CHUNK = 2000
+
+# /start product_<id> — переход к товару из результата inline-поиска
+PRODUCT_DEEP_LINK_PREFIX = "product_"
+
+_SEARCH_SQL = text(
+    "SELECT p.id, p.name, p.photo_url, p.title_id, p.is_active FROM product_search "
+    "JOIN products p ON p.id = product_search.rowid "
+    "WHERE product_search MATCH :match AND p.is_active = 1 "
+    "ORDER BY product_search.rank, p.id DESC LIMIT :limit"
+)
+
+
+def match_expression(query: str) -> str:
+    """Запрос пользователя → выражение MATCH: все слова как префиксы; пустая строка, если слов нет"""
+    words = re.findall(r"\w+", query.lower().replace("ё", "е"))[:MAX_QUERY_WORDS]
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _product_query():
+    return select(Product.id, Product.name, Product.title_id).where(Product.is_active == True)
+
+
+class CatalogFuzzyIndex:
+    """Нечёткий индекс активных товаров («товар тайтл»), догоняющий правки каталога"""
+
+    def __init__(self, cache=catalog_cache, session_factory=DatabaseManager.get_async_session):
+        self._session_factory = session_factory
+        self._index = FuzzyIndex()
+        self._products: dict[int, tuple[str, int]] = {}
+        self._title_names: dict[int, str] = {}
+        self._loaded = False
+        self._titles_changed = False
+        self._dirty_titles: set[int] = set()
+        self._dirty_products: set[int] = set()
+        self._lock = asyncio.Lock()
+        cache.add_listener(self._on_invalidate)
+
+    def _on_invalidate(self, kind: str, key: int | None):
+        if kind == "all":
+            self._loaded = False
+        elif kind == "titles":
+            self._titles_changed = True
+        elif kind == "title_products":
+            self._dirty_titles.add(key)
+        elif kind == "product":
+            self._dirty_products.add(key)
+
+    async def search(self, query: str, limit: int) -> list[int]:
+        """id товаров, похожих на запрос, самые близкие первыми"""
+        async with self._lock:
+            await self._sync()
+        return [product_id for product_id, _ in self._index.search(query, limit)]
+
+    def _put(self, product_id: int, name: str, title_id: int):
+        self._products[product_id] = (name, title_id)
+        self._index.add(product_id, f"{name} {self._title_names.get(title_id, '')}")
+
+    def _drop(self, product_id: int):
+        self._products.pop(product_id, None)
+        self._index.remove(product_id)
+
+    async def _sync(self):
+        # Наборы изменений забираются до запросов: сбросы во время загрузки попадут в следующую синхронизацию
+        if not self._loaded:
+            self._loaded, self._titles_changed = True, False
+            self._dirty_titles, self._dirty_products = set(), set()
+            try:
+                await self._load_all()
+            except Exception:
+                self._loaded = False
+                raise
+            return
+        titles_changed, self._titles_changed = self._titles_changed, False
+        dirty_titles, self._dirty_titles = self._dirty_titles, set()
+        dirty_products, self._dirty_products = self._dirty_products, set()
+        if not (titles_changed or dirty_titles or dirty_products):
+            return
+
+        async with self._session_factory() as db:
+            if titles_changed:
+                names = dict((await db.execute(select(Title.id, Title.name))).all())
+                renamed = {tid for tid, name in names.items() if self._title_names.get(tid) != name}
+                self._title_names = names
+                dirty_titles |= renamed
+            rows = []
+            if dirty_titles:
+                rows += (await db.execute(_product_query().where(Product.title_id.in_(dirty_titles)))).all()
+            if dirty_products:
+                rows += (await db.execute(_product_query().where(Product.id.in_(dirty_products)))).all()
+
+        # Всё, что было в изменённых тайтлах и товарах и больше не активно, уходит из индекса
+        stale = dirty_products | {pid for pid, (_, tid) in self._products.items() if tid in dirty_titles}
+        for row in rows:
+            stale.discard(row.id)
+            self._put(row.id, row.name, row.title_id)
+        for product_id in stale:
+            self._drop(product_id)
+
+    async def _load_all(self):
+        async with self._session_factory() as db:
+            self._title_names = dict((await db.execute(select(Title.id, Title.name))).all())
+            rows = (await db.execute(_product_query())).all()
+        self._index.clear()
+        self._products = {}
+        for start in range(0, len(rows), FUZZY_BUILD_CHUNK):
+            for row in rows[start:start + FUZZY_BUILD_CHUNK]:
+                self._put(row.id, row.name, row.title_id)
+            # Сборка большого каталога не должна останавливать обработку апдейтов
+            await asyncio.sleep(0)
+        logger.info(f"Нечёткий индекс каталога: {len(self._index)} товаров")
+
+
+class CatalogSearch:
+    """Поиск с LRU-кэшем результатов"""
+
+    def __init__(self, cache=catalog_cache, session_factory=DatabaseManager.get_async_session,
+                 max_size: int = SEARCH_CACHE_SIZE):
+        self._catalog_cache = cache
+        self._session_factory = session_factory
+        self._fuzzy = CatalogFuzzyIndex(cache, session_factory)
+        self.max_size = max_size
+        self._results: OrderedDict[tuple[str, int], list[ProductRow]] = OrderedDict()
+        self._generation = cache.generation
+
+    async def search(self, query: str, limit: int = SEARCH_RESULTS_LIMIT) -> list[ProductRow]:
+        """Активные товары по запросу, самые подходящие первыми"""
+        match = match_expression(query)
+        if not match:
+            return []
+        await self._catalog_cache.refresh()
+        if self._generation != self._catalog_cache.generation:
+            # Каталог изменился — найденное раньше могло устареть
+            self._results.clear()
+            self._generation = self._catalog_cache.generation
+        key = (match, limit)
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+
+        generation = self._generation
+        async with self._session_factory() as db:
+            rows = (await db.execute(_SEARCH_SQL, {"match": match, "limit": limit})).all()
+        products = [ProductRow(r.id, r.name, r.photo_url, r.title_id, bool(r.is_active)) for r in rows]
+        if not products:
+            products = await self._search_fuzzy(query, limit)
+        if generation == self._catalog_cache.generation:
+            self._results[key] = products
+            if len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+        return products
+
+    async def _search_fuzzy(self, query: str, limit: int) -> list[ProductRow]:
+        ids = await self._fuzzy.search(query, limit)
+        if not ids:
+            return []
+        async with self._session_factory() as db:
+            rows = (await db.execute(select(
+                Product.id, Product.name, Product.photo_url, Product.title_id, Product.is_active
+            ).where(Product.id.in_(ids), Product.is_active == True))).all()
+        found = {r.id: ProductRow(r.id, r.name, r.photo_url, r.title_id, bool(r.is_active)) for r in rows}
+        return [found[product_id] for product_id in ids if product_id in found]
+
+
+async def get_search_results_keyboard(products: list[ProductRow]) -> InlineKeyboardMarkup:
+    """Кнопки найденных товаров (callback product_<id> понимают оба бота)"""
+    rows = []
+    for product in products:
+        title = await catalog_cache.title(product.title_id)
+        label = f"🛍️ {product.name}" + (f" · {title.name}" if title else "")
+        rows.append([InlineKeyboardButton(text=label, callback_data=f"product_{product.id}")])
+    rows.append([InlineKeyboardButton(text="📂 Каталог", callback_data="catalog")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+# Общий экземпляр для обоих ботов
+catalog_search = CatalogSearch()
@@ -0,0 +1,86 @@
+"""
+Изменения каталога, которые затрагивают несколько таблиц.
+
+Каскадное удаление выполняется несколькими DELETE с подзапросами, а
+привязка размеров — одним INSERT ... SELECT, пропускающим уже существующие
+связи: число запросов не зависит от количества тайтлов, товаров и размеров,
+поэтому блокировка записи SQLite держится недолго.
+Вызывающий код сам делает commit и сбрасывает catalog_cache.
+
+Построчные триггеры журнала правок каталога на время таких запросов
+отключаются флагом catalog_version.bulk (миграция 11): вся правка — одна
+запись catalog_changes в той же транзакции, а не запись на каждую строку.
+"""
+
+from contextlib import asynccontextmanager
+from sqlalchemy import delete, literal, null, select, true, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Category, Title, Product, Size, ProductSize, CatalogVersion, CatalogChange
+
+# Удаляемые строки не загружаются в сессию — синхронизировать нечего
+_NO_SYNC = {"synchronize_session": False}
+
+
+def bulk_change(kind: str, key: int | None = None):
+    """(запрос перед массовой правкой, запросы после неё): правка попадёт в журнал одной записью (kind, key)"""
+    version = CatalogVersion.id == 1
+    start = update(CatalogVersion).where(version).values(bulk=1)
+    finish = [
+        update(CatalogVersion).where(version).values(version=CatalogVersion.version + 1, bulk=0),
+        insert(CatalogChange).from_select(
+            ["version", "kind", "key", "title_id"],
+            select(CatalogVersion.version, literal(kind), literal(key), null()).where(version)
+        ),
+    ]
+    return start, finish
+
+
+@asynccontextmanager
+async def _logged(db: AsyncSession, kind: str, key: int):
+    start, finish = bulk_change(kind, key)
+    await db.execute(start)
+    yield
+    for statement in finish:
+        await db.execute(statement)
+
+
+async def delete_category(db: AsyncSession, category_id: int) -> int:
+    """Удаляет категорию с её тайтлами, товарами и связями размеров (4 запроса)"""
+    title_ids = select(Title.id).where(Title.category_id == category_id)
+    product_ids = select(Product.id).where(Product.title_id.in_(title_ids))
+    async with _logged(db, "category_tree", category_id):
+        await db.execute(delete(ProductSize).where(ProductSize.product_id.in_(product_ids)), execution_options=_NO_SYNC)
+        await db.execute(delete(Product).where(Product.title_id.in_(title_ids)), execution_options=_NO_SYNC)
+        await db.execute(delete(Title).where(Title.category_id == category_id), execution_options=_NO_SYNC)
+        result = await db.execute(delete(Category).where(Category.id == category_id), execution_options=_NO_SYNC)
+    return result.rowcount
+
+
+async def delete_title(db: AsyncSession, title_id: int) -> int:
+    """Удаляет тайтл с его товарами и связями размеров (3 запроса)"""
+    product_ids = select(Product.id).where(Product.title_id == title_id)
+    async with _logged(db, "title_tree", title_id):
+        await db.execute(delete(ProductSize).where(ProductSize.product_id.in_(product_ids)), execution_options=_NO_SYNC)
+        await db.execute(delete(Product).where(Product.title_id == title_id), execution_options=_NO_SYNC)
+        result = await db.execute(delete(Title).where(Title.id == title_id), execution_options=_NO_SYNC)
+    return result.rowcount
+
+
+def _link(pairs):
+    # WHERE в SELECT обязателен: без него SQLite путает ON CONFLICT с условием соединения
+    return insert(ProductSize).from_select(["product_id", "size_id"], pairs.where(true())).on_conflict_do_nothing()
+
+
+async def link_size_to_all_products(db: AsyncSession, size_id: int) -> int:
+    """Привязывает размер ко всем товарам одним запросом; возвращает число новых связей"""
+    async with _logged(db, "size_products", size_id):
+        result = await db.execute(_link(select(Product.id, literal(size_id))))
+    return result.rowcount
+
+
+async def link_all_sizes_to_product(db: AsyncSession, product_id: int) -> int:
+    """Привязывает все размеры к товару одним запросом; возвращает число новых связей"""
+    async with _logged(db, "product_sizes", product_id):
+        result = await db.execute(_link(select(literal(product_id), Size.id)))
+    return result.rowcount
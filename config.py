@@ -9,15 +9,79 @@ BOT1_TOKEN = os.getenv('BOT1_TOKEN')  # Основной бот
 BOT2_TOKEN = os.getenv('BOT2_TOKEN')  # Каталог
 
 # Имена ботов (для ссылок)
+BOT1_USERNAME = os.getenv('BOT1_USERNAME', '')  # @имя_основного_бота; пусто — узнаётся через getMe при первом заказе
 BOT2_USERNAME = os.getenv('BOT2_USERNAME', 'karma_nightlights_catalog_bot')  # @имя_бота_каталога
 
+# Сколько секунд живёт ссылка на оформление заказа из бота каталога
+ORDER_DRAFT_TTL = int(os.getenv('ORDER_DRAFT_TTL', str(2 * 24 * 3600)))
+
 # Настройки Юкассы
 YOOKASSA_SHOP_ID = os.getenv('YOOKASSA_SHOP_ID')
 YOOKASSA_SECRET_KEY = os.getenv('YOOKASSA_SECRET_KEY')
+YOOKASSA_API_URL = os.getenv('YOOKASSA_API_URL', 'https://api.yookassa.ru/v3')
+YOOKASSA_RETURN_URL = os.getenv('YOOKASSA_RETURN_URL', '')  # куда вернуть после оплаты; пусто — в основной бот
+YOOKASSA_TIMEOUT = float(os.getenv('YOOKASSA_TIMEOUT', '10'))  # секунд на один запрос к API
+YOOKASSA_MAX_RETRIES = int(os.getenv('YOOKASSA_MAX_RETRIES', '3'))  # повторов при сетевых ошибках и 5xx
 
 # Настройки базы данных (SQLite по умолчанию)
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///bot_database.db')
 
+# Ограничения Telegram на исходящие сообщения (см. rate_limiter.py)
+TG_CHAT_RATE = float(os.getenv('TG_CHAT_RATE', '1'))  # сообщений в секунду в один чат
+TG_CHAT_BURST = int(os.getenv('TG_CHAT_BURST', '5'))  # допустимый короткий всплеск в чат
+TG_GLOBAL_RATE = float(os.getenv('TG_GLOBAL_RATE', '30'))  # сообщений в секунду на бота
+TG_MAX_RETRIES = int(os.getenv('TG_MAX_RETRIES', '3'))  # повторов после flood control
+
+# Режим запуска: polling (по умолчанию) или webhook (см. webhook_server.py)
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')  # публичный https-адрес, например https://shop.example.com
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH_BOT1 = os.getenv('WEBHOOK_PATH_BOT1', '/webhook/bot1')
+WEBHOOK_PATH_BOT2 = os.getenv('WEBHOOK_PATH_BOT2', '/webhook/bot2')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # обязателен в webhook-режиме; X-Telegram-Bot-Api-Secret-Token: A-Z, a-z, 0-9, _ и -
+
+# Приём уведомлений Юкассы (см. payment_webhook.py).
+# В webhook-режиме путь добавляется к общему серверу, в polling — свой сервер на PAYMENT_WEBHOOK_PORT (0 — выключен)
+PAYMENT_WEBHOOK_PATH = os.getenv('PAYMENT_WEBHOOK_PATH', '/webhook/yookassa')
+PAYMENT_WEBHOOK_HOST = os.getenv('PAYMENT_WEBHOOK_HOST', '0.0.0.0')
+PAYMENT_WEBHOOK_PORT = int(os.getenv('PAYMENT_WEBHOOK_PORT', '0'))
+# Адреса, с которых Юкасса отправляет уведомления (https://yookassa.ru/developers/using-api/webhooks)
+PAYMENT_WEBHOOK_ALLOWED_IPS = [x.strip() for x in os.getenv(
+    'PAYMENT_WEBHOOK_ALLOWED_IPS',
+    '185.71.76.0/27,185.71.77.0/27,77.75.153.0/25,77.75.156.11,77.75.156.35,77.75.154.128/25,2a02:5180::/32'
+).split(',') if x.strip()]
+# Прокси перед приёмником (nginx, балансировщик): только от них берётся адрес из X-Forwarded-For
+PAYMENT_WEBHOOK_TRUSTED_PROXIES = [x.strip() for x in os.getenv('PAYMENT_WEBHOOK_TRUSTED_PROXIES', '').split(',') if x.strip()]
+
+# Фоновая сверка платежей (см. payment_reconciler.py)
+RECONCILE_INTERVAL = float(os.getenv('RECONCILE_INTERVAL', '30'))  # секунд между проходами
+RECONCILE_BATCH = int(os.getenv('RECONCILE_BATCH', '50'))  # заказов за один запрос к БД
+RECONCILE_CONCURRENCY = int(os.getenv('RECONCILE_CONCURRENCY', '5'))  # одновременных запросов к Юкассе
+PAYMENT_PENDING_TTL = int(os.getenv('PAYMENT_PENDING_TTL', str(24 * 3600)))  # через сколько секунд неоплаченный заказ истекает
+
+# Корзины бота каталога (см. cart_store.py)
+CART_BACKEND = os.getenv('CART_BACKEND', 'db')  # db — в базе данных, memory — только в памяти
+CART_MAX_SIZE = int(os.getenv('CART_MAX_SIZE', '10000'))  # сколько корзин держать в памяти
+CART_TTL = int(os.getenv('CART_TTL', str(7 * 24 * 3600)))  # секунд без изменений до удаления корзины
+CART_FLUSH_INTERVAL = float(os.getenv('CART_FLUSH_INTERVAL', '5'))  # секунд между записями в БД
+CART_FLUSH_BATCH = int(os.getenv('CART_FLUSH_BATCH', '200'))  # записать сразу, если накопилось столько корзин
+
+# Состояния FSM (оформление заказа) хранятся в БД, брошенные удаляются через FSM_STATE_TTL секунд
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', str(3 * 24 * 3600)))
+
+# Поиск по каталогу: /search и inline-режим бота каталога (см. catalog_search.py)
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', '10'))  # кнопок в ответе на /search
+SEARCH_INLINE_LIMIT = int(os.getenv('SEARCH_INLINE_LIMIT', '20'))  # результатов inline-запроса (не больше 50)
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '1000'))  # сколько запросов держать в кэше
+SEARCH_INLINE_CACHE_TIME = int(os.getenv('SEARCH_INLINE_CACHE_TIME', '300'))  # секунд кэша inline-ответа у Telegram
+
+# Сколько готовых клавиатур каталога держать в памяти (см. keyboard_cache.py)
+KEYBOARD_CACHE_SIZE = int(os.getenv('KEYBOARD_CACHE_SIZE', '5000'))
+
+# Как часто (секунд) кэш каталога проверяет, не правил ли каталог другой процесс (см. catalog_cache.py)
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', '1'))
+
 # ID администраторов
 ADMIN_IDS = [int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()]
 
@@ -1,15 +1,30 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, ForeignKey, Boolean, DateTime, JSON
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Float, Text, ForeignKey, Boolean, DateTime, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 from config import DATABASE_URL
+from migrations import run_migrations
 
 Base = declarative_base()
 
+# Миграции (триггеры, FTS5, json_each, INSERT OR IGNORE) написаны для SQLite
+if not DATABASE_URL.startswith("sqlite://"):
+    raise ValueError("Поддерживается только SQLite: DATABASE_URL должен начинаться с sqlite://")
+
 # Создаем движок базы данных
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def get_async_database_url(url: str) -> str:
+    """Подставляет асинхронный драйвер aiosqlite в URL базы данных"""
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+# Асинхронный движок для обработчиков ботов: запросы не блокируют event loop.
+# expire_on_commit=False — атрибуты объектов доступны после commit без ленивой подгрузки
+async_engine = create_async_engine(get_async_database_url(DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 class Category(Base):
     __tablename__ = "categories"
     
@@ -30,6 +45,10 @@ class Title(Base):
     category = relationship("Category", back_populates="titles")
     products = relationship("Product", back_populates="title")
 
+    __table_args__ = (
+        Index("ix_titles_category_id_id", "category_id", "id"),
+    )
+
 class Size(Base):
     __tablename__ = "sizes"
     
@@ -50,6 +69,11 @@ class Product(Base):
     title = relationship("Title", back_populates="products")
     product_sizes = relationship("ProductSize", back_populates="product")
 
+    __table_args__ = (
+        # Список активных товаров тайтла, отсортированный по id
+        Index("ix_products_title_active_id", "title_id", "is_active", "id"),
+    )
+
 class ProductSize(Base):
     __tablename__ = "product_sizes"
     
@@ -61,6 +85,12 @@ class ProductSize(Base):
     product = relationship("Product", back_populates="product_sizes")
     size = relationship("Size")
 
+    __table_args__ = (
+        # Одна связь на пару товар-размер; индекс же покрывает выборку размеров товара
+        Index("uq_product_sizes_product_size", "product_id", "size_id", unique=True),
+        Index("ix_product_sizes_size_id", "size_id"),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
     
@@ -72,12 +102,113 @@ class Order(Base):
     delivery_price = Column(Float, default=0.0)
     total_price = Column(Float)
     discount_amount = Column(Float, default=0.0)
-    status = Column(String, default="pending")  # pending, paid, shipped, delivered
+    status = Column(String, default="pending")  # pending, paid, expired, shipped, delivered
     payment_url = Column(String)
-    payment_id = Column(String)
+    payment_id = Column(String, index=True)  # поиск заказа по уведомлению Юкассы
+    idempotency_key = Column(String)  # пользователь + черновик заказа, см. order_service.checkout_order
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Сверка платежей проходит ожидающие заказы по id
+        Index("ix_orders_status_id", "status", "id"),
+        # Повторное нажатие «Оплатить» находит уже созданный заказ
+        Index("ix_orders_idempotency_key", "idempotency_key", "status"),
+        # Постраничный просмотр заказов в админке: новые первыми, с фильтрами и без
+        Index("ix_orders_created_at", "created_at"),
+        Index("ix_orders_status_created", "status", "created_at"),
+        Index("ix_orders_user_created", "user_id", "created_at"),
+    )
+
+class OrderItem(Base):
+    """Позиция заказа: одинаковые товар и размер по одной цене сложены в quantity.
+
+    Пишется вместе с заказом (order_service.checkout_order) рядом с JSON items,
+    чтобы считать продажи по товарам и размерам агрегатами SQL.
+    """
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer)
+    size_id = Column(Integer)
+    product_name = Column(String)  # на момент заказа: товар могут переименовать или удалить
+    size_name = Column(String)
+    unit_price = Column(Float)
+    quantity = Column(Integer, default=1)
+
+    __table_args__ = (
+        Index("ix_order_items_product_size", "product_id", "size_id"),
+    )
+
+class OrderDraft(Base):
+    """Корзина, переданная из бота каталога в основной бот (см. order_drafts.py)"""
+    __tablename__ = "order_drafts"
+
+    token = Column(String, primary_key=True)
+    user_id = Column(BigInteger, index=True)
+    username = Column(String)
+    items = Column(JSON)  # [{product_id, size_id, product_name, size_name, price}]
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class CartRecord(Base):
+    """Корзина бота каталога (см. cart_store.py)"""
+    __tablename__ = "carts"
+
+    user_id = Column(BigInteger, primary_key=True)
+    items = Column(JSON)  # [{product_id, size_id, product_name, size_name, price}]
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class FSMRecord(Base):
+    """Состояние FSM пользователя (см. fsm_storage.py)"""
+    __tablename__ = "fsm_states"
+
+    key = Column(String, primary_key=True)  # bot_id:chat_id:user_id:thread_id:destiny
+    state = Column(String, nullable=True)
+    data = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ShopStats(Base):
+    """Счётчики для статистики админки, одна строка id=1 (поддерживаются триггерами, см. shop_stats.py)"""
+    __tablename__ = "shop_stats"
+
+    id = Column(Integer, primary_key=True)
+    categories = Column(Integer, default=0)
+    titles = Column(Integer, default=0)
+    products = Column(Integer, default=0)
+    sizes = Column(Integer, default=0)
+    orders = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)  # сумма оплаченных заказов
+
+class DailySales(Base):
+    """Заказы и выручка за день по способу доставки (поддерживаются триггерами, см. shop_stats.py)"""
+    __tablename__ = "daily_sales"
+
+    day = Column(String, primary_key=True)  # YYYY-MM-DD, дата создания заказа
+    delivery_method = Column(String, primary_key=True)  # '' — способ не выбран
+    orders = Column(Integer, default=0)
+    paid_orders = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+
+class CatalogVersion(Base):
+    """Версия каталога, одна строка id=1: растёт с каждой правкой (поддерживается триггерами, см. catalog_cache.py)"""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0)
+    bulk = Column(Integer)  # 1 — идёт массовая правка, построчные триггеры не пишут журнал (catalog_service.py)
+
+class CatalogChange(Base):
+    """Журнал последних правок каталога, по которому другие процессы сбрасывают свои кэши (пишут триггеры)"""
+    __tablename__ = "catalog_changes"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    # category / title / product / size / product_sizes — от триггеров;
+    # category_tree / title_tree / size_products / catalog — массовые правки (catalog_service.py)
+    kind = Column(String, nullable=False)
+    key = Column(Integer)  # id изменённой строки; для product_sizes — id товара, для size_products — id размера
+    title_id = Column(Integer)  # тайтл товара (для kind=product)
+
 class Settings(Base):
     __tablename__ = "settings"
     id = Column(Integer, primary_key=True, index=True)
@@ -86,8 +217,9 @@ class Settings(Base):
     desc_video_file_id = Column(String, nullable=True)
 
 def create_tables():
-    """Создает все таблицы в базе данных"""
+    """Создает все таблицы в базе данных и докатывает миграции на существующие"""
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 def get_db():
     """Получает сессию базы данных"""
@@ -112,6 +244,11 @@ class DatabaseManager:
     def get_session():
         return SessionLocal()
 
+    @staticmethod
+    def get_async_session():
+        """Асинхронная сессия: `async with DatabaseManager.get_async_session() as db:`"""
+        return AsyncSessionLocal()
+
 # Создаем таблицы при импорте модуля
 create_tables()
 
@@ -0,0 +1,148 @@
+"""
+Хранилище FSM в базе данных для обоих ботов.
+
+Состояние оформления заказа (OrderStates и данные: имя, телефон, адрес,
+доставка, payment_id) переживает перезапуск и видно всем процессам,
+работающим с одной БД. Обработчик обычно вызывает update_data/set_state
+несколько раз подряд, поэтому изменения копятся в памяти на время обработки
+обновления, и FSMFlushMiddleware записывает их одной транзакцией, когда
+обработчик закончил. Брошенные состояния истекают через FSM_STATE_TTL.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from sqlalchemy import delete
+from database import DatabaseManager, FSMRecord
+from config import FSM_STATE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять из БД истёкшие состояния
+PURGE_INTERVAL = 3600
+
+
+def _key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class _Entry:
+    """Состояние ключа, прочитанное из БД на время обработки обновления"""
+    __slots__ = ("state", "data", "dirty")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.dirty = False
+
+
+class DatabaseStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_states с объединением записей"""
+
+    def __init__(self, session_factory=DatabaseManager.get_async_session, ttl: float = FSM_STATE_TTL):
+        self._session_factory = session_factory
+        self.ttl = ttl
+        self._entries: dict[str, _Entry] = {}
+        self._last_purge = time.monotonic()
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        k = _key(key)
+        if k in self._entries:
+            return self._entries[k]
+        async with self._session_factory() as db:
+            record = await db.get(FSMRecord, k)
+        if k in self._entries:  # загрузил параллельный обработчик
+            return self._entries[k]
+        if record is None or record.updated_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+            entry = _Entry(None, {})
+        else:
+            entry = _Entry(record.state, dict(record.data or {}))
+        self._entries[k] = entry
+        return entry
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        entry.dirty = True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry.data = data.copy()
+        entry.dirty = True
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._entry(key)).data.copy()
+
+    async def flush(self, key: Optional[StorageKey] = None):
+        """Записывает накопленные изменения ключа (или всех ключей) и освобождает память"""
+        keys = [_key(key)] if key is not None else list(self._entries)
+        batch = {k: self._entries[k] for k in keys if k in self._entries}
+        dirty = {k: (e.state, e.data.copy()) for k, e in batch.items() if e.dirty}
+        for entry in batch.values():
+            entry.dirty = False
+        if dirty:
+            now = datetime.utcnow()
+            try:
+                async with self._session_factory() as db:
+                    await db.execute(delete(FSMRecord).where(FSMRecord.key.in_(list(dirty))))
+                    db.add_all([
+                        FSMRecord(key=k, state=state, data=data, updated_at=now)
+                        for k, (state, data) in dirty.items() if state is not None or data
+                    ])
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи состояния FSM: {e}")
+                for entry in batch.values():
+                    entry.dirty = True
+                return
+        # Пока шла запись, ключ мог снова измениться — такой оставляем до следующего flush
+        for k, entry in batch.items():
+            if not entry.dirty and self._entries.get(k) is entry:
+                del self._entries[k]
+        if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            await self.purge_expired()
+
+    async def purge_expired(self):
+        """Удаляет состояния, не менявшиеся дольше ttl"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        try:
+            async with self._session_factory() as db:
+                await db.execute(delete(FSMRecord).where(FSMRecord.updated_at < cutoff))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Ошибка очистки состояний FSM: {e}")
+
+    async def close(self) -> None:
+        await self.flush()
+
+    def setup(self, dp: Dispatcher):
+        """Подключает запись изменений после каждого обновления и дозапись при остановке"""
+        dp.update.outer_middleware(FSMFlushMiddleware(self))
+        dp.shutdown.register(self.close)
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """Записывает изменения FSM одной транзакцией после обработки обновления"""
+
+    def __init__(self, storage: DatabaseStorage):
+        self.storage = storage
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            state = data.get("state")
+            if state is not None:
+                await self.storage.flush(state.key)
+
+
+# Общее хранилище для обоих диспетчеров: ключ включает id бота
+fsm_storage = DatabaseStorage()
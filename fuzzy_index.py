@@ -0,0 +1,190 @@
+"""
+Нечёткий поиск по названиям: опечатки и транслит.
+
+Названия и запросы приводятся к одному виду: нижний регистр, кириллица
+транслитерируется в латиницу, похожие латинские сочетания склеиваются
+(«Геральт» и «geralt», «Йегер» и «yeger» дают одно и то же слово).
+Слово запроса сравнивается со словами индекса по числу правок (замена,
+вставка, пропуск, перестановка соседних букв): до 1 правки для слов до
+5 букв, до 2 — для длинных. Кандидаты ищутся методом симметричного
+удаления: для каждого слова индекс хранит варианты с 1–2 выброшенными
+буквами, и у слов на расстоянии d всегда есть общий вариант с не более
+чем d удалениями. Поиск — несколько десятков обращений к словарю,
+независимо от размера каталога.
+
+Документ находится, если в нём есть каждое слово запроса — как и в
+полнотекстовом поиске. Индекс меняется по одному документу (add / remove),
+без перестройки.
+"""
+
+import heapq
+import re
+from itertools import combinations
+from typing import Iterable
+
+_CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+_TRANSLIT = str.maketrans(_CYRILLIC_TO_LATIN)
+# Разные способы записать один звук латиницей
+_LATIN_FOLDS = (("kh", "h"), ("ph", "f"), ("ck", "k"), ("x", "ks"), ("w", "v"), ("j", "i"), ("y", "i"))
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> list[str]:
+    """Слова текста в общем латинском написании"""
+    text = text.lower().translate(_TRANSLIT)
+    for src, dst in _LATIN_FOLDS:
+        text = text.replace(src, dst)
+    return _WORD.findall(text)
+
+
+def max_distance(word: str) -> int:
+    """Сколько опечаток допускается в слове"""
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def _deletes(word: str, depth: int) -> set[str]:
+    """Слово и все его варианты без depth и меньше букв"""
+    variants = {word}
+    for count in range(1, min(depth, len(word) - 1) + 1):
+        for positions in combinations(range(len(word)), count):
+            variants.add("".join(ch for i, ch in enumerate(word) if i not in positions))
+    return variants
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Число правок с перестановкой соседних букв; limit + 1, если оно больше limit"""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Общие начало и конец не влияют на расстояние — сравниваются только различающиеся середины
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return min(len(a) + len(b), limit + 1)
+    over = limit + 1
+    # Считаются только клетки не дальше limit от диагонали — остальные заведомо больше limit
+    before, previous = None, [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if before is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return over
+        before, previous = previous, current
+    return min(previous[-1], over)
+
+
+class FuzzyIndex:
+    """Инвертированный индекс слов с поиском кандидатов по вариантам с удалёнными буквами"""
+
+    def __init__(self):
+        self._docs: dict[int, tuple[str, ...]] = {}
+        self._word_docs: dict[str, set[int]] = {}
+        # вариант с удалёнными буквами -> слова, из которых он получается
+        self._variants: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._docs
+
+    def clear(self):
+        self._docs.clear()
+        self._word_docs.clear()
+        self._variants.clear()
+
+    def add(self, doc_id: int, text: str):
+        """Добавляет документ (или заменяет, если он уже есть)"""
+        if doc_id in self._docs:
+            self.remove(doc_id)
+        words = tuple(dict.fromkeys(normalize(text)))
+        self._docs[doc_id] = words
+        for word in words:
+            docs = self._word_docs.get(word)
+            if docs is None:
+                docs = self._word_docs[word] = set()
+                for variant in _deletes(word, max_distance(word)):
+                    self._variants.setdefault(variant, set()).add(word)
+            docs.add(doc_id)
+
+    def remove(self, doc_id: int):
+        """Убирает документ; слова, которые больше нигде не встречаются, уходят из индекса"""
+        for word in self._docs.pop(doc_id, ()):
+            docs = self._word_docs[word]
+            docs.discard(doc_id)
+            if not docs:
+                del self._word_docs[word]
+                for variant in _deletes(word, max_distance(word)):
+                    words = self._variants[variant]
+                    words.discard(word)
+                    if not words:
+                        del self._variants[variant]
+
+    def similar_words(self, word: str) -> dict[str, float]:
+        """Слова индекса в пределах допустимых опечаток и их близость (1 — совпадение)"""
+        candidates = set()
+        for variant in _deletes(word, max_distance(word)):
+            candidates.update(self._variants.get(variant, ()))
+        found = {}
+        for candidate in candidates:
+            # Допуск — по более короткому слову: «кот» не станет «коса» в длинном запросе
+            limit = min(max_distance(word), max_distance(candidate))
+            distance = edit_distance(word, candidate, limit)
+            if distance <= limit:
+                found[candidate] = 1 - distance / max(len(word), len(candidate))
+        return found
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[int, float]]:
+        """Документы, в которых нашлось каждое слово запроса (с опечатками), ближе совпадения — выше"""
+        words = list(dict.fromkeys(normalize(query)))
+        if len(words) == 1:
+            return self._search_word(words[0], limit)
+        score: dict[int, float] | None = None
+        for word in words:
+            best: dict[int, float] = {}
+            for candidate, similarity in self.similar_words(word).items():
+                for doc_id in self._word_docs[candidate]:
+                    if similarity > best.get(doc_id, 0.0):
+                        best[doc_id] = similarity
+            score = best if score is None else {d: score[d] + s for d, s in best.items() if d in score}
+            if not score:
+                return []
+        ranked = heapq.nlargest(limit, score or (), key=lambda doc_id: (score[doc_id], -doc_id))
+        return [(doc_id, score[doc_id]) for doc_id in ranked]
+
+    def _search_word(self, word: str, limit: int) -> list[tuple[int, float]]:
+        # Запрос из одного слова: документы берутся по группам одинаковой близости,
+        # пока не наберётся limit, — без подсчёта очков для всех найденных
+        groups: dict[float, set[int]] = {}
+        for candidate, similarity in self.similar_words(word).items():
+            groups.setdefault(similarity, set()).update(self._word_docs[candidate])
+        found, taken = [], set()
+        for similarity in sorted(groups, reverse=True):
+            docs = groups[similarity] - taken
+            for doc_id in heapq.nsmallest(limit - len(found), docs):
+                found.append((doc_id, similarity))
+            if len(found) >= limit:
+                break
+            taken |= docs
+        return found
+
+    def add_many(self, docs: Iterable[tuple[int, str]]):
+        for doc_id, text in docs:
+            self.add(doc_id, text)
@@ -0,0 +1,169 @@
+"""
+Генератор синтетического каталога и заказов для нагрузочных замеров.
+
+    python generate_catalog.py --categories 100 --titles 5000 --products 200000 --sizes 10 --orders 1000000
+
+Строки не собираются в памяти целиком: генераторы отдают их пачками по
+--batch, каждая пачка — один executemany в своей транзакции. id задаются
+явно (продолжая существующие), поэтому связи и позиции заказов строятся
+без чтения вставленных строк обратно. Счётчики статистики и поисковый
+индекс ведут триггеры миграций, как при обычной записи; в журнал версий
+каталога каждая пачка пишется одной записью «весь каталог».
+"""
+
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from typing import Iterator, NamedTuple
+from sqlalchemy import func, insert, select
+from database import engine, Category, Title, Product, Size, ProductSize, Order, OrderItem
+from catalog_service import bulk_change
+from config import DELIVERY_METHODS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH = 5000
+
+# Слоги для названий: у товаров разные слова, чтобы поиск работал как на живом каталоге
+_SYLLABLES = ("ка", "ри", "то", "ма", "ло", "не", "су", "ва", "ги", "дэ", "ра", "ни", "ко", "ми", "за", "йо")
+
+# Доли статусов среди сгенерированных заказов
+_ORDER_STATUSES = (("delivered", 50), ("paid", 20), ("shipped", 10), ("expired", 15), ("pending", 5))
+
+
+class Volumes(NamedTuple):
+    """Сколько строк каждого вида создать"""
+    categories: int = 4
+    titles: int = 8
+    products: int = 21
+    sizes: int = 4
+    orders: int = 0
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def _next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _insert(model, rows: Iterator[dict], batch: int) -> int:
+    """Вставляет строки каталога пачками по batch, каждую пачку — отдельной транзакцией"""
+    total = 0
+    statement = insert(model.__table__)
+    start, finish = bulk_change("catalog")
+    while chunk := list(islice(rows, batch)):
+        with engine.begin() as conn:
+            conn.execute(start)
+            conn.execute(statement, chunk)
+            for step in finish:
+                conn.execute(step)
+        total += len(chunk)
+    return total
+
+
+def _orders(rng: random.Random, first_id: int, count: int, product_ids: range, sizes: list[tuple[int, str, float]],
+            days: int) -> Iterator[tuple[dict, list[dict]]]:
+    statuses, weights = zip(*_ORDER_STATUSES)
+    cum_weights = list(accumulate(weights))
+    methods = list(DELIVERY_METHODS)
+    now = datetime.utcnow()
+    for order_id in range(first_id, first_id + count):
+        lines = []
+        for _ in range(rng.choice((1, 1, 1, 2, 3))):
+            size_id, size_name, price = rng.choice(sizes)
+            product_id = rng.choice(product_ids)
+            lines.append({"product_id": product_id, "size_id": size_id,
+                          "product_name": f"Товар {product_id}", "size_name": size_name, "price": price})
+        method = rng.choice(methods)
+        status = rng.choices(statuses, cum_weights=cum_weights)[0]
+        created_at = now - timedelta(seconds=rng.randrange(days * 86400))
+        order = {
+            "id": order_id, "user_id": rng.randint(10**8, 10**8 + count // 3 + 1), "username": f"user{order_id}",
+            "items": lines[:1], "delivery_method": method, "delivery_price": DELIVERY_METHODS[method]["price"],
+            "total_price": sum(line["price"] for line in lines) + DELIVERY_METHODS[method]["price"],
+            "discount_amount": 0.0, "status": status,
+            "payment_id": f"gen-{order_id}" if status != "pending" else None,
+            "created_at": created_at, "updated_at": created_at,
+        }
+        items = [{"order_id": order_id, "product_id": line["product_id"], "size_id": line["size_id"],
+                  "product_name": line["product_name"], "size_name": line["size_name"],
+                  "unit_price": line["price"], "quantity": 1} for line in lines]
+        yield order, items
+
+
+def _insert_orders(rng: random.Random, count: int, product_ids: range, sizes: list, days: int, batch: int) -> int:
+    """Заказы и их позиции: пачка заказов и её позиции — одна транзакция"""
+    with engine.connect() as conn:
+        first_id = _next_id(conn, Order)
+    rows = _orders(rng, first_id, count, product_ids, sizes, days)
+    total = 0
+    while chunk := list(islice(rows, batch)):
+        with engine.begin() as conn:
+            conn.execute(insert(Order.__table__), [order for order, _ in chunk])
+            conn.execute(insert(OrderItem.__table__), [item for _, items in chunk for item in items])
+        total += len(chunk)
+    return total
+
+
+def generate(volumes: Volumes, batch: int = DEFAULT_BATCH, seed: int = 0, order_days: int = 365) -> dict[str, int]:
+    """Добавляет в БД синтетический каталог и заказы; возвращает число созданных строк по таблицам"""
+    rng = random.Random(seed)
+    with engine.connect() as conn:
+        category_id, title_id, product_id, size_id = (
+            _next_id(conn, model) for model in (Category, Title, Product, Size)
+        )
+    category_ids = range(category_id, category_id + volumes.categories)
+    title_ids = range(title_id, title_id + volumes.titles)
+    product_ids = range(product_id, product_id + volumes.products)
+    size_ids = range(size_id, size_id + volumes.sizes)
+    if volumes.titles and not volumes.categories or volumes.products and not volumes.titles:
+        raise ValueError("Тайтлам нужны категории, а товарам — тайтлы")
+
+    created = {}
+    created["categories"] = _insert(Category, ({"id": i, "name": f"Категория {i}"} for i in category_ids), batch)
+    created["titles"] = _insert(Title, (
+        {"id": i, "name": f"{_word(rng)} {i}", "category_id": category_ids[n % len(category_ids)]}
+        for n, i in enumerate(title_ids)
+    ), batch)
+    sizes = [(i, f"Размер {i}", float(1000 + 500 * n)) for n, i in enumerate(size_ids)]
+    created["sizes"] = _insert(Size, ({"id": i, "name": name, "price": price} for i, name, price in sizes), batch)
+    created["products"] = _insert(Product, (
+        {"id": i, "name": f"{_word(rng)} {_word(rng)} {i}", "title_id": title_ids[n % len(title_ids)],
+         "photo_url": None, "is_active": n % 20 != 0}
+        for n, i in enumerate(product_ids)
+    ), batch)
+    created["product_sizes"] = _insert(ProductSize, (
+        {"product_id": p, "size_id": s} for p in product_ids for s in size_ids
+    ), batch)
+    if volumes.orders:
+        if not sizes or not product_ids:
+            raise ValueError("Для заказов нужны товары и размеры")
+        created["orders"] = _insert_orders(rng, volumes.orders, product_ids, sizes, order_days, batch)
+    return created
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = Volumes()
+    for field in Volumes._fields:
+        parser.add_argument(f"--{field}", type=int, default=getattr(defaults, field))
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="строк в одной транзакции")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--order-days", type=int, default=365, help="за сколько дней распределить заказы")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    created = generate(Volumes(*(getattr(args, field) for field in Volumes._fields)),
+                       batch=args.batch, seed=args.seed, order_days=args.order_days)
+    logger.info(f"Создано за {time.perf_counter() - started:.1f} с: "
+                + ", ".join(f"{table} {count}" for table, count in created.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Готовые клавиатуры экранов каталога.
+
+Клавиатуры категорий, тайтлов, товаров и размеров зависят только от
+каталога, а сборка InlineKeyboardMarkup — это pydantic-модель на каждую
+кнопку. Поэтому собранная клавиатура хранится по ключу (экран, аргументы)
+вместе с версией снимка catalog_cache (generation) и отдаётся повторно,
+пока версия не сменится. Админка сбрасывает catalog_cache при каждой
+правке (в том числе из другого процесса — через версию каталога в БД),
+и клавиатуры пересобираются при следующем показе.
+
+Готовые клавиатуры общие для всех пользователей — их нельзя менять
+после получения.
+"""
+
+import functools
+from collections import OrderedDict
+from catalog_cache import catalog_cache
+from config import KEYBOARD_CACHE_SIZE
+
+
+class KeyboardCache:
+    """LRU готовых клавиатур, действующий до смены версии каталога"""
+
+    def __init__(self, cache=catalog_cache, max_size: int = KEYBOARD_CACHE_SIZE):
+        self._catalog_cache = cache
+        self.max_size = max_size
+        self._keyboards: OrderedDict[tuple, object] = OrderedDict()
+        self._generation = cache.generation
+
+    def __len__(self) -> int:
+        return len(self._keyboards)
+
+    async def get(self, key: tuple, build, generation: int | None = None):
+        """Клавиатура по ключу; build() вызывается только при промахе.
+
+        generation — версия снимка, на которой прочитаны данные для build
+        (по умолчанию текущая): клавиатура из устаревших данных не сохраняется.
+        """
+        await self._catalog_cache.refresh()
+        if self._generation != self._catalog_cache.generation:
+            self._keyboards.clear()
+            self._generation = self._catalog_cache.generation
+        if key in self._keyboards:
+            self._keyboards.move_to_end(key)
+            return self._keyboards[key]
+
+        if generation is None:
+            generation = self._generation
+        keyboard = await build()
+        # Каталог сменился, пока собиралась клавиатура, — она могла устареть
+        if generation == self._catalog_cache.generation:
+            self._keyboards[key] = keyboard
+            if len(self._keyboards) > self.max_size:
+                self._keyboards.popitem(last=False)
+        return keyboard
+
+    def cached(self, func=None, *, key=None):
+        """Декоратор для async-функции, собирающей клавиатуру по данным каталога.
+
+        Ключ — аргументы вызова; если функция получает уже загруженные данные
+        экрана (screen_loaders), key(*args) выделяет из них id сущности,
+        а версия снимка берётся из поля generation экрана.
+        """
+        if func is None:
+            return lambda f: self.cached(f, key=key)
+        screen = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args):
+            if key is None:
+                return await self.get((screen, *args), lambda: func(*args))
+            return await self.get((screen, key(*args)), lambda: func(*args), getattr(args[0], "generation", None))
+
+        return wrapper
+
+
+# Общий экземпляр для ботов и админ-панели
+keyboard_cache = KeyboardCache()
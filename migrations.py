@@ -0,0 +1,322 @@
+"""
+Лёгкие миграции схемы для уже созданных баз данных.
+
+create_all() создаёт только отсутствующие таблицы и не меняет существующие,
+поэтому индексы и колонки, добавленные в модели позже, докатываются сюда.
+Каждая миграция выполняется один раз в своей транзакции, номер применённой
+миграции записывается в таблицу schema_migrations.
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _catalog_indexes(conn: Connection):
+    """Составные индексы горячих запросов каталога и уникальность связки товар-размер"""
+    # Дубликаты копились через ручное связывание и автопривязку — оставляем самую раннюю связь
+    conn.execute(text(
+        "DELETE FROM product_sizes WHERE id NOT IN ("
+        "SELECT MIN(id) FROM product_sizes GROUP BY product_id, size_id)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_product_sizes_product_size "
+        "ON product_sizes (product_id, size_id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_product_sizes_size_id ON product_sizes (size_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_title_active_id ON products (title_id, is_active, id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_titles_category_id_id ON titles (category_id, id)"))
+
+
+def _orders_status_index(conn: Connection):
+    """Индекс для выборки ожидающих оплаты заказов сверкой платежей"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_status_id ON orders (status, id)"))
+
+
+def _orders_payment_id_index(conn: Connection):
+    """Индекс для поиска заказа по payment_id из уведомления Юкассы"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_payment_id ON orders (payment_id)"))
+
+
+def _orders_idempotency_key(conn: Connection):
+    """Колонка и индекс ключа идемпотентности заказа"""
+    if "idempotency_key" not in {column["name"] for column in inspect(conn).get_columns("orders")}:
+        conn.execute(text("ALTER TABLE orders ADD COLUMN idempotency_key VARCHAR"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_orders_idempotency_key ON orders (idempotency_key, status)"
+    ))
+
+
+def _backfill_product_sizes(conn: Connection):
+    """Привязывает все размеры к товарам без единой связи (раньше это делал показ товара)"""
+    conn.execute(text(
+        "INSERT OR IGNORE INTO product_sizes (product_id, size_id) "
+        "SELECT p.id, s.id FROM products p CROSS JOIN sizes s "
+        "WHERE NOT EXISTS (SELECT 1 FROM product_sizes ps WHERE ps.product_id = p.id)"
+    ))
+
+
+def _orders_browser_indexes(conn: Connection):
+    """Индексы постраничного просмотра заказов (id входит в индекс SQLite как rowid)"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders (created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_status_created ON orders (status, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_user_created ON orders (user_id, created_at)"))
+
+
+# Сколько заказов переносится в order_items за один INSERT
+ORDER_ITEMS_BACKFILL_CHUNK = 5000
+
+
+def _order_items(conn: Connection):
+    """Таблица позиций заказов и перенос в неё JSON items существующих заказов"""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS order_items (id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders (id), "
+        "product_id INTEGER, size_id INTEGER, product_name VARCHAR, size_name VARCHAR, unit_price FLOAT, quantity INTEGER)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_product_size ON order_items (product_id, size_id)"))
+
+    # JSON разбирает сам SQLite (json_each), заказы идут диапазонами id — память не растёт с таблицей
+    last_id, moved = 0, 0
+    while True:
+        upper_id = conn.execute(text(
+            "SELECT MAX(id) FROM (SELECT id FROM orders WHERE id > :last_id ORDER BY id LIMIT :chunk)"
+        ), {"last_id": last_id, "chunk": ORDER_ITEMS_BACKFILL_CHUNK}).scalar()
+        if upper_id is None:
+            break
+        moved += conn.execute(text(
+            "INSERT INTO order_items (order_id, product_id, size_id, product_name, size_name, unit_price, quantity) "
+            "SELECT o.id, json_extract(item.value, '$.product_id'), json_extract(item.value, '$.size_id'), "
+            "MIN(json_extract(item.value, '$.product_name')), MIN(json_extract(item.value, '$.size_name')), "
+            "json_extract(item.value, '$.price'), COUNT(*) "
+            "FROM orders o, json_each(o.items) item "
+            "WHERE o.id > :last_id AND o.id <= :upper_id AND json_valid(o.items) "
+            "AND NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.order_id = o.id) "
+            "GROUP BY o.id, 2, 3, 6"
+        ), {"last_id": last_id, "upper_id": upper_id}).rowcount
+        last_id = upper_id
+    if moved:
+        logger.info(f"Позиции заказов перенесены в order_items: {moved}")
+
+
+def _fold(expr: str) -> str:
+    """ё → е: токенизатор unicode61 не считает их одной буквой"""
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _product_search_row(product: str) -> str:
+    """Строка индекса поиска для товара product (NEW/OLD или алиас таблицы)"""
+    return (
+        f"INSERT INTO product_search (rowid, product, title, category) "
+        f"SELECT {product}.id, {_fold(f'{product}.name')}, {_fold('t.name')}, {_fold('c.name')} "
+        f"FROM (SELECT 1) LEFT JOIN titles t ON t.id = {product}.title_id "
+        f"LEFT JOIN categories c ON c.id = t.category_id"
+    )
+
+
+def _product_search(conn: Connection):
+    """Полнотекстовый индекс FTS5 по названиям товаров, тайтлов и категорий, поддерживается триггерами"""
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+        "product, title, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_products_search_insert AFTER INSERT ON products BEGIN "
+        f"{_product_search_row('NEW')}; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_products_search_update AFTER UPDATE OF name, title_id ON products BEGIN "
+        f"DELETE FROM product_search WHERE rowid = OLD.id; {_product_search_row('NEW')}; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_products_search_delete AFTER DELETE ON products BEGIN "
+        "DELETE FROM product_search WHERE rowid = OLD.id; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_titles_search_update AFTER UPDATE OF name, category_id ON titles BEGIN "
+        f"UPDATE product_search SET title = {_fold('NEW.name')}, "
+        f"category = (SELECT {_fold('name')} FROM categories WHERE id = NEW.category_id) "
+        "WHERE rowid IN (SELECT id FROM products WHERE title_id = NEW.id); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_categories_search_update AFTER UPDATE OF name ON categories BEGIN "
+        f"UPDATE product_search SET category = {_fold('NEW.name')} WHERE rowid IN ("
+        "SELECT p.id FROM products p JOIN titles t ON t.id = p.title_id WHERE t.category_id = NEW.id); END"
+    ))
+    conn.execute(text("DELETE FROM product_search"))
+    conn.execute(text(
+        "INSERT INTO product_search (rowid, product, title, category) "
+        f"SELECT p.id, {_fold('p.name')}, {_fold('t.name')}, {_fold('c.name')} FROM products p "
+        "LEFT JOIN titles t ON t.id = p.title_id LEFT JOIN categories c ON c.id = t.category_id"
+    ))
+
+
+# Таблицы, число строк которых хранится в одноимённой колонке shop_stats
+_COUNTED_TABLES = ("categories", "titles", "products", "sizes", "orders")
+
+
+def _paid_total(row: str) -> str:
+    return f"(CASE WHEN {row}.status = 'paid' THEN coalesce({row}.total_price, 0) ELSE 0 END)"
+
+
+def _daily_sales_upsert(row: str, sign: str) -> str:
+    """Добавляет (sign='+') или вычитает (sign='-') заказ row из дневной сводки"""
+    return (
+        "INSERT INTO daily_sales (day, delivery_method, orders, paid_orders, revenue) "
+        f"VALUES (coalesce(date({row}.created_at), ''), coalesce({row}.delivery_method, ''), "
+        f"{sign}1, {sign}({row}.status = 'paid'), {sign}{_paid_total(row)}) "
+        "ON CONFLICT (day, delivery_method) DO UPDATE SET orders = orders + excluded.orders, "
+        "paid_orders = paid_orders + excluded.paid_orders, revenue = revenue + excluded.revenue;"
+    )
+
+
+def _shop_stats(conn: Connection):
+    """Счётчики статистики и дневные сводки продаж, которые обновляют триггеры"""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS shop_stats (id INTEGER PRIMARY KEY, categories INTEGER, titles INTEGER, "
+        "products INTEGER, sizes INTEGER, orders INTEGER, revenue FLOAT)"
+    ))
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS daily_sales (day VARCHAR NOT NULL, delivery_method VARCHAR NOT NULL, "
+        "orders INTEGER, paid_orders INTEGER, revenue FLOAT, PRIMARY KEY (day, delivery_method))"
+    ))
+    for table in _COUNTED_TABLES:
+        extra_insert = extra_delete = ""
+        if table == "orders":
+            extra_insert = f", revenue = revenue + {_paid_total('NEW')}"
+            extra_delete = f", revenue = revenue - {_paid_total('OLD')}"
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_insert AFTER INSERT ON {table} BEGIN "
+            f"UPDATE shop_stats SET {table} = {table} + 1{extra_insert} WHERE id = 1; "
+            + (_daily_sales_upsert("NEW", "+") if table == "orders" else "")
+            + " END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_delete AFTER DELETE ON {table} BEGIN "
+            f"UPDATE shop_stats SET {table} = {table} - 1{extra_delete} WHERE id = 1; "
+            + (_daily_sales_upsert("OLD", "-") if table == "orders" else "")
+            + " END"
+        ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_orders_stats_update "
+        "AFTER UPDATE OF status, total_price, created_at, delivery_method ON orders BEGIN "
+        f"UPDATE shop_stats SET revenue = revenue - {_paid_total('OLD')} + {_paid_total('NEW')} WHERE id = 1; "
+        + _daily_sales_upsert("OLD", "-") + " " + _daily_sales_upsert("NEW", "+")
+        + " END"
+    ))
+
+    # Начальные значения — единственный полный проход по таблицам
+    counts = ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in _COUNTED_TABLES)
+    conn.execute(text(
+        f"INSERT OR REPLACE INTO shop_stats (id, {', '.join(_COUNTED_TABLES)}, revenue) VALUES (1, {counts}, "
+        "(SELECT coalesce(SUM(total_price), 0) FROM orders WHERE status = 'paid'))"
+    ))
+    conn.execute(text("DELETE FROM daily_sales"))
+    conn.execute(text(
+        "INSERT INTO daily_sales (day, delivery_method, orders, paid_orders, revenue) "
+        "SELECT coalesce(date(created_at), ''), coalesce(delivery_method, ''), COUNT(*), "
+        "SUM(status = 'paid'), SUM(CASE WHEN status = 'paid' THEN coalesce(total_price, 0) ELSE 0 END) "
+        "FROM orders GROUP BY 1, 2"
+    ))
+
+
+# Сколько последних правок хранит журнал catalog_changes; отставший сильнее процесс сбрасывает кэш целиком
+CATALOG_CHANGES_KEEP = 1000
+
+# Таблица каталога -> (вид правки, id строки, тайтл товара) для журнала catalog_changes
+_CATALOG_CHANGE_SOURCES = {
+    "categories": ("category", "id", None),
+    "titles": ("title", "id", None),
+    "products": ("product", "id", "title_id"),
+    "sizes": ("size", "id", None),
+    "product_sizes": ("product_sizes", "product_id", None),
+}
+
+
+def _catalog_change(row: str, kind: str, key: str, title_id: str | None) -> str:
+    """Поднимает версию каталога и записывает правку строки row (NEW/OLD) в журнал"""
+    return (
+        "UPDATE catalog_version SET version = version + 1 WHERE id = 1; "
+        "INSERT INTO catalog_changes (version, kind, key, title_id) "
+        f"SELECT version, '{kind}', {row}.{key}, {f'{row}.{title_id}' if title_id else 'NULL'} "
+        "FROM catalog_version WHERE id = 1;"
+    )
+
+
+def _catalog_change_triggers(conn: Connection, when: str = ""):
+    """Триггеры журнала правок на каждой таблице каталога (срабатывают, если выполнено условие when)"""
+    for table, (kind, key, title_id) in _CATALOG_CHANGE_SOURCES.items():
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()} AFTER {event} ON {table} "
+                f"{when}BEGIN {_catalog_change(row, kind, key, title_id)} END"
+            ))
+
+
+def _catalog_version(conn: Connection):
+    """Версия каталога и журнал правок для сброса кэшей в других процессах, поддерживаются триггерами"""
+    conn.execute(text("CREATE TABLE IF NOT EXISTS catalog_version (id INTEGER PRIMARY KEY, version INTEGER)"))
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS catalog_changes (version INTEGER PRIMARY KEY, kind VARCHAR NOT NULL, "
+        "key INTEGER, title_id INTEGER)"
+    ))
+    conn.execute(text("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)"))
+    _catalog_change_triggers(conn)
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_catalog_changes_prune AFTER INSERT ON catalog_changes BEGIN "
+        f"DELETE FROM catalog_changes WHERE version <= NEW.version - {CATALOG_CHANGES_KEEP}; END"
+    ))
+
+
+def _catalog_bulk_changes(conn: Connection):
+    """Флаг массовой правки: пока он поднят, построчные триггеры журнала молчат.
+
+    Каскадное удаление и привязка размера ко всем товарам — один запрос на
+    тысячи строк; журнал о них пишет catalog_service одной записью на правку.
+    """
+    if "bulk" not in {column["name"] for column in inspect(conn).get_columns("catalog_version")}:
+        conn.execute(text("ALTER TABLE catalog_version ADD COLUMN bulk INTEGER"))
+    for table in _CATALOG_CHANGE_SOURCES:
+        for event in ("insert", "update", "delete"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_version_{event}"))
+    _catalog_change_triggers(conn, "WHEN NOT coalesce((SELECT bulk FROM catalog_version WHERE id = 1), 0) ")
+
+
+# (версия, описание, функция) — только добавлять в конец, не менять применённые
+MIGRATIONS = [
+    (1, "catalog composite indexes", _catalog_indexes),
+    (2, "orders status index", _orders_status_index),
+    (3, "orders payment_id index", _orders_payment_id_index),
+    (4, "orders idempotency key", _orders_idempotency_key),
+    (5, "backfill product sizes", _backfill_product_sizes),
+    (6, "shop stats counters", _shop_stats),
+    (7, "orders browser indexes", _orders_browser_indexes),
+    (8, "order items", _order_items),
+    (9, "product search index", _product_search),
+    (10, "catalog version", _catalog_version),
+    (11, "catalog bulk changes", _catalog_bulk_changes),
+]
+
+
+def run_migrations(engine: Engine):
+    """Применяет миграции, которых ещё нет в schema_migrations"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR, applied_at TIMESTAMP)"
+        ))
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()}
+            )
+        logger.info(f"Применена миграция {version}: {name}")
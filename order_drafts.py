@@ -0,0 +1,62 @@
+"""
+Передача корзины из бота каталога в основной бот.
+
+Бот каталога сохраняет корзину черновиком в таблицу order_drafts и даёт
+ссылку https://t.me/<основной бот>?start=order_<token>. Основной бот по
+/start order_<token> читает черновик из БД — без пересылки корзины через
+Telegram и без ограничения на длину сообщения.
+"""
+
+import logging
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete
+from database import DatabaseManager, OrderDraft
+from config import ORDER_DRAFT_TTL
+
+logger = logging.getLogger(__name__)
+
+# Префикс параметра /start для черновика заказа
+DEEP_LINK_PREFIX = "order_"
+
+# Сколько позиций перечислять в сообщении: длина сообщения Telegram ограничена 4096 символами
+ITEMS_PREVIEW_LIMIT = 30
+
+# Как часто удалять истёкшие черновики
+PURGE_INTERVAL = 3600
+_last_purge = 0.0
+
+
+async def create_draft(user_id: int, username: str, items: list[dict]) -> str:
+    """Сохраняет корзину черновиком и возвращает токен для deep link"""
+    global _last_purge
+    token = secrets.token_urlsafe(12)  # 16 символов из A-Z a-z 0-9 _ -
+    async with DatabaseManager.get_async_session() as db:
+        db.add(OrderDraft(token=token, user_id=user_id, username=username, items=items))
+        if time.monotonic() - _last_purge > PURGE_INTERVAL:
+            _last_purge = time.monotonic()
+            cutoff = datetime.utcnow() - timedelta(seconds=ORDER_DRAFT_TTL)
+            await db.execute(delete(OrderDraft).where(OrderDraft.created_at < cutoff))
+        await db.commit()
+    return token
+
+
+async def load_draft(token: str, user_id: int) -> Optional[OrderDraft]:
+    """Черновик по токену, если он принадлежит пользователю и не истёк"""
+    async with DatabaseManager.get_async_session() as db:
+        draft = await db.get(OrderDraft, token)
+    if draft is None or draft.user_id != user_id:
+        return None
+    if draft.created_at < datetime.utcnow() - timedelta(seconds=ORDER_DRAFT_TTL):
+        return None
+    return draft
+
+
+def items_preview(items: list[dict], line_format: str = "• {product_name} · {size_name} - {price} ₽\n") -> str:
+    """Список товаров для сообщения: первые ITEMS_PREVIEW_LIMIT позиций и счётчик остальных"""
+    text = "".join(line_format.format(**item) for item in items[:ITEMS_PREVIEW_LIMIT])
+    if len(items) > ITEMS_PREVIEW_LIMIT:
+        text += f"… и ещё {len(items) - ITEMS_PREVIEW_LIMIT} шт.\n"
+    return text
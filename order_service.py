@@ -0,0 +1,278 @@
+"""
+Общие операции с заказами: оформление, смена статуса после оплаты, просмотр.
+
+Используются обработчиками основного бота, админкой, фоновой сверкой платежей
+(payment_reconciler.py) и приёмом уведомлений Юкассы (payment_webhook.py):
+создание заказа с платежом без дублей, смена статуса ожидающих заказов,
+сообщение покупателю об успешной оплате и постраничный список заказов.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional
+from aiogram import Bot
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import select, tuple_, update
+from database import DatabaseManager, Order, OrderItem
+from fsm_storage import fsm_storage
+from payment_gateway import payment_gateway
+
+logger = logging.getLogger(__name__)
+
+
+def get_manager_link(order_id: int | None = None) -> str:
+    """Возвращает ссылку на менеджера с нужной реф-меткой."""
+    if order_id:
+        return f"https://t.me/kxrmxx_shop_bot?start=tgbot_zakaz_{order_id}"
+    return "https://t.me/kxrmxx_shop_bot?start=iz_bota_ne_oformil"
+
+def get_contact_manager_keyboard(order_id: int | None = None) -> InlineKeyboardMarkup:
+    """Клавиатура с кнопкой связи с менеджером."""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🧑‍💼 Связаться с менеджером", url=get_manager_link(order_id))]
+    ])
+
+def payment_thanks_text(order_id: int) -> str:
+    """Благодарность после оплаты со ссылкой менеджера с рефметкой"""
+    return (
+        "Спасибо за заказ ❤️\n"
+        f"Ваш ночник уже взяли в работу. Номер заказа: {order_id}\n\n"
+        "Перейдите, пожалуйста, по ссылке, чтобы наш менеджер подтвердил ваш заказ:\n\n"
+        f"{get_manager_link(order_id)}"
+    )
+
+
+# Поля состояния FSM, из которых собирается заказ (черновик оформления)
+ORDER_DRAFT_FIELDS = (
+    "order_data", "final_price", "discount_amount", "delivery_method", "delivery_price",
+    "customer_name", "customer_phone", "customer_address",
+)
+
+
+class CheckoutResult(NamedTuple):
+    """Заказ с платежом, созданный или найденный по ключу идемпотентности"""
+    order_id: int
+    payment_id: str
+    payment_url: str
+    created: bool
+
+
+def order_item_rows(order_id: int, items: list[dict]) -> list[OrderItem]:
+    """Позиции заказа из items черновика: одинаковые товар, размер и цена складываются в quantity"""
+    quantities, first = Counter(), {}
+    for item in items:
+        key = (item.get('product_id'), item.get('size_id'), item.get('price'))
+        quantities[key] += 1
+        first.setdefault(key, item)
+    return [
+        OrderItem(order_id=order_id, product_id=key[0], size_id=key[1], unit_price=key[2], quantity=quantity,
+                  product_name=first[key].get('product_name'), size_name=first[key].get('size_name'))
+        for key, quantity in quantities.items()
+    ]
+
+
+def order_idempotency_key(user_id: int, data: dict) -> str:
+    """Ключ заказа: пользователь + содержимое черновика.
+
+    Повторное нажатие «Оплатить» с тем же черновиком даёт тот же ключ,
+    изменённый черновик (другой размер, доставка, адрес) — новый.
+    """
+    draft = json.dumps({field: data.get(field) for field in ORDER_DRAFT_FIELDS},
+                       sort_keys=True, ensure_ascii=False, default=str)
+    return f"{user_id}:{hashlib.sha256(draft.encode()).hexdigest()[:32]}"
+
+
+# Оформления, которые выполняются прямо сейчас: ключ -> задача
+_in_flight: dict[str, asyncio.Task] = {}
+
+
+async def checkout_order(user_id: int, username: str, data: dict, return_url: str,
+                         gateway=payment_gateway) -> CheckoutResult:
+    """Создаёт заказ и платёж по черновику из FSM или возвращает уже созданные.
+
+    Одновременные вызовы с одним ключом ждут одну и ту же задачу,
+    повторный вызов после неё находит ожидающий оплаты заказ в БД.
+    """
+    key = order_idempotency_key(user_id, data)
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(_checkout(key, user_id, username, data, return_url, gateway))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    # shield: отмена одного из ожидающих не прерывает оформление для остальных
+    return await asyncio.shield(task)
+
+
+async def _checkout(key: str, user_id: int, username: str, data: dict, return_url: str,
+                    gateway) -> CheckoutResult:
+    created = False
+    async with DatabaseManager.get_async_session() as db:
+        order = (await db.execute(
+            select(Order)
+            .where(Order.idempotency_key == key, Order.status == "pending")
+            .order_by(Order.id.desc())
+            .limit(1)
+        )).scalar_one_or_none()
+        if order is not None and order.payment_url:
+            return CheckoutResult(order.id, order.payment_id, order.payment_url, False)
+        if order is None:
+            # Вкладываем данные клиента в items[0], чтобы не менять схему БД
+            items_enriched = [dict(data['order_data']['items'][0])]
+            items_enriched[0]['customer_name'] = data.get('customer_name')
+            items_enriched[0]['customer_phone'] = data.get('customer_phone')
+            items_enriched[0]['customer_address'] = data.get('customer_address')
+            order = Order(
+                user_id=user_id,
+                username=username,
+                items=items_enriched,
+                delivery_method=data['delivery_method'],
+                delivery_price=data['delivery_price'],
+                total_price=data['final_price'],
+                discount_amount=data['discount_amount'],
+                status="pending",
+                idempotency_key=key
+            )
+            db.add(order)
+            await db.flush()
+            # Позиции — все товары черновика, в одной транзакции с заказом
+            db.add_all(order_item_rows(order.id, data['order_data']['items']))
+            await db.commit()
+            created = True
+        order_id = order.id
+
+    # Заказ без платежа остаётся, если Юкасса не ответила: следующая попытка
+    # создаст платёж с тем же ключом идемпотентности Юкассы (номер заказа),
+    # а без неё сверка платежей переведёт его в expired по PAYMENT_PENDING_TTL
+    payment = await gateway.create_payment(
+        order_id, data['final_price'], f"Заказ #{order_id} - Ночники", return_url
+    )
+    async with DatabaseManager.get_async_session() as db:
+        # Сверка могла истечь заказ, пока создавался платёж, — с платежом он снова ждёт оплаты
+        await db.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status.in_(("pending", "expired")))
+            .values(payment_url=payment.confirmation_url, payment_id=payment.id, status="pending")
+        )
+        await db.commit()
+    return CheckoutResult(order_id, payment.id, payment.confirmation_url, created)
+
+
+async def mark_pending_orders(order_ids: list[int], status: str) -> list[tuple[int, int]]:
+    """Переводит ожидающие оплаты заказы в status одним UPDATE.
+
+    Заказы, которые уже не pending (их успел обработать другой путь),
+    не трогаются. Возвращает (order_id, user_id) реально изменённых заказов.
+    """
+    if not order_ids:
+        return []
+    async with DatabaseManager.get_async_session() as db:
+        result = await db.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status == "pending")
+            .values(status=status)
+            .returning(Order.id, Order.user_id)
+        )
+        changed = [(row.id, row.user_id) for row in result]
+        await db.commit()
+    return changed
+
+
+async def expire_unpaid_orders(created_before: datetime) -> int:
+    """Переводит в expired ожидающие заказы без платежа, созданные раньше created_before, одним UPDATE.
+
+    Платёж не создан (Юкасса не ответила при оформлении), оплатить такой
+    заказ нельзя. Возвращает число истёкших заказов.
+    """
+    async with DatabaseManager.get_async_session() as db:
+        result = await db.execute(
+            update(Order)
+            .where(Order.status == "pending", Order.payment_id.is_(None), Order.created_at < created_before)
+            .values(status="expired")
+        )
+        await db.commit()
+    return result.rowcount
+
+
+async def mark_pending_payment(payment_id: str, status: str) -> list[tuple[int, int]]:
+    """То же, что mark_pending_orders, но заказ ищется по payment_id (индекс ix_orders_payment_id)"""
+    async with DatabaseManager.get_async_session() as db:
+        result = await db.execute(
+            update(Order)
+            .where(Order.payment_id == payment_id, Order.status == "pending")
+            .values(status=status)
+            .returning(Order.id, Order.user_id)
+        )
+        changed = [(row.id, row.user_id) for row in result]
+        await db.commit()
+    return changed
+
+
+async def pending_payment_order(payment_id: str) -> Optional[tuple[int, float]]:
+    """Номер и сумма заказа, который ждёт оплаты платежа payment_id"""
+    async with DatabaseManager.get_async_session() as db:
+        row = (await db.execute(
+            select(Order.id, Order.total_price)
+            .where(Order.payment_id == payment_id, Order.status == "pending")
+            .limit(1)
+        )).first()
+    return (row.id, row.total_price) if row else None
+
+
+async def notify_paid(bot: Bot, user_id: int, order_id: int):
+    """Сообщает покупателю об успешной оплате и завершает оформление заказа в FSM"""
+    try:
+        await bot.send_message(user_id, payment_thanks_text(order_id), reply_markup=get_contact_manager_keyboard(order_id))
+    except Exception as e:
+        logger.error(f"Не удалось уведомить пользователя {user_id} об оплате заказа #{order_id}: {e}")
+    # Сбрасываем состояние, только если пользователь всё ещё оформляет именно этот заказ
+    key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+    if (await fsm_storage.get_data(key)).get("order_id") == order_id:
+        await fsm_storage.set_state(key, None)
+        await fsm_storage.set_data(key, {})
+    await fsm_storage.flush(key)
+
+
+class OrderFilter(NamedTuple):
+    """Фильтр списка заказов в админке; None — без ограничения"""
+    status: Optional[str] = None
+    date_from: Optional[date] = None  # включительно
+    date_to: Optional[date] = None  # включительно
+    user_id: Optional[int] = None
+
+
+# Позиция в списке заказов: (created_at, id) последнего показанного заказа
+OrderCursor = tuple[datetime, int]
+
+
+async def list_orders(filters: OrderFilter = OrderFilter(), after: Optional[OrderCursor] = None,
+                      limit: int = 10) -> tuple[list[Order], Optional[OrderCursor]]:
+    """Страница заказов, новые первыми; возвращает заказы и курсор следующей страницы.
+
+    Пагинация по ключу (created_at, id) вместо OFFSET: каждая страница читает
+    только limit + 1 строк из индекса ix_orders_created_at, ix_orders_status_created
+    или ix_orders_user_created, сколько бы заказов ни было до неё.
+    """
+    query = select(Order)
+    if filters.status:
+        query = query.where(Order.status == filters.status)
+    if filters.user_id:
+        query = query.where(Order.user_id == filters.user_id)
+    if filters.date_from:
+        query = query.where(Order.created_at >= datetime.combine(filters.date_from, time.min))
+    if filters.date_to:
+        query = query.where(Order.created_at < datetime.combine(filters.date_to + timedelta(days=1), time.min))
+    if after is not None:
+        query = query.where(tuple_(Order.created_at, Order.id) < tuple_(*after))
+    query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
+
+    async with DatabaseManager.get_async_session() as db:
+        orders = list((await db.execute(query)).scalars())
+    if len(orders) <= limit:
+        return orders, None
+    orders = orders[:limit]
+    return orders, (orders[-1].created_at, orders[-1].id)
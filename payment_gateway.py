@@ -0,0 +1,131 @@
+"""
+Асинхронный клиент API Юкассы.
+
+Запросы идут через одну aiohttp-сессию с keep-alive, поэтому соединение
+с api.yookassa.ru переиспользуется и обработчики ботов не блокируются на
+время HTTP-запроса. Сетевые ошибки, таймауты, 429 и 5xx повторяются с
+нарастающей паузой. Создание платежа отправляется с Idempotence-Key,
+привязанным к номеру заказа: повтор запроса (в том числе после таймаута,
+когда платёж на деле уже создан) вернёт тот же платёж, а не второй.
+"""
+
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+import aiohttp
+from config import (
+    YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, YOOKASSA_API_URL,
+    YOOKASSA_TIMEOUT, YOOKASSA_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повтором: RETRY_BACKOFF, 2 * RETRY_BACKOFF, 4 * RETRY_BACKOFF...
+RETRY_BACKOFF = 0.5
+
+# Статусы ответа, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PaymentGatewayError(Exception):
+    """Юкасса отклонила запрос или недоступна после всех повторов"""
+
+
+class PaymentNotFoundError(PaymentGatewayError):
+    """Юкасса ответила 404: такого платежа нет"""
+
+
+class PaymentInfo(NamedTuple):
+    id: str
+    status: str  # pending, waiting_for_capture, succeeded, canceled
+    paid: bool
+    confirmation_url: Optional[str]
+    metadata: dict
+    amount: Optional[float] = None  # сумма платежа в рублях
+
+
+def payment_idempotency_key(order_id: int) -> str:
+    """Ключ идемпотентности создания платежа для заказа"""
+    return f"order-{order_id}"
+
+
+def _payment_info(data: dict) -> PaymentInfo:
+    return PaymentInfo(
+        id=data["id"],
+        status=data["status"],
+        paid=bool(data.get("paid")),
+        confirmation_url=(data.get("confirmation") or {}).get("confirmation_url"),
+        metadata=data.get("metadata") or {},
+        amount=float(data["amount"]["value"]) if data.get("amount") else None
+    )
+
+
+class YooKassaGateway:
+    """Клиент Юкассы на общей keep-alive сессии"""
+
+    def __init__(self, shop_id: Optional[str] = YOOKASSA_SHOP_ID, secret_key: Optional[str] = YOOKASSA_SECRET_KEY,
+                 api_url: str = YOOKASSA_API_URL, timeout: float = YOOKASSA_TIMEOUT,
+                 max_retries: int = YOOKASSA_MAX_RETRIES):
+        self.shop_id = shop_id
+        self.secret_key = secret_key
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(str(self.shop_id or ""), self.secret_key or ""),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60)
+            )
+        return self._session
+
+    async def _request(self, method: str, path: str, json: Optional[dict] = None,
+                       idempotency_key: Optional[str] = None) -> dict:
+        headers = {"Idempotence-Key": idempotency_key} if idempotency_key else {}
+        attempt = 0
+        while True:
+            try:
+                async with self._get_session().request(method, self.api_url + path, json=json, headers=headers) as response:
+                    if response.status < 400:
+                        return await response.json()
+                    body = await response.text()
+                    if response.status == 404:
+                        raise PaymentNotFoundError(f"{method} {path}: HTTP 404 {body}")
+                    if response.status not in RETRY_STATUSES:
+                        raise PaymentGatewayError(f"{method} {path}: HTTP {response.status} {body}")
+                    error = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            attempt += 1
+            if attempt > self.max_retries:
+                raise PaymentGatewayError(f"{method} {path}: Юкасса недоступна ({error})")
+            delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+            logger.warning(f"Юкасса: {method} {path} не удался ({error}), повтор через {delay} с")
+            await asyncio.sleep(delay)
+
+    async def create_payment(self, order_id: int, amount: float, description: str, return_url: str) -> PaymentInfo:
+        """Создаёт платёж с переходом на страницу оплаты (redirect)"""
+        data = await self._request("POST", "/payments", json={
+            "amount": {"value": f"{amount:.2f}", "currency": "RUB"},
+            "confirmation": {"type": "redirect", "return_url": return_url},
+            "capture": True,
+            "description": description,
+            "metadata": {"order_id": str(order_id)}
+        }, idempotency_key=payment_idempotency_key(order_id))
+        return _payment_info(data)
+
+    async def get_payment(self, payment_id: str) -> PaymentInfo:
+        """Текущее состояние платежа"""
+        return _payment_info(await self._request("GET", f"/payments/{payment_id}"))
+
+    async def close(self):
+        """Закрывает HTTP-сессию (при остановке бота)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# Общий клиент основного бота
+payment_gateway = YooKassaGateway()
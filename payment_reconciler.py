@@ -0,0 +1,128 @@
+"""
+Фоновая сверка платежей с Юкассой.
+
+Раз в RECONCILE_INTERVAL секунд проходит заказы со status='pending' и
+payment_id пачками по RECONCILE_BATCH, запрашивает статусы платежей
+(не больше RECONCILE_CONCURRENCY запросов одновременно) и одним UPDATE на
+пачку переводит оплаченные в paid, а отменённые и зависшие дольше
+PAYMENT_PENDING_TTL — в expired. Зависший заказ истекает, только если
+Юкасса ответила (платёж не оплачен или его нет): при сетевой ошибке или 5xx
+заказ ждёт следующего прохода, иначе поздняя оплата потерялась бы.
+Заказы без платежа (Юкасса не ответила при оформлении) оплатить нельзя —
+они истекают по тому же PAYMENT_PENDING_TTL одним UPDATE.
+Покупатель получает сообщение об оплате сам, без кнопки «Я оплатил».
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from aiogram import Bot
+from sqlalchemy import select
+from database import DatabaseManager, Order
+from order_service import expire_unpaid_orders, mark_pending_orders, notify_paid
+from payment_gateway import payment_gateway, PaymentGatewayError, PaymentNotFoundError
+from config import RECONCILE_INTERVAL, RECONCILE_BATCH, RECONCILE_CONCURRENCY, PAYMENT_PENDING_TTL
+
+logger = logging.getLogger(__name__)
+
+# Статус платежа, которого в Юкассе нет (ответ 404)
+PAYMENT_NOT_FOUND = "not_found"
+
+
+class PaymentReconciler:
+    """Периодическая сверка ожидающих оплаты заказов"""
+
+    def __init__(self, gateway=payment_gateway, interval: float = RECONCILE_INTERVAL,
+                 batch_size: int = RECONCILE_BATCH, concurrency: int = RECONCILE_CONCURRENCY,
+                 pending_ttl: float = PAYMENT_PENDING_TTL):
+        self.gateway = gateway
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.pending_ttl = pending_ttl
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _fetch_statuses(self, payment_ids: list[str]) -> list[Optional[str]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(payment_id: str) -> Optional[str]:
+            """Статус платежа, PAYMENT_NOT_FOUND или None, если Юкасса не ответила"""
+            async with semaphore:
+                try:
+                    return (await self.gateway.get_payment(payment_id)).status
+                except PaymentNotFoundError:
+                    return PAYMENT_NOT_FOUND
+                except PaymentGatewayError as e:
+                    logger.warning(f"Сверка платежей: {e}")
+                    return None
+
+        return await asyncio.gather(*(fetch(payment_id) for payment_id in payment_ids))
+
+    async def run_once(self) -> dict[str, int]:
+        """Один проход по всем ожидающим заказам; возвращает, сколько заказов переведено"""
+        paid, expired = [], []
+        deadline = datetime.utcnow() - timedelta(seconds=self.pending_ttl)
+        last_id = 0
+        while True:
+            async with DatabaseManager.get_async_session() as db:
+                batch = (await db.execute(
+                    select(Order.id, Order.payment_id, Order.created_at)
+                    .where(Order.status == "pending", Order.payment_id.is_not(None), Order.id > last_id)
+                    .order_by(Order.id)
+                    .limit(self.batch_size)
+                )).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            statuses = await self._fetch_statuses([row.payment_id for row in batch])
+            paid_ids, expired_ids = [], []
+            for row, status in zip(batch, statuses):
+                if status is None:
+                    continue
+                if status == "succeeded":
+                    paid_ids.append(row.id)
+                elif status == "canceled" or (row.created_at and row.created_at < deadline):
+                    expired_ids.append(row.id)
+
+            newly_paid = await mark_pending_orders(paid_ids, "paid")
+            expired += await mark_pending_orders(expired_ids, "expired")
+            paid += newly_paid
+            if self._bot is not None:
+                for order_id, user_id in newly_paid:
+                    await notify_paid(self._bot, user_id, order_id)
+
+        unpaid = await expire_unpaid_orders(deadline)
+        if paid or expired or unpaid:
+            logger.info(f"Сверка платежей: оплачено {len(paid)}, истекло {len(expired) + unpaid}")
+        return {"paid": len(paid), "expired": len(expired) + unpaid}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка сверки платежей: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self, bot: Bot):
+        """Запускает сверку (при старте диспетчера основного бота)"""
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Останавливает сверку (при остановке диспетчера)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Общий экземпляр для основного бота
+payment_reconciler = PaymentReconciler()
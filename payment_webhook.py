@@ -0,0 +1,133 @@
+"""
+Приём HTTP-уведомлений Юкассы (payment.succeeded / payment.canceled).
+
+Заказ ищется по payment_id (индекс ix_orders_payment_id) и переводится
+из pending в paid или expired; покупатель оплаченного заказа сразу получает
+подтверждение. Уведомления принимаются только с адресов Юкассы
+(PAYMENT_WEBHOOK_ALLOWED_IPS), адрес из X-Forwarded-For учитывается только
+от прокси из PAYMENT_WEBHOOK_TRUSTED_PROXIES. Телу уведомления бот не
+верит: статус, сумма и номер заказа сверяются с платежом, запрошенным
+у Юкассы. Повторное уведомление ничего не меняет: статус обновляется
+только у заказа, который ещё ждёт оплаты.
+
+В webhook-режиме путь PAYMENT_WEBHOOK_PATH добавляется к общему серверу
+ботов (webhook_server.py), в режиме polling приёмник запускается рядом
+с ботами на PAYMENT_WEBHOOK_PORT.
+"""
+
+import ipaddress
+import logging
+from aiohttp import web
+from aiogram import Bot
+from order_service import mark_pending_payment, notify_paid, pending_payment_order
+from payment_gateway import payment_gateway, PaymentGatewayError
+from config import (
+    PAYMENT_WEBHOOK_PATH, PAYMENT_WEBHOOK_HOST, PAYMENT_WEBHOOK_PORT, PAYMENT_WEBHOOK_ALLOWED_IPS,
+    PAYMENT_WEBHOOK_TRUSTED_PROXIES
+)
+
+logger = logging.getLogger(__name__)
+
+# События, после которых платёж перепроверяется в Юкассе
+EVENTS = {"payment.succeeded", "payment.canceled"}
+
+# Статус платежа в Юкассе -> новый статус заказа
+PAYMENT_STATUSES = {
+    "succeeded": "paid",
+    "canceled": "expired",
+}
+
+
+class PaymentWebhookHandler:
+    """Обработчик уведомлений Юкассы для aiohttp"""
+
+    def __init__(self, bot: Bot, allowed_ips: list[str] = PAYMENT_WEBHOOK_ALLOWED_IPS, gateway=payment_gateway,
+                 trusted_proxies: list[str] = PAYMENT_WEBHOOK_TRUSTED_PROXIES):
+        self.bot = bot
+        self.gateway = gateway
+        self.allowed_networks = [ipaddress.ip_network(ip, strict=False) for ip in allowed_ips]
+        self.trusted_proxies = [ipaddress.ip_network(ip, strict=False) for ip in trusted_proxies]
+
+    def register(self, app: web.Application, path: str = PAYMENT_WEBHOOK_PATH):
+        app.router.add_post(path, self.handle)
+
+    def _client_ip(self, request: web.Request) -> str:
+        ip = request.remote or ""
+        # Доверенный прокси дописывает адрес своего клиента в конец X-Forwarded-For;
+        # левые адреса присылает сам клиент, им верить нельзя
+        hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+        while hops and self._in(ip, self.trusted_proxies):
+            ip = hops.pop()
+        return ip
+
+    @staticmethod
+    def _in(ip: str, networks: list) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in networks)
+
+    def is_allowed(self, ip: str) -> bool:
+        return self._in(ip, self.allowed_networks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        ip = self._client_ip(request)
+        if not self.is_allowed(ip):
+            logger.warning(f"Уведомление об оплате с чужого адреса {ip} отклонено")
+            return web.Response(status=403)
+        try:
+            body = await request.json()
+            event = body["event"]
+            payment_id = body["object"]["id"]
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400)
+
+        if event not in EVENTS:
+            return web.Response(status=200)
+        try:
+            order = await pending_payment_order(payment_id)
+            if order is None:
+                return web.Response(status=200)
+            # Статус берётся из Юкассы, а не из тела уведомления
+            payment = await self.gateway.get_payment(payment_id)
+            status = PAYMENT_STATUSES.get(payment.status)
+            if status is None:
+                return web.Response(status=200)
+            order_id, total_price = order
+            if payment.metadata.get("order_id") != str(order_id) or (
+                status == "paid" and (payment.amount is None or abs(payment.amount - (total_price or 0)) > 0.01)
+            ):
+                logger.error(f"Платёж {payment_id} не совпадает с заказом #{order_id} (сумма или номер), статус не изменён")
+                return web.Response(status=200)
+            changed = await mark_pending_payment(payment_id, status)
+        except PaymentGatewayError as e:
+            logger.error(f"Не удалось проверить платёж {payment_id} в Юкассе: {e}")
+            return web.Response(status=500)
+        except Exception as e:
+            logger.error(f"Ошибка обработки уведомления {event} для платежа {payment_id}: {e}")
+            # Юкасса повторит уведомление, если ответ не 200
+            return web.Response(status=500)
+        for order_id, user_id in changed:
+            logger.info(f"Заказ #{order_id}: {event}")
+            if status == "paid":
+                await notify_paid(self.bot, user_id, order_id)
+        return web.Response(status=200)
+
+
+def create_payment_webhook_app(bot: Bot, allowed_ips: list[str] = PAYMENT_WEBHOOK_ALLOWED_IPS, gateway=payment_gateway,
+                               trusted_proxies: list[str] = PAYMENT_WEBHOOK_TRUSTED_PROXIES) -> web.Application:
+    """Отдельное aiohttp-приложение с приёмником уведомлений"""
+    app = web.Application()
+    PaymentWebhookHandler(bot, allowed_ips, gateway, trusted_proxies).register(app)
+    return app
+
+
+async def start_payment_webhook(bot: Bot, host: str = PAYMENT_WEBHOOK_HOST,
+                                port: int = PAYMENT_WEBHOOK_PORT) -> web.AppRunner:
+    """Запускает приёмник в текущем event loop рядом с ботами (polling-режим)"""
+    runner = web.AppRunner(create_payment_webhook_app(bot))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Приём уведомлений Юкассы: {host}:{port}{PAYMENT_WEBHOOK_PATH}")
+    return runner
@@ -0,0 +1,171 @@
+"""
+Ограничитель исходящих запросов к Telegram для обоих ботов.
+
+Telegram допускает около 1 сообщения в секунду в один чат (с короткими
+всплесками) и около 30 сообщений в секунду на бота. Ограничитель ставится
+middleware на сессию Bot: отправка ждёт свободный токен в ведре чата и в
+общем ведре токена бота, а при TelegramRetryAfter выжидает retry_after и
+повторяет запрос.
+"""
+
+import asyncio
+import logging
+import time
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from config import TG_CHAT_RATE, TG_CHAT_BURST, TG_GLOBAL_RATE, TG_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые отправляют или меняют сообщения и попадают под лимиты
+LIMITED_METHOD_PREFIXES = ("send", "edit", "copy", "forward")
+
+# Ведро чата без ожидающих и простаивающее дольше этого времени удаляется
+IDLE_BUCKET_TTL = 60.0
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waiting = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Занимает токен и возвращает, сколько секунд ждать до его появления.
+
+        Токены могут уходить в минус: каждый следующий вызов встаёт в очередь
+        за предыдущими, поэтому порядок отправки сохраняется.
+        """
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self, seconds: float):
+        """Сдвигает доступность ведра на seconds (после flood control)"""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def is_idle(self, now: float) -> bool:
+        return not self.waiting and now - self.updated > IDLE_BUCKET_TTL
+
+
+class RateLimiter:
+    """Общий ограничитель: ведро на каждый чат и ведро на каждый токен бота"""
+
+    def __init__(self, chat_rate: float = TG_CHAT_RATE, chat_burst: int = TG_CHAT_BURST,
+                 global_rate: float = TG_GLOBAL_RATE, max_retries: int = TG_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_rate = global_rate
+        self.max_retries = max_retries
+        self._global: dict[int, TokenBucket] = {}
+        self._chats: dict[tuple[int, int | str], TokenBucket] = {}
+        self._last_prune = time.monotonic()
+        self.retry_after_count = 0
+        self.max_queue_depth = 0
+
+    def _global_bucket(self, bot_id: int) -> TokenBucket:
+        if bot_id not in self._global:
+            self._global[bot_id] = TokenBucket(self.global_rate, self.global_rate)
+        return self._global[bot_id]
+
+    def _chat_bucket(self, bot_id: int, chat_id: int | str) -> TokenBucket:
+        key = (bot_id, chat_id)
+        if key not in self._chats:
+            self._prune()
+            self._chats[key] = TokenBucket(self.chat_rate, self.chat_burst)
+        return self._chats[key]
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < IDLE_BUCKET_TTL:
+            return
+        self._last_prune = now
+        for key in [k for k, b in self._chats.items() if b.is_idle(now)]:
+            del self._chats[key]
+
+    async def acquire(self, bot_id: int, chat_id: int | str | None):
+        """Дожидается права отправить одно сообщение"""
+        buckets = [self._global_bucket(bot_id)]
+        if chat_id is not None:
+            buckets.append(self._chat_bucket(bot_id, chat_id))
+        delay = max(bucket.reserve() for bucket in buckets)
+        if delay <= 0:
+            return
+        for bucket in buckets:
+            bucket.waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            for bucket in buckets:
+                bucket.waiting -= 1
+
+    def flood_wait(self, bot_id: int, chat_id: int | str | None, retry_after: float):
+        """Учитывает ответ flood control: чат (или весь бот) молчит retry_after секунд"""
+        self.retry_after_count += 1
+        if chat_id is not None:
+            self._chat_bucket(bot_id, chat_id).penalize(retry_after)
+        else:
+            self._global_bucket(bot_id).penalize(retry_after)
+
+    def queue_depth(self, bot_id: int | None = None) -> int:
+        """Сколько отправок сейчас ждут токен (по всем ботам или по одному)"""
+        return sum(b.waiting for k, b in self._global.items() if bot_id is None or k == bot_id)
+
+    def metrics(self) -> dict:
+        """Метрики очереди для логов и мониторинга"""
+        return {
+            "queue_depth": self.queue_depth(),
+            "queue_depth_by_bot": {bot_id: b.waiting for bot_id, b in self._global.items()},
+            "busiest_chats": sorted(
+                ((chat_id, b.waiting) for (_, chat_id), b in self._chats.items() if b.waiting),
+                key=lambda item: item[1], reverse=True
+            )[:10],
+            "max_queue_depth": self.max_queue_depth,
+            "retry_after_count": self.retry_after_count,
+            "tracked_chats": len(self._chats),
+        }
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot: очередь по лимитам и повтор после TelegramRetryAfter"""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def __call__(self, make_request, bot, method):
+        if not method.__api_method__.startswith(LIMITED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            await self.limiter.acquire(bot.id, chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.limiter.max_retries:
+                    raise
+                logger.warning(f"Flood control ({method.__api_method__}, чат {chat_id}): ждём {e.retry_after} с")
+                self.limiter.flood_wait(bot.id, chat_id, e.retry_after)
+
+
+# Общий экземпляр: боты с одним токеном делят одни и те же ведра
+rate_limiter = RateLimiter()
+
+
+def install_rate_limiter(bot: Bot, limiter: RateLimiter = rate_limiter) -> Bot:
+    """Подключает ограничитель к сессии бота"""
+    bot.session.middleware(RateLimitMiddleware(limiter))
+    return bot
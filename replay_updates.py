@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Прогон записанных обновлений Telegram через локальный webhook-сервер.
+
+    python webhook_server.py
+    python replay_updates.py bot2 tests/fixtures/updates/bot2_catalog.json
+
+Файл содержит одно обновление (объект Update в JSON) или список обновлений.
+Боты ответят в чат из обновления, поэтому в записях стоит указывать свой chat id.
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from aiohttp import ClientSession
+from config import WEBHOOK_PORT, WEBHOOK_PATH_BOT1, WEBHOOK_PATH_BOT2, WEBHOOK_SECRET
+
+BOT_PATHS = {"bot1": WEBHOOK_PATH_BOT1, "bot2": WEBHOOK_PATH_BOT2}
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def load_updates(paths: list[str]) -> list[dict]:
+    """Читает обновления из JSON-файлов"""
+    updates = []
+    for path in paths:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        updates.extend(data if isinstance(data, list) else [data])
+    return updates
+
+
+async def post_updates(session, url: str, updates: list[dict], secret_token: str = WEBHOOK_SECRET) -> list[int]:
+    """Отправляет обновления по одному и возвращает HTTP-статусы ответов"""
+    headers = {SECRET_HEADER: secret_token} if secret_token else {}
+    statuses = []
+    for update in updates:
+        async with session.post(url, json=update, headers=headers) as response:
+            statuses.append(response.status)
+    return statuses
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Прогон записанных обновлений через webhook-сервер")
+    parser.add_argument("bot", choices=BOT_PATHS)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}")
+    args = parser.parse_args()
+
+    updates = load_updates(args.files)
+    async with ClientSession() as session:
+        statuses = await post_updates(session, args.url.rstrip("/") + BOT_PATHS[args.bot], updates)
+    for update, status in zip(updates, statuses):
+        print(f"update {update.get('update_id')}: HTTP {status}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,14 @@
 import asyncio
 import logging
+import sys
 from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 from aiogram.types import Message
-from config import BOT1_TOKEN, BOT2_TOKEN, ADMIN_IDS
+from config import BOT1_TOKEN, BOT2_TOKEN, ADMIN_IDS, RUN_MODE
 import bot1_main
 import bot2_catalog
 import admin_panel
+import webhook_server
 
 # Настройка логирования
 logging.basicConfig(
@@ -19,6 +21,14 @@ async def main():
     """Запуск всех ботов"""
     logger.info("Запуск системы ботов...")
     
+    # Webhook-режим: оба бота на одном aiohttp-сервере
+    if RUN_MODE == "webhook" or "--webhook" in sys.argv:
+        try:
+            await webhook_server.main()
+        except Exception as e:
+            logger.error(f"Ошибка webhook-сервера: {e}")
+        return
+    
     # Создаем задачи для каждого бота
     tasks = []
     
@@ -0,0 +1,74 @@
+"""
+Данные экранов каталога за один заход в БД.
+
+Экран категории — категория и её тайтлы, экран тайтла — тайтл и страница
+его товаров, экран товара — товар и его размеры. Загрузчик берёт всё из
+catalog_cache, а недостающие срезы дочитывает в одной сессии
+(catalog_cache.batch()) запросами по нужным колонкам: холодный клик —
+один заход в БД, тёплый — ни одного. Клавиатуры экранов собираются из
+этих же данных и в БД не ходят.
+
+Экран помнит версию снимка каталога (generation), на которой он прочитан:
+клавиатура, собранная из экрана, сохраняется в keyboard_cache, только если
+каталог с тех пор не менялся.
+"""
+
+from typing import NamedTuple, Optional
+from catalog_cache import catalog_cache, CategoryRow, TitleRow, ProductRow, SizeRow
+
+
+class CategoryScreen(NamedTuple):
+    category_id: int
+    category: Optional[CategoryRow]
+    titles: list[TitleRow]
+    generation: int
+
+
+class TitleScreen(NamedTuple):
+    title_id: int
+    title: Optional[TitleRow]
+    products: list[ProductRow]
+    total: int  # активных товаров в тайтле (на всех страницах)
+    generation: int
+
+
+class ProductScreen(NamedTuple):
+    product_id: int
+    product: Optional[ProductRow]
+    sizes: list[SizeRow]
+    generation: int
+
+
+async def _generation() -> int:
+    """Версия снимка после сверки с БД — с ней сравнивается версия после загрузки экрана"""
+    await catalog_cache.refresh()
+    return catalog_cache.generation
+
+
+async def load_category_screen(category_id: int) -> CategoryScreen:
+    """Категория и её тайтлы"""
+    async with catalog_cache.batch():
+        generation = await _generation()
+        return CategoryScreen(category_id, await catalog_cache.category(category_id),
+                              await catalog_cache.titles(category_id), generation)
+
+
+async def load_title_screen(title_id: int, limit: int | None = None, after_id: int | None = None,
+                            before_id: int | None = None) -> TitleScreen:
+    """Тайтл и его активные товары: все или страница по курсору (см. CatalogCache.products_page)"""
+    async with catalog_cache.batch():
+        generation = await _generation()
+        title = await catalog_cache.title(title_id)
+        if limit is None:
+            products = await catalog_cache.products(title_id)
+            return TitleScreen(title_id, title, products, len(products), generation)
+        products, total = await catalog_cache.products_page(title_id, limit, after_id=after_id, before_id=before_id)
+        return TitleScreen(title_id, title, products, total, generation)
+
+
+async def load_product_screen(product_id: int) -> ProductScreen:
+    """Товар и его размеры"""
+    async with catalog_cache.batch():
+        generation = await _generation()
+        return ProductScreen(product_id, await catalog_cache.product(product_id),
+                             await catalog_cache.product_sizes(product_id), generation)
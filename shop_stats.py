@@ -0,0 +1,51 @@
+"""
+Статистика магазина для админки без сканирования таблиц.
+
+Счётчики хранятся в строке shop_stats (id=1), выручка по дням и способам
+доставки — в daily_sales. Обе таблицы обновляют триггеры SQLite на
+вставку, удаление и смену статуса (миграция 6), поэтому счётчики верны
+при любом пути записи: админка, каскадное удаление, сверка платежей,
+уведомления Юкассы. День в сводке — дата создания заказа (UTC).
+"""
+
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from sqlalchemy import func, select
+from database import DatabaseManager, ShopStats, DailySales
+
+
+class SalesRow(NamedTuple):
+    """Оплаченные заказы и выручка за день или по способу доставки"""
+    key: str
+    paid_orders: int
+    revenue: float
+
+
+async def get_shop_stats() -> Optional[ShopStats]:
+    """Счётчики каталога и заказов — одна строка"""
+    async with DatabaseManager.get_async_session() as db:
+        return await db.get(ShopStats, 1)
+
+
+async def revenue_by_day(days: int = 7) -> list[SalesRow]:
+    """Выручка за последние days дней, новые дни первыми"""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    async with DatabaseManager.get_async_session() as db:
+        rows = (await db.execute(
+            select(DailySales.day, func.sum(DailySales.paid_orders), func.sum(DailySales.revenue))
+            .where(DailySales.day >= since)
+            .group_by(DailySales.day)
+            .order_by(DailySales.day.desc())
+        )).all()
+    return [SalesRow(*row) for row in rows]
+
+
+async def revenue_by_delivery_method() -> list[SalesRow]:
+    """Выручка за всё время по способам доставки, по убыванию"""
+    async with DatabaseManager.get_async_session() as db:
+        rows = (await db.execute(
+            select(DailySales.delivery_method, func.sum(DailySales.paid_orders), func.sum(DailySales.revenue))
+            .group_by(DailySales.delivery_method)
+            .order_by(func.sum(DailySales.revenue).desc())
+        )).all()
+    return [SalesRow(*row) for row in rows]
@@ -0,0 +1,73 @@
+"""
+Общие настройки тестов: отдельная временная БД, фиктивные токены и общие фикстуры (фабрика сессий, каталог, бот)
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+_tmp_dir = tempfile.mkdtemp(prefix="bot_karma_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}")
+os.environ.setdefault("BOT1_TOKEN", "123456:TEST_TOKEN_BOT1")
+os.environ.setdefault("BOT2_TOKEN", "654321:TEST_TOKEN_BOT2")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, Category, Title, Product, Size, ProductSize  # noqa: E402
+
+
+class CountingSessions:
+    """Фабрика сессий, считающая обращения к БД"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return DatabaseManager.get_async_session()
+
+
+@pytest.fixture
+def counting_sessions():
+    return CountingSessions()
+
+
+def _seed_catalog(products: int = 3):
+    """Категория, тайтл с products активными товарами и размер, привязанный к первому товару"""
+    with DatabaseManager.get_session() as db:
+        category = Category(name=f"Тест-категория {uuid.uuid4().hex[:8]}")
+        db.add(category)
+        db.flush()
+        title = Title(name="Тест-тайтл", category_id=category.id)
+        size = Size(name=f"Тест-размер {uuid.uuid4().hex[:8]}", price=100.0)
+        db.add_all([title, size])
+        db.flush()
+        items = [Product(name=f"Тест-товар {i}", title_id=title.id, is_active=True) for i in range(products)]
+        db.add_all(items)
+        db.flush()
+        db.add(ProductSize(product_id=items[0].id, size_id=size.id))
+        db.commit()
+        return category.id, title.id, [p.id for p in items], size.id
+
+
+@pytest.fixture
+def seed_catalog():
+    return _seed_catalog
+
+
+class RecordingBot:
+    """Бот, который запоминает отправленные сообщения вместо запросов к Telegram"""
+    id = 123456
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def recording_bot():
+    return RecordingBot()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Локальный фейковый сервер API Юкассы для тестов и ручной проверки оплаты.
+
+    python tests/fake_yookassa.py            # слушает 127.0.0.1:8099
+    YOOKASSA_API_URL=http://127.0.0.1:8099/v3 python run_bots.py
+
+Поддерживает POST /v3/payments (с Idempotence-Key) и GET /v3/payments/{id}.
+Переход по confirmation_url (GET /pay/{id}) помечает платёж оплаченным.
+notify() отправляет уведомление о платеже, как это делает Юкасса.
+"""
+
+import uuid
+from aiohttp import web
+
+
+class FakeYooKassa:
+    """Состояние фейковой Юкассы: платежи, ключи идемпотентности, искусственные сбои"""
+
+    def __init__(self):
+        self.payments: dict[str, dict] = {}
+        self.by_idempotency_key: dict[str, str] = {}
+        self.requests: list[tuple[str, str]] = []
+        self.fail_next = 0  # столько следующих запросов получат 503
+
+    def succeed(self, payment_id: str):
+        """Помечает платёж оплаченным"""
+        self.payments[payment_id].update(status="succeeded", paid=True)
+
+    async def notify(self, session, url: str, event: str, payment_id: str) -> int:
+        """Отправляет уведомление payment.succeeded / payment.canceled и возвращает HTTP-статус ответа"""
+        status = {"payment.succeeded": "succeeded", "payment.canceled": "canceled"}[event]
+        self.payments[payment_id].update(status=status, paid=status == "succeeded")
+        body = {"type": "notification", "event": event, "object": self.payments[payment_id]}
+        async with session.post(url, json=body) as response:
+            return response.status
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/v3/payments", self.create_payment)
+        app.router.add_get("/v3/payments/{payment_id}", self.get_payment)
+        app.router.add_get("/pay/{payment_id}", self.pay)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests.append((request.method, request.path))
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            return web.json_response({"type": "error", "code": "internal_server_error"}, status=503)
+        if request.path.startswith("/v3/") and request.headers.get("Authorization") is None:
+            return web.json_response({"type": "error", "code": "invalid_credentials"}, status=401)
+        return await handler(request)
+
+    async def create_payment(self, request: web.Request) -> web.Response:
+        key = request.headers.get("Idempotence-Key")
+        if not key:
+            return web.json_response({"type": "error", "code": "invalid_request"}, status=400)
+        if key in self.by_idempotency_key:
+            return web.json_response(self.payments[self.by_idempotency_key[key]])
+        body = await request.json()
+        payment_id = str(uuid.uuid4())
+        self.payments[payment_id] = {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": body["amount"],
+            "description": body.get("description"),
+            "metadata": body.get("metadata", {}),
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": f"{request.scheme}://{request.host}/pay/{payment_id}",
+                "return_url": body["confirmation"]["return_url"]
+            }
+        }
+        self.by_idempotency_key[key] = payment_id
+        return web.json_response(self.payments[payment_id])
+
+    async def get_payment(self, request: web.Request) -> web.Response:
+        payment = self.payments.get(request.match_info["payment_id"])
+        if payment is None:
+            return web.json_response({"type": "error", "code": "not_found"}, status=404)
+        return web.json_response(payment)
+
+    async def pay(self, request: web.Request) -> web.Response:
+        payment = self.payments.get(request.match_info["payment_id"])
+        if payment is None:
+            raise web.HTTPNotFound()
+        self.succeed(payment["id"])
+        raise web.HTTPFound(payment["confirmation"]["return_url"])
+
+
+if __name__ == "__main__":
+    web.run_app(FakeYooKassa().create_app(), host="127.0.0.1", port=8099)
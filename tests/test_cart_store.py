@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Тест хранилища корзин: вытеснение и TTL в памяти, пакетная запись и загрузка из БД
+"""
+
+import asyncio
+import random
+import time
+from cart_store import MemoryCartStore, DatabaseCartStore
+
+
+def _user_ids(n):
+    base = random.randint(10**12, 10**13)
+    return [base + i for i in range(n)]
+
+
+def test_memory_store_is_bounded_and_expires():
+    store = MemoryCartStore(max_size=2, ttl=0.1)
+
+    async def scenario():
+        for user_id in (1, 2, 3):
+            cart = await store.get(user_id)
+            cart.add_item(1, 1, "Товар", "Размер", 100.0)
+            await store.save(user_id, cart)
+        assert len(store) == 2
+        assert (await store.get(1)).is_empty()  # вытеснена как самая старая
+        assert not (await store.get(3)).is_empty()
+        time.sleep(0.15)
+        assert (await store.get(3)).is_empty()
+
+    asyncio.run(scenario())
+
+
+def test_database_store_batches_writes_and_survives_restart(counting_sessions):
+    user_ids = _user_ids(3)
+    sessions = counting_sessions
+    store = DatabaseCartStore(session_factory=sessions, flush_batch=100)
+
+    async def scenario():
+        for user_id in user_ids:
+            cart = await store.get(user_id)
+            cart.add_item(1, 1, "Товар", "Размер", 250.0)
+            await store.save(user_id, cart)
+        loads = sessions.calls
+        await store.flush()
+        # все изменения — одной транзакцией
+        assert sessions.calls == loads + 1
+
+        # «перезапуск»: новый экземпляр читает корзины из БД при первом обращении
+        restarted = DatabaseCartStore()
+        cart = await restarted.get(user_ids[0])
+        assert cart.get_total_price() == 250.0
+        cart.clear()
+        await restarted.save(user_ids[0], cart)
+        await restarted.close()
+
+        assert (await DatabaseCartStore().get(user_ids[0])).is_empty()
+        assert not (await DatabaseCartStore().get(user_ids[1])).is_empty()
+
+    asyncio.run(scenario())
+
+
+def test_database_store_keeps_unflushed_carts_after_eviction():
+    user_ids = _user_ids(3)
+    store = DatabaseCartStore(max_size=1, flush_batch=100)
+
+    async def scenario():
+        for user_id in user_ids:
+            cart = await store.get(user_id)
+            cart.add_item(1, 1, "Товар", "Размер", 100.0)
+            await store.save(user_id, cart)
+        assert not (await store.get(user_ids[0])).is_empty()
+        await store.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Тест кэша каталога: повторные чтения не ходят в БД, сброс подхватывает изменения,
+правки из другого процесса видны по версии каталога, матрица размеров строится в фоне
+"""
+
+import asyncio
+import uuid
+from database import DatabaseManager, Product, Size, ProductSize, CatalogVersion
+from catalog_cache import CatalogCache
+from catalog_service import delete_title, link_size_to_all_products
+
+
+def test_reads_are_served_from_memory(seed_catalog, counting_sessions):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+    sessions = counting_sessions
+    cache = CatalogCache(session_factory=sessions)
+
+    async def scenario():
+        for _ in range(3):
+            assert category_id in [c.id for c in await cache.categories()]
+            assert [t.id for t in await cache.titles(category_id)] == [title_id]
+            assert [p.id for p in await cache.products(title_id)] == sorted(product_ids, reverse=True)
+            assert [s.id for s in await cache.product_sizes(product_ids[0])] == [size_id]
+            await cache.wait_size_matrix()
+            assert (await cache.product(product_ids[1])).title_id == title_id
+
+    asyncio.run(scenario())
+    # категории, тайтлы, товары тайтла — по одному запросу;
+    # размеры товара — прямой запрос, пока в фоне строится матрица (ещё один)
+    assert sessions.calls == 5
+
+
+def test_invalidate_product_reloads_title_slice(seed_catalog):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+    cache = CatalogCache()
+
+    async def scenario():
+        assert len(await cache.products(title_id)) == 3
+
+        with DatabaseManager.get_session() as db:
+            db.query(Product).filter(Product.id == product_ids[2]).update({"is_active": False})
+            db.commit()
+        assert len(await cache.products(title_id)) == 3
+
+        cache.invalidate_product(product_ids[2])
+        assert [p.id for p in await cache.products(title_id)] == sorted(product_ids[:2], reverse=True)
+        assert (await cache.product(product_ids[2])).is_active is False
+
+    asyncio.run(scenario())
+
+
+def test_products_page_walks_by_cursor(seed_catalog):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+    with DatabaseManager.get_session() as db:
+        extra = [Product(name=f"Кэш-товар доп {i}", title_id=title_id, is_active=True) for i in range(22)]
+        db.add_all(extra)
+        db.commit()
+        all_ids = sorted(product_ids + [p.id for p in extra], reverse=True)
+    cache = CatalogCache()
+
+    async def scenario():
+        first, total = await cache.products_page(title_id, 10)
+        assert total == 25
+        assert [p.id for p in first] == all_ids[:10]
+        second, _ = await cache.products_page(title_id, 10, after_id=first[-1].id)
+        assert [p.id for p in second] == all_ids[10:20]
+        third, _ = await cache.products_page(title_id, 10, after_id=second[-1].id)
+        assert [p.id for p in third] == all_ids[20:]
+        back, _ = await cache.products_page(title_id, 10, before_id=third[0].id)
+        assert [p.id for p in back] == all_ids[10:20]
+
+    asyncio.run(scenario())
+
+
+def test_edits_from_other_process_are_picked_up_by_version(seed_catalog, counting_sessions):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+    sessions = counting_sessions
+    cache = CatalogCache(session_factory=sessions, check_interval=0)
+
+    async def scenario():
+        assert [s.id for s in await cache.product_sizes(product_ids[0])] == [size_id]
+        assert [t.id for t in await cache.titles(category_id)] == [title_id]
+        assert len(await cache.products(title_id)) == 3
+
+        # «другой процесс»: запись мимо кэша, версию поднимают триггеры
+        with DatabaseManager.get_session() as db:
+            db.add(Product(name="Кэш-товар новый", title_id=title_id, is_active=True))
+            db.query(Size).filter(Size.id == size_id).update({"price": 200.0})
+            db.commit()
+        products = await cache.products(title_id)
+        assert len(products) == 4
+        assert (await cache.product_sizes(product_ids[0]))[0].price == 200.0
+
+        # тайтлы не менялись — их срез не перечитывается
+        calls = sessions.calls
+        assert [t.id for t in await cache.titles(category_id)] == [title_id]
+        assert sessions.calls == calls + 1  # только проверка версии
+
+        # журнал обрезан дальше, чем успел дочитать кэш, — сброс целиком
+        with DatabaseManager.get_session() as db:
+            db.get(CatalogVersion, 1).version += 10_000
+            db.commit()
+        generation = cache.generation
+        await cache.titles(category_id)
+        assert cache.generation > generation and cache._titles is not None
+
+    asyncio.run(scenario())
+
+
+def test_bulk_edits_from_other_process_keep_size_matrix(seed_catalog):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+    cache = CatalogCache(check_interval=0)
+
+    async def scenario():
+        assert await cache.product_sizes(product_ids[1]) == []
+        await cache.wait_size_matrix()
+        assert len(await cache.products(title_id)) == 3
+        matrix = cache._matrix
+
+        # «другой процесс»: массовые правки — по одной записи журнала
+        async with DatabaseManager.get_async_session() as db:
+            await link_size_to_all_products(db, size_id)
+            await db.commit()
+        assert [s.id for s in await cache.product_sizes(product_ids[1])] == [size_id]
+
+        async with DatabaseManager.get_async_session() as db:
+            await delete_title(db, title_id)
+            await db.commit()
+        assert await cache.products(title_id) == []
+        assert await cache.product(product_ids[0]) is None
+        assert cache._matrix is matrix
+
+    asyncio.run(scenario())
+
+
+def test_version_is_checked_at_most_once_per_interval(seed_catalog, counting_sessions):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+    sessions = counting_sessions
+    cache = CatalogCache(session_factory=sessions, check_interval=60)
+
+    async def scenario():
+        assert len(await cache.products(title_id)) == 3
+        with DatabaseManager.get_session() as db:
+            db.add(Product(name="Кэш-товар новый", title_id=title_id, is_active=True))
+            db.commit()
+        assert len(await cache.products(title_id)) == 3
+
+    asyncio.run(scenario())
+    # одна проверка версии и одна загрузка товаров
+    assert sessions.calls == 2
+
+
+def test_size_matrix_serves_all_products_from_one_load(seed_catalog, counting_sessions):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+    with DatabaseManager.get_session() as db:
+        other = Size(name=f"Кэш-размер {uuid.uuid4().hex[:8]}", price=300.0)
+        db.add(other)
+        db.commit()
+        other_id = other.id
+    sessions = counting_sessions
+    cache = CatalogCache(session_factory=sessions)
+
+    async def scenario():
+        # пока матрица строится в фоне — прямой запрос
+        assert [s.id for s in await cache.product_sizes(product_ids[0])] == [size_id]
+        await cache.wait_size_matrix()
+        assert sessions.calls == 2
+        assert await cache.product_sizes(product_ids[1]) == []
+        assert await cache.has_size(product_ids[0], size_id)
+        assert not await cache.has_size(product_ids[0], other_id)
+        assert sessions.calls == 2
+
+        # связь из админки отмечается в матрице без чтения из БД
+        with DatabaseManager.get_session() as db:
+            db.add(ProductSize(product_id=product_ids[1], size_id=other_id))
+            db.commit()
+        cache.link_product_size(product_ids[1], other_id)
+        assert [s.id for s in await cache.product_sizes(product_ids[1])] == [other_id]
+        assert sessions.calls == 2
+
+        # новый товар: его строку дочитывает один запрос
+        with DatabaseManager.get_session() as db:
+            product = Product(name="Кэш-товар новый", title_id=title_id, is_active=True)
+            db.add(product)
+            db.flush()
+            db.add(ProductSize(product_id=product.id, size_id=size_id))
+            db.commit()
+            new_id = product.id
+        assert [s.id for s in await cache.product_sizes(new_id)] == [size_id]
+        assert sessions.calls == 3
+
+        # цена размера сменилась — матрица та же, списки размеров новые
+        with DatabaseManager.get_session() as db:
+            db.query(Size).filter(Size.id == size_id).update({"price": 150.0})
+            db.commit()
+        cache.invalidate_sizes()
+        assert (await cache.product_sizes(product_ids[0]))[0].price == 150.0
+        assert sessions.calls == 4
+
+        # полный сброс: показ товара не ждёт перестройки матрицы
+        cache.invalidate()
+        assert [s.id for s in await cache.product_sizes(product_ids[1])] == [other_id]
+        assert cache._matrix is None
+        await cache.wait_size_matrix()
+        assert cache._matrix is not None
+        assert sessions.calls == 6
+
+    asyncio.run(scenario())
+
+
+def test_size_matrix_load_survives_catalog_change_during_load(seed_catalog):
+    category_id, title_id, product_ids, size_id = seed_catalog()
+
+    class InvalidatingSessions:
+        """Правка каталога, пока читаются первые сессии"""
+
+        def __init__(self, edits):
+            self.edits = edits
+
+        def __call__(self):
+            if self.edits:
+                self.edits -= 1
+                cache.invalidate()
+            return DatabaseManager.get_async_session()
+
+    # правка во время одной загрузки — матрица строится повторно
+    cache = CatalogCache(session_factory=InvalidatingSessions(edits=1))
+    assert asyncio.run(cache._load_size_matrix())
+    assert [s.id for s in asyncio.run(cache.product_sizes(product_ids[0]))] == [size_id]
+
+    # каталог меняется при каждой попытке — матрицы нет, размеры читаются прямым запросом
+    cache = CatalogCache(session_factory=InvalidatingSessions(edits=100))
+    assert not asyncio.run(cache._load_size_matrix())
+    assert cache._matrix is None
+
+    async def scenario():
+        assert [s.id for s in await cache.product_sizes(product_ids[0])] == [size_id]
+        assert await cache.has_size(product_ids[0], size_id)
+        assert not await cache.has_size(product_ids[1], size_id)
+        await cache.wait_size_matrix()
+
+    asyncio.run(scenario())
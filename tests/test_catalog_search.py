@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Тест поиска по каталогу: индекс FTS5 следует за правками каталога, результаты кэшируются до сброса каталога
+"""
+
+import asyncio
+import random
+from database import DatabaseManager, Category, Title, Product
+from catalog_cache import CatalogCache
+from catalog_search import CatalogSearch, match_expression
+
+
+def _catalog(suffix):
+    with DatabaseManager.get_session() as db:
+        category = Category(name=f"Аниме {suffix}")
+        db.add(category)
+        db.flush()
+        title = Title(name=f"Атака титанов {suffix}", category_id=category.id)
+        db.add(title)
+        db.flush()
+        products = [Product(name=name, title_id=title.id, is_active=True)
+                    for name in (f"Эрен Йегер {suffix}", f"Микаса Аккерман {suffix}", f"Ёжик {suffix}")]
+        db.add_all(products)
+        db.commit()
+        return category.id, title.id, [p.id for p in products]
+
+
+def _search(search, query):
+    return [p.id for p in asyncio.run(search.search(query, 50))]
+
+
+def test_match_expression():
+    assert match_expression("  Эрен, йег!") == '"эрен"* "йег"*'
+    assert match_expression("ёжик") == '"ежик"*'
+    assert match_expression("!!!") == ""
+
+
+def test_search_by_product_title_and_category_names():
+    suffix = f"x{random.randint(10**6, 10**7)}"
+    category_id, title_id, (eren, mikasa, hedgehog) = _catalog(suffix)
+    search = CatalogSearch(CatalogCache())
+
+    assert _search(search, f"эре {suffix}") == [eren]
+    assert _search(search, f"ежик {suffix}") == [hedgehog]
+    assert set(_search(search, f"атака титанов {suffix}")) == {eren, mikasa, hedgehog}
+    assert set(_search(search, f"аниме {suffix} микаса")) == {mikasa}
+
+
+def test_index_and_cache_follow_catalog_edits():
+    suffix = f"x{random.randint(10**6, 10**7)}"
+    category_id, title_id, (eren, mikasa, hedgehog) = _catalog(suffix)
+    cache = CatalogCache()
+    search = CatalogSearch(cache)
+    query = f"атака {suffix}"
+    first = asyncio.run(search.search(query))
+    assert asyncio.run(search.search(query)) is first
+
+    with DatabaseManager.get_session() as db:
+        db.get(Title, title_id).name = f"Магическая битва {suffix}"
+        db.get(Product, mikasa).is_active = False
+        db.get(Category, category_id).name = f"Манга {suffix}"
+        db.delete(db.get(Product, hedgehog))
+        db.commit()
+    # без сброса каталога отдаётся кэш, после сброса — новый результат
+    assert asyncio.run(search.search(query)) is first
+    cache.invalidate()
+    assert _search(search, query) == []
+    assert _search(search, f"битва манга {suffix}") == [eren]
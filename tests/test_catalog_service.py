@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Тест изменений каталога: каскадное удаление и привязка размеров выполняются постоянным числом запросов
+и пишут в журнал правок каталога одну запись
+"""
+
+import asyncio
+from sqlalchemy import event, func, select
+from database import DatabaseManager, Category, Title, Product, Size, ProductSize, CatalogVersion, CatalogChange, async_engine
+from catalog_service import delete_category, delete_title, link_size_to_all_products, link_all_sizes_to_product
+
+
+def _category(name, titles=3, products=4):
+    """Категория с тайтлами, товарами и двумя размерами у каждого товара"""
+    with DatabaseManager.get_session() as db:
+        sizes = [Size(name=f"{name}-S", price=100), Size(name=f"{name}-M", price=200)]
+        category = Category(name=name)
+        db.add_all(sizes + [category])
+        db.flush()
+        for t in range(titles):
+            title = Title(name=f"{name}-{t}", category_id=category.id)
+            db.add(title)
+            db.flush()
+            for p in range(products):
+                product = Product(name=f"{name}-{t}-{p}", title_id=title.id, is_active=True)
+                db.add(product)
+                db.flush()
+                db.add_all([ProductSize(product_id=product.id, size_id=size.id) for size in sizes])
+        db.commit()
+        return category.id, [s.id for s in sizes]
+
+
+def _counts(size_ids):
+    with DatabaseManager.get_session() as db:
+        return db.scalar(select(func.count(ProductSize.id)).where(ProductSize.size_id.in_(size_ids)))
+
+
+def _version():
+    with DatabaseManager.get_session() as db:
+        return db.get(CatalogVersion, 1).version
+
+
+def _run(delete, entity_id):
+    statements = []
+    version = _version()
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async def scenario():
+        async with DatabaseManager.get_async_session() as db:
+            deleted = await delete(db, entity_id)
+            await db.commit()
+        return deleted
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        deleted = asyncio.run(scenario())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    # правка целиком — одна запись журнала, а не запись на каждую строку
+    assert _version() == version + 1
+    with DatabaseManager.get_session() as db:
+        assert db.scalar(select(func.count()).select_from(CatalogChange).where(CatalogChange.version > version)) == 1
+    return deleted, [s for s in statements if s.startswith(("DELETE", "INSERT")) and "catalog_changes" not in s]
+
+
+def test_delete_category_removes_whole_subtree():
+    category_id, size_ids = _category("cascade-big", titles=5, products=6)
+    other_id, other_sizes = _category("cascade-other", titles=1, products=2)
+
+    deleted, statements = _run(delete_category, category_id)
+    assert deleted == 1
+    assert len(statements) == 4
+    assert _counts(size_ids) == 0
+    with DatabaseManager.get_session() as db:
+        assert db.scalar(select(func.count(Title.id)).where(Title.category_id == category_id)) == 0
+        assert db.scalar(select(func.count(Product.id)).where(Product.name.like("cascade-big-%"))) == 0
+        assert db.get(Category, other_id) is not None
+    assert _counts(other_sizes) == 4
+
+
+def test_delete_title_keeps_other_titles():
+    category_id, size_ids = _category("cascade-title", titles=2, products=3)
+    with DatabaseManager.get_session() as db:
+        first, second = db.scalars(select(Title.id).where(Title.category_id == category_id).order_by(Title.id)).all()
+
+    deleted, statements = _run(delete_title, first)
+    assert deleted == 1
+    assert len(statements) == 3
+    assert _counts(size_ids) == 6
+    assert _run(delete_title, first)[0] == 0
+    with DatabaseManager.get_session() as db:
+        assert db.scalar(select(func.count(Product.id)).where(Product.title_id == second)) == 3
+
+
+def test_link_size_skips_existing_links_in_one_statement():
+    category_id, size_ids = _category("link-size", titles=2, products=5)
+    with DatabaseManager.get_session() as db:
+        size = Size(name="link-size-XL", price=300)
+        db.add(size)
+        db.flush()
+        product_ids = db.scalars(select(Product.id)).all()
+        # одна связь уже есть: повторно она не создаётся и не ломает запрос
+        db.add(ProductSize(product_id=product_ids[0], size_id=size.id))
+        db.commit()
+        size_id = size.id
+
+    linked, statements = _run(link_size_to_all_products, size_id)
+    assert len(statements) == 1
+    assert linked == len(product_ids) - 1
+    assert _counts([size_id]) == len(product_ids)
+
+
+def test_link_all_sizes_to_new_product():
+    category_id, _ = _category("link-product", titles=1, products=1)
+    with DatabaseManager.get_session() as db:
+        product = Product(name="link-product-new", title_id=None, is_active=True)
+        db.add(product)
+        db.commit()
+        product_id = product.id
+        sizes_total = db.scalar(select(func.count(Size.id)))
+
+    linked, statements = _run(link_all_sizes_to_product, product_id)
+    assert len(statements) == 1
+    assert linked == sizes_total
+    assert _run(link_all_sizes_to_product, product_id)[0] == 0
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Тест FSM-хранилища в БД: несколько update_data за обновление — одна запись, состояние переживает перезапуск
+"""
+
+import asyncio
+import random
+import time
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Message, Update
+from fsm_storage import DatabaseStorage
+
+bot = Bot(token="123456:TEST_TOKEN_FSM")
+
+
+class Checkout(StatesGroup):
+    waiting_for_phone = State()
+
+
+def _update(user_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": "Иван Иванов"
+        }
+    })
+
+
+def test_update_data_calls_are_coalesced_and_persisted(counting_sessions):
+    user_id = random.randint(10**12, 10**13)
+    sessions = counting_sessions
+    storage = DatabaseStorage(session_factory=sessions)
+    dp = Dispatcher(storage=storage)
+    storage.setup(dp)
+
+    @dp.message()
+    async def handle_name(message: Message, state: FSMContext):
+        await state.update_data(customer_name=message.text)
+        await state.update_data(step=2)
+        await state.update_data(order_data={"items": [1, 2]})
+        await state.set_state(Checkout.waiting_for_phone)
+
+    async def scenario():
+        await dp.feed_update(bot, _update(user_id))
+        # одно чтение при входе и одна запись после обработчика
+        assert sessions.calls == 2
+
+        restarted = DatabaseStorage()
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        assert await restarted.get_state(key) == Checkout.waiting_for_phone.state
+        assert await restarted.get_data(key) == {
+            "customer_name": "Иван Иванов", "step": 2, "order_data": {"items": [1, 2]}
+        }
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_state_expires():
+    user_id = random.randint(10**12, 10**13)
+    key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+
+    async def scenario():
+        storage = DatabaseStorage(ttl=0.2)
+        await storage.set_state(key, Checkout.waiting_for_phone)
+        await storage.update_data(key, {"customer_phone": "+79990000000"})
+        await storage.close()
+
+        assert await DatabaseStorage(ttl=0.2).get_state(key) == Checkout.waiting_for_phone.state
+        time.sleep(0.3)
+        fresh = DatabaseStorage(ttl=0.2)
+        assert await fresh.get_state(key) is None
+        assert await fresh.get_data(key) == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Тест нечёткого поиска: опечатки и транслит, обновление индекса по одному товару, запасной поиск каталога
+"""
+
+import asyncio
+import random
+from database import DatabaseManager, Category, Title, Product
+from catalog_cache import CatalogCache
+from catalog_search import CatalogSearch
+from fuzzy_index import FuzzyIndex, edit_distance, normalize
+
+
+def _ids(index, query):
+    return [doc_id for doc_id, _ in index.search(query)]
+
+
+def test_normalize_and_edit_distance():
+    assert normalize("Геральт из Ривии") == normalize("geralt iz rivii")
+    assert normalize("Йегер") == normalize("Yeger") == normalize("jeger")
+    assert normalize("Ёжик") == normalize("ежик")
+    assert edit_distance("geralt", "gerlat", 2) == 1
+    assert edit_distance("geralt", "geralt", 2) == 0
+    assert edit_distance("geralt", "rivia", 2) == 3
+
+
+def test_typos_and_translit():
+    index = FuzzyIndex()
+    index.add_many([(1, "Геральт Ведьмак"), (2, "Эрен Йегер Атака титанов"), (3, "Кот")])
+
+    assert _ids(index, "герольт") == [1]
+    assert _ids(index, "geralt") == [1]
+    assert _ids(index, "ведьмк геральд") == [1]
+    assert _ids(index, "eren yeger") == [2]
+    assert _ids(index, "атака ведьмак") == []
+    assert _ids(index, "кит") == [3]
+    assert index.search("эрен")[0][1] > index.search("эрин")[0][1]
+
+
+def test_incremental_updates():
+    index = FuzzyIndex()
+    index.add_many([(1, "Геральт"), (2, "Геральт Цири")])
+    index.add(1, "Йеннифэр")
+    assert _ids(index, "геральт") == [2]
+    assert _ids(index, "йенифер") == [1]
+
+    index.remove(2)
+    assert _ids(index, "геральт") == []
+    assert index._word_docs.keys() == {"iennifer"}
+    assert all(words == {"iennifer"} for words in index._variants.values())
+
+
+def test_catalog_search_falls_back_to_fuzzy_index():
+    suffix = f"x{random.randint(10**6, 10**7)}"
+    with DatabaseManager.get_session() as db:
+        category = Category(name=f"Игры {suffix}")
+        db.add(category)
+        db.flush()
+        title = Title(name=f"Ведьмак {suffix}", category_id=category.id)
+        db.add(title)
+        db.flush()
+        geralt = Product(name=f"Геральт {suffix}", title_id=title.id, is_active=True)
+        db.add(geralt)
+        db.commit()
+        title_id, geralt_id = title.id, geralt.id
+
+    cache = CatalogCache()
+    search = CatalogSearch(cache)
+    assert [p.id for p in asyncio.run(search.search(f"герольт {suffix}"))] == [geralt_id]
+    assert [p.id for p in asyncio.run(search.search(f"wedmak {suffix}"))] == [geralt_id]
+
+    # правки админки догоняются по событиям сброса кэша
+    with DatabaseManager.get_session() as db:
+        db.get(Title, title_id).name = f"Witcher {suffix}"
+        ciri = Product(name=f"Цири {suffix}", title_id=title_id, is_active=True)
+        db.add(ciri)
+        db.commit()
+        ciri_id = ciri.id
+    cache.invalidate_titles()
+    cache.invalidate_title_products(title_id)
+    assert [p.id for p in asyncio.run(search.search(f"tsiri {suffix}"))] == [ciri_id]
+    assert {p.id for p in asyncio.run(search.search(f"vitcher {suffix}"))} == {geralt_id, ciri_id}
+
+    with DatabaseManager.get_session() as db:
+        db.get(Product, geralt_id).is_active = False
+        db.commit()
+    cache.invalidate_product(geralt_id, title_id)
+    assert [p.id for p in asyncio.run(search.search(f"vitcher {suffix}"))] == [ciri_id]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Тест генератора каталога: пачки не теряют строк, связи и позиции заказов указывают на созданные строки, счётчики статистики сходятся
+"""
+
+import asyncio
+from sqlalchemy import func, select
+from database import DatabaseManager, Category, Title, Product, Size, ProductSize, Order, OrderItem
+from generate_catalog import Volumes, generate
+from shop_stats import get_shop_stats
+
+
+def _count(db, model, *where):
+    return db.scalar(select(func.count()).select_from(model).where(*where))
+
+
+def test_generated_rows_are_linked_and_counted():
+    with DatabaseManager.get_session() as db:
+        first_product = (db.scalar(select(func.max(Product.id))) or 0) + 1
+        first_order = (db.scalar(select(func.max(Order.id))) or 0) + 1
+
+    # пачка меньше любого объёма: строки идут несколькими транзакциями
+    created = generate(Volumes(categories=3, titles=7, products=50, sizes=4, orders=30), batch=8, seed=1)
+    assert created == {"categories": 3, "titles": 7, "sizes": 4, "products": 50, "product_sizes": 200, "orders": 30}
+
+    with DatabaseManager.get_session() as db:
+        products = db.execute(select(Product.id, Product.title_id).where(Product.id >= first_product)).all()
+        assert len(products) == 50
+        assert _count(db, Title, Title.id.in_({p.title_id for p in products})) == len({p.title_id for p in products})
+        assert _count(db, ProductSize, ProductSize.product_id >= first_product) == 200
+
+        orders = db.execute(select(Order.id, Order.created_at).where(Order.id >= first_order)).all()
+        assert len(orders) == 30 and all(o.created_at is not None for o in orders)
+        item_orders = set(db.scalars(select(OrderItem.order_id).where(OrderItem.order_id >= first_order)))
+        assert item_orders == {o.id for o in orders}
+
+        counts = tuple(_count(db, model) for model in (Category, Title, Product, Size, Order))
+        revenue = db.scalar(select(func.coalesce(func.sum(Order.total_price), 0)).where(Order.status == "paid"))
+
+    stats = asyncio.run(get_shop_stats())
+    assert (stats.categories, stats.titles, stats.products, stats.sizes, stats.orders) == counts
+    assert abs(stats.revenue - revenue) < 0.01
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Тест кэша клавиатур: повторный показ не пересобирает клавиатуру, правка каталога — пересобирает
+"""
+
+import asyncio
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from catalog_cache import CatalogCache
+from keyboard_cache import KeyboardCache
+from screen_loaders import CategoryScreen
+
+
+def _cached_builder(keyboards):
+    builds = []
+
+    @keyboards.cached
+    async def get_keyboard(entity_id):
+        builds.append(entity_id)
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=f"#{entity_id} v{len(builds)}", callback_data=f"entity_{entity_id}")]
+        ])
+
+    return get_keyboard, builds
+
+
+def test_keyboards_are_reused_until_catalog_changes():
+    cache = CatalogCache()
+    keyboards = KeyboardCache(cache)
+    get_keyboard, builds = _cached_builder(keyboards)
+
+    async def scenario():
+        first = await get_keyboard(1)
+        assert await get_keyboard(1) is first
+        assert await get_keyboard(2) is not first
+        assert builds == [1, 2]
+
+        cache.invalidate_titles()
+        rebuilt = await get_keyboard(1)
+        assert rebuilt is not first
+        assert rebuilt.inline_keyboard[0][0].text == "#1 v3"
+        assert len(keyboards) == 1
+
+    asyncio.run(scenario())
+
+
+def test_keyboard_built_during_catalog_edit_is_not_kept():
+    cache = CatalogCache()
+    keyboards = KeyboardCache(cache)
+
+    async def build():
+        # правка в админке, пока клавиатура собирается
+        cache.invalidate_categories()
+        return InlineKeyboardMarkup(inline_keyboard=[])
+
+    async def scenario():
+        await keyboards.get(("screen",), build)
+        assert len(keyboards) == 0
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_keyboard_is_evicted():
+    keyboards = KeyboardCache(CatalogCache(), max_size=2)
+    get_keyboard, builds = _cached_builder(keyboards)
+
+    async def scenario():
+        await get_keyboard(1)
+        await get_keyboard(2)
+        await get_keyboard(1)
+        await get_keyboard(3)
+        await get_keyboard(1)
+        await get_keyboard(2)
+        assert builds == [1, 2, 3, 2]
+
+    asyncio.run(scenario())
+
+
+def test_keyboard_from_loaded_screen_is_keyed_by_entity():
+    keyboards = KeyboardCache(CatalogCache())
+    builds = []
+
+    @keyboards.cached(key=lambda screen: screen[0])
+    async def get_keyboard(screen):
+        builds.append(screen)
+        return InlineKeyboardMarkup(inline_keyboard=[])
+
+    async def scenario():
+        first = await get_keyboard((1, ["a"]))
+        assert await get_keyboard((1, ["a"])) is first
+        await get_keyboard((2, ["b"]))
+        assert builds == [(1, ["a"]), (2, ["b"])]
+
+    asyncio.run(scenario())
+
+
+def test_keyboard_from_stale_screen_is_not_kept():
+    cache = CatalogCache()
+    keyboards = KeyboardCache(cache)
+    builds = []
+
+    @keyboards.cached(key=lambda screen: screen.category_id)
+    async def get_keyboard(screen):
+        builds.append(screen.generation)
+        return InlineKeyboardMarkup(inline_keyboard=[])
+
+    async def scenario():
+        stale = CategoryScreen(1, None, [], cache.generation)
+        # правка в админке между загрузкой экрана и сборкой клавиатуры
+        cache.invalidate_titles()
+        await get_keyboard(stale)
+        assert len(keyboards) == 0
+
+        fresh = CategoryScreen(1, None, [], cache.generation)
+        kept = await get_keyboard(fresh)
+        assert await get_keyboard(fresh) is kept
+        assert builds == [stale.generation, fresh.generation]
+
+    asyncio.run(scenario())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Тест миграций: существующая база без индексов получает их без пересоздания, счётчики статистики следуют за записью
+"""
+
+import os
+import tempfile
+from sqlalchemy import create_engine, inspect, text
+import migrations
+from migrations import MIGRATIONS, run_migrations
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE categories (id INTEGER PRIMARY KEY, name VARCHAR)",
+    "CREATE TABLE titles (id INTEGER PRIMARY KEY, name VARCHAR, category_id INTEGER)",
+    "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR, photo_url VARCHAR, title_id INTEGER, is_active BOOLEAN)",
+    "CREATE TABLE sizes (id INTEGER PRIMARY KEY, name VARCHAR, price FLOAT)",
+    "CREATE TABLE product_sizes (id INTEGER PRIMARY KEY, product_id INTEGER, size_id INTEGER)",
+    "CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, items JSON, delivery_method VARCHAR, "
+    "total_price FLOAT, status VARCHAR, payment_url VARCHAR, payment_id VARCHAR, created_at DATETIME, updated_at DATETIME)",
+]
+
+
+def _legacy_engine():
+    path = os.path.join(tempfile.mkdtemp(), "legacy.db")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for ddl in LEGACY_SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO products (id, name, is_active) VALUES (1, 'linked', 1), (2, 'legacy', 1)"))
+        conn.execute(text("INSERT INTO sizes (id, name, price) VALUES (1, 'S', 100), (2, 'M', 200)"))
+        conn.execute(text("INSERT INTO product_sizes (product_id, size_id) VALUES (1, 1), (1, 1), (1, 2), (1, 1)"))
+        conn.execute(text(
+            "INSERT INTO orders (delivery_method, total_price, status, created_at, items) VALUES "
+            "('cdek', 1000, 'paid', '2024-05-01 10:00:00', :two_items), ('cdek', 500, 'pending', '2024-05-01 11:00:00', NULL), "
+            "('post', 700, 'paid', '2024-05-02 09:00:00', :one_item)"
+        ), {
+            "two_items": '[{"product_id": 1, "size_id": 1, "product_name": "linked", "size_name": "S", "price": 500}, '
+                         '{"product_id": 1, "size_id": 1, "product_name": "linked", "size_name": "S", "price": 500}]',
+            "one_item": '[{"product_id": 2, "size_id": 2, "product_name": "legacy", "size_name": "M", "price": 700, '
+                        '"customer_name": "Иван"}]',
+        })
+    return engine
+
+
+def test_migrations_dedupe_and_index_existing_database():
+    engine = _legacy_engine()
+    run_migrations(engine)
+
+    with engine.connect() as conn:
+        pairs = conn.execute(text("SELECT product_id, size_id FROM product_sizes ORDER BY id")).all()
+        versions = conn.execute(text("SELECT version FROM schema_migrations")).scalars().all()
+    # у товара 2 не было связей — миграция привязала к нему все размеры
+    assert [tuple(p) for p in pairs] == [(1, 1), (1, 2), (2, 1), (2, 2)]
+    assert versions == [m[0] for m in MIGRATIONS]
+
+    indexes = {ix["name"]: ix for ix in inspect(engine).get_indexes("product_sizes")}
+    assert indexes["uq_product_sizes_product_size"]["unique"]
+    assert "ix_products_title_active_id" in {ix["name"] for ix in inspect(engine).get_indexes("products")}
+    assert {"ix_orders_status_id", "ix_orders_payment_id", "ix_orders_idempotency_key"} <= {
+        ix["name"] for ix in inspect(engine).get_indexes("orders")
+    }
+    assert "idempotency_key" in {column["name"] for column in inspect(engine).get_columns("orders")}
+    with engine.connect() as conn:
+        found = conn.execute(text("SELECT rowid FROM product_search WHERE product_search MATCH 'legac*'")).scalars().all()
+    assert found == [2]
+
+
+def test_migrations_are_applied_once():
+    engine = _legacy_engine()
+    run_migrations(engine)
+    run_migrations(engine)
+    with engine.connect() as conn:
+        count = conn.execute(text("SELECT COUNT(*) FROM schema_migrations")).scalar()
+    assert count == len(MIGRATIONS)
+
+
+def test_shop_stats_follow_writes():
+    engine = _legacy_engine()
+    run_migrations(engine)
+
+    def stats():
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT products, sizes, orders, revenue FROM shop_stats WHERE id = 1")).one()
+            sales = conn.execute(text(
+                "SELECT day, delivery_method, orders, paid_orders, revenue FROM daily_sales ORDER BY day, delivery_method"
+            )).all()
+        return tuple(row), [tuple(r) for r in sales]
+
+    # начальные значения посчитаны по существующим данным
+    assert stats() == ((2, 2, 3, 1700.0), [("2024-05-01", "cdek", 2, 1, 1000.0), ("2024-05-02", "post", 1, 1, 700.0)])
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE orders SET status = 'paid' WHERE total_price = 500"))
+        conn.execute(text("DELETE FROM orders WHERE delivery_method = 'post'"))
+        conn.execute(text("DELETE FROM products WHERE id = 2"))
+    assert stats() == ((1, 2, 2, 1500.0), [("2024-05-01", "cdek", 2, 2, 1500.0), ("2024-05-02", "post", 0, 0, 0.0)])
+
+
+def test_order_items_backfilled_in_chunks(monkeypatch):
+    monkeypatch.setattr(migrations, "ORDER_ITEMS_BACKFILL_CHUNK", 1)
+    engine = _legacy_engine()
+    run_migrations(engine)
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT order_id, product_id, size_id, product_name, size_name, unit_price, quantity FROM order_items ORDER BY order_id"
+        )).all()
+    assert [tuple(r) for r in rows] == [(1, 1, 1, "linked", "S", 500.0, 2), (3, 2, 2, "legacy", "M", 700.0, 1)]
+
+
+def test_catalog_version_follows_catalog_writes(monkeypatch):
+    monkeypatch.setattr(migrations, "CATALOG_CHANGES_KEEP", 3)
+    engine = _legacy_engine()
+    run_migrations(engine)
+
+    def log():
+        with engine.connect() as conn:
+            version = conn.execute(text("SELECT version FROM catalog_version WHERE id = 1")).scalar()
+            changes = conn.execute(text("SELECT version, kind, key, title_id FROM catalog_changes ORDER BY version")).all()
+        return version, [tuple(c) for c in changes]
+
+    assert log() == (0, [])
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO products (id, name, title_id, is_active) VALUES (3, 'new', 7, 1)"))
+        conn.execute(text("UPDATE sizes SET price = 150 WHERE id = 1"))
+    assert log() == (2, [(1, "product", 3, 7), (2, "size", 1, None)])
+
+    # версия поднимается в транзакции правки и откатывается вместе с ней
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM product_sizes WHERE product_id = 1"))
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert log()[0] == 2
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE categories SET name = 'x'"))
+        conn.execute(text("INSERT INTO categories (id, name) VALUES (5, 'c')"))
+        conn.execute(text("INSERT INTO titles (id, name, category_id) VALUES (6, 't', 5)"))
+        conn.execute(text("DELETE FROM product_sizes WHERE product_id = 2 AND size_id = 2"))
+    # журнал хранит только последние CATALOG_CHANGES_KEEP правок
+    assert log() == (5, [(3, "category", 5, None), (4, "title", 6, None), (5, "product_sizes", 2, None)])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тест списка заказов в админке: пагинация по ключу без пропусков и дублей, фильтры, запросы идут по индексам
+"""
+
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from database import DatabaseManager, Order, async_engine, engine
+from order_service import OrderFilter, list_orders
+
+
+def _orders(user_id, count=23):
+    """Заказы покупателя: по одному в день, статусы по кругу, часть с одинаковым временем"""
+    start = datetime(2024, 5, 1, 12, 0)
+    statuses = ["pending", "paid", "expired"]
+    with DatabaseManager.get_session() as db:
+        orders = [
+            Order(user_id=user_id, items=[], total_price=100.0, status=statuses[i % 3],
+                  created_at=start + timedelta(days=i // 2))
+            for i in range(count)
+        ]
+        db.add_all(orders)
+        db.commit()
+        return [(o.id, o.status, o.created_at) for o in orders]
+
+
+def _all_pages(filters, limit=5):
+    async def scenario():
+        pages, after = [], None
+        while True:
+            orders, after = await list_orders(filters, after, limit)
+            pages.append([o.id for o in orders])
+            if after is None:
+                return pages
+    return asyncio.run(scenario())
+
+
+def test_keyset_pages_cover_all_orders_newest_first():
+    user_id = random.randint(10**9, 2 * 10**9)
+    created = _orders(user_id)
+    expected = [order_id for order_id, _, _ in sorted(created, key=lambda o: (o[2], o[0]), reverse=True)]
+
+    pages = _all_pages(OrderFilter(user_id=user_id))
+    assert [order_id for page in pages for order_id in page] == expected
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+
+
+def test_filters_by_status_and_period():
+    user_id = random.randint(10**9, 2 * 10**9)
+    created = _orders(user_id)
+    filters = OrderFilter(status="paid", date_from=date(2024, 5, 3), date_to=date(2024, 5, 8), user_id=user_id)
+    expected = sorted(
+        (order_id for order_id, status, created_at in created
+         if status == "paid" and date(2024, 5, 3) <= created_at.date() <= date(2024, 5, 8)),
+        reverse=True
+    )
+    assert [order_id for page in _all_pages(filters, limit=2) for order_id in page] == expected
+
+
+def test_pages_are_read_through_indexes():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, *args):
+        if statement.startswith("SELECT") and "FROM orders" in statement:
+            statements.append((statement, parameters))
+
+    async def scenario():
+        cursor = (datetime(2024, 5, 5), 10**9)
+        await list_orders(OrderFilter(), cursor)
+        await list_orders(OrderFilter(status="paid"), cursor)
+        await list_orders(OrderFilter(user_id=42), cursor)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        asyncio.run(scenario())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters)).all()
+            plans.append(" ".join(row[-1] for row in rows))
+    assert "ix_orders_created_at" in plans[0]
+    assert "ix_orders_status_created" in plans[1]
+    assert "ix_orders_user_created" in plans[2]
+    assert not any("TEMP B-TREE" in plan for plan in plans)
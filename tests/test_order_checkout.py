@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Тест оформления заказа: повторные и одновременные нажатия «Оплатить» не создают дублей заказов и платежей
+"""
+
+import asyncio
+import random
+from aiohttp.test_utils import TestServer
+from sqlalchemy import func, select
+from database import DatabaseManager, Order, OrderItem
+from fake_yookassa import FakeYooKassa
+from payment_gateway import YooKassaGateway, PaymentGatewayError
+from order_service import checkout_order
+
+
+def _draft(address="Москва"):
+    return {
+        "order_data": {"items": [{"product_id": 1, "size_id": 1, "product_name": "Ночник", "size_name": "S", "price": 1000}]},
+        "final_price": 1100.0,
+        "discount_amount": 100.0,
+        "delivery_method": "cdek",
+        "delivery_price": 200.0,
+        "customer_name": "Иван Иванов",
+        "customer_phone": "+79990000000",
+        "customer_address": address,
+    }
+
+
+def _order_count(user_id):
+    with DatabaseManager.get_session() as db:
+        return db.scalar(select(func.count(Order.id)).where(Order.user_id == user_id))
+
+
+def test_repeated_checkout_returns_same_order_and_payment():
+    user_id = random.randint(10**9, 2 * 10**9)
+    fake = FakeYooKassa()
+
+    async def scenario():
+        async with TestServer(fake.create_app()) as server:
+            gateway = YooKassaGateway("123456", "test_secret", str(server.make_url("/v3")), max_retries=0)
+            first, second = await asyncio.gather(
+                checkout_order(user_id, "ivan", _draft(), "https://t.me/test_bot", gateway),
+                checkout_order(user_id, "ivan", _draft(), "https://t.me/test_bot", gateway),
+            )
+            third = await checkout_order(user_id, "ivan", _draft(), "https://t.me/test_bot", gateway)
+            other = await checkout_order(user_id, "ivan", _draft("Казань"), "https://t.me/test_bot", gateway)
+            await gateway.close()
+            return first, second, third, other
+
+    first, second, third, other = asyncio.run(scenario())
+    assert first == second
+    assert third == first._replace(created=False)
+    assert first.created and other.created
+    assert other.order_id != first.order_id
+    assert _order_count(user_id) == 2
+    assert len(fake.payments) == 2
+
+
+def test_checkout_retries_payment_for_existing_order():
+    user_id = random.randint(10**9, 2 * 10**9)
+    fake = FakeYooKassa()
+
+    async def scenario():
+        async with TestServer(fake.create_app()) as server:
+            gateway = YooKassaGateway("123456", "test_secret", str(server.make_url("/v3")), max_retries=0)
+            fake.fail_next = 1
+            try:
+                await checkout_order(user_id, "ivan", _draft(), "https://t.me/test_bot", gateway)
+            except PaymentGatewayError:
+                pass
+            else:
+                raise AssertionError("ожидалась ошибка Юкассы")
+            result = await checkout_order(user_id, "ivan", _draft(), "https://t.me/test_bot", gateway)
+            await gateway.close()
+            return result
+
+    result = asyncio.run(scenario())
+    assert not result.created
+    assert _order_count(user_id) == 1
+    assert list(fake.payments) == [result.payment_id]
+
+
+def test_checkout_writes_order_items():
+    user_id = random.randint(10**9, 2 * 10**9)
+    fake = FakeYooKassa()
+    draft = _draft()
+    s_item = draft["order_data"]["items"][0]
+    m_item = dict(s_item, size_id=2, size_name="M", price=1500)
+    draft["order_data"]["items"] = [s_item, m_item, dict(s_item)]
+
+    async def scenario():
+        async with TestServer(fake.create_app()) as server:
+            gateway = YooKassaGateway("123456", "test_secret", str(server.make_url("/v3")), max_retries=0)
+            result = await checkout_order(user_id, "ivan", draft, "https://t.me/test_bot", gateway)
+            await checkout_order(user_id, "ivan", draft, "https://t.me/test_bot", gateway)
+            await gateway.close()
+            return result
+
+    result = asyncio.run(scenario())
+    with DatabaseManager.get_session() as db:
+        rows = db.execute(
+            select(OrderItem.size_id, OrderItem.size_name, OrderItem.unit_price, OrderItem.quantity)
+            .where(OrderItem.order_id == result.order_id)
+            .order_by(OrderItem.size_id)
+        ).all()
+    assert [tuple(r) for r in rows] == [(1, "S", 1000.0, 2), (2, "M", 1500.0, 1)]
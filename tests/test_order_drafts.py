@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Тест передачи заказа из бота каталога: черновик по токену, чужой токен, большая корзина
+"""
+
+import asyncio
+import random
+from order_drafts import create_draft, load_draft, items_preview, ITEMS_PREVIEW_LIMIT
+
+
+def _items(n):
+    return [
+        {'product_id': i, 'size_id': 1, 'product_name': f"Ночник {i}", 'size_name': "Стандарт 25см", 'price': 2490.0}
+        for i in range(n)
+    ]
+
+
+def test_draft_is_loaded_by_owner_only():
+    user_id = random.randint(10**12, 10**13)
+
+    async def scenario():
+        token = await create_draft(user_id, "buyer", _items(2))
+        assert len(f"order_{token}") <= 64  # ограничение Telegram на параметр /start
+        draft = await load_draft(token, user_id)
+        assert draft.username == "buyer"
+        assert [i['product_id'] for i in draft.items] == [0, 1]
+        assert await load_draft(token, user_id + 1) is None
+        assert await load_draft("missing", user_id) is None
+
+    asyncio.run(scenario())
+
+
+def test_large_cart_fits_into_messages():
+    user_id = random.randint(10**12, 10**13)
+    items = _items(500)
+
+    async def scenario():
+        token = await create_draft(user_id, "", items)
+        assert len((await load_draft(token, user_id)).items) == 500
+
+    asyncio.run(scenario())
+    preview = items_preview(items)
+    assert len(preview) < 4096
+    assert preview.count("\n") == ITEMS_PREVIEW_LIMIT + 1
+    assert preview.endswith(f"и ещё {500 - ITEMS_PREVIEW_LIMIT} шт.\n")
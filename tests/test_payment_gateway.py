@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Тест клиента Юкассы на фейковом сервере: идемпотентность по заказу, повторы при сбоях
+"""
+
+import asyncio
+import pytest
+from aiohttp.test_utils import TestServer
+from fake_yookassa import FakeYooKassa
+import payment_gateway
+from payment_gateway import YooKassaGateway, PaymentGatewayError
+
+
+async def _run(fake: FakeYooKassa, scenario, max_retries=2):
+    async with TestServer(fake.create_app()) as server:
+        gateway = YooKassaGateway("123456", "test_secret", str(server.make_url("/v3")), timeout=5,
+                                  max_retries=max_retries)
+        try:
+            return await scenario(gateway)
+        finally:
+            await gateway.close()
+
+
+def test_create_and_check_payment():
+    fake = FakeYooKassa()
+
+    async def scenario(gateway):
+        payment = await gateway.create_payment(42, 2490.0, "Заказ #42", "https://t.me/test_bot")
+        assert payment.status == "pending"
+        assert payment.confirmation_url.endswith(f"/pay/{payment.id}")
+        assert payment.metadata == {"order_id": "42"}
+        # повтор создания для того же заказа возвращает тот же платёж
+        again = await gateway.create_payment(42, 2490.0, "Заказ #42", "https://t.me/test_bot")
+        assert again.id == payment.id
+        fake.succeed(payment.id)
+        assert (await gateway.get_payment(payment.id)).status == "succeeded"
+
+    asyncio.run(_run(fake, scenario))
+    assert len(fake.payments) == 1
+    assert fake.payments[next(iter(fake.payments))]["amount"] == {"value": "2490.00", "currency": "RUB"}
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    monkeypatch.setattr(payment_gateway, "RETRY_BACKOFF", 0.01)
+    fake = FakeYooKassa()
+    fake.fail_next = 2
+
+    async def scenario(gateway):
+        return await gateway.create_payment(7, 100.0, "Заказ #7", "https://t.me/test_bot")
+
+    payment = asyncio.run(_run(fake, scenario, max_retries=2))
+    assert payment.id in fake.payments
+    assert fake.requests.count(("POST", "/v3/payments")) == 3
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(payment_gateway, "RETRY_BACKOFF", 0.01)
+    fake = FakeYooKassa()
+    fake.fail_next = 10
+
+    async def scenario(gateway):
+        with pytest.raises(PaymentGatewayError):
+            await gateway.get_payment("missing")
+
+    asyncio.run(_run(fake, scenario, max_retries=1))
+    assert len(fake.requests) == 2
+
+
+def test_client_errors_are_not_retried():
+    fake = FakeYooKassa()
+
+    async def scenario(gateway):
+        with pytest.raises(PaymentGatewayError):
+            await gateway.get_payment("missing")
+
+    asyncio.run(_run(fake, scenario))
+    assert len(fake.requests) == 1
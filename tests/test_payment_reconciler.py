@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Тест сверки платежей: оплаченные и отменённые заказы переводятся пачками, покупатель получает сообщение,
+заказ с недоступным платежом не истекает, заказ без платежа истекает по сроку
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+from aiohttp.test_utils import TestServer
+from database import DatabaseManager, Order
+from fake_yookassa import FakeYooKassa
+from payment_gateway import YooKassaGateway
+from payment_reconciler import PaymentReconciler
+
+
+def _orders(user_id, payment_ids, created_at=None):
+    with DatabaseManager.get_session() as db:
+        orders = [
+            Order(user_id=user_id, items=[], total_price=100.0, status="pending", payment_id=payment_id,
+                  created_at=created_at or datetime.utcnow())
+            for payment_id in payment_ids
+        ]
+        db.add_all(orders)
+        db.commit()
+        return [o.id for o in orders]
+
+
+def _statuses(order_ids):
+    with DatabaseManager.get_session() as db:
+        return [db.get(Order, order_id).status for order_id in order_ids]
+
+
+def test_reconciler_marks_orders_in_batches_and_notifies(recording_bot):
+    user_id = random.randint(10**9, 2 * 10**9)
+    fake = FakeYooKassa()
+    bot = recording_bot
+
+    async def scenario():
+        async with TestServer(fake.create_app()) as server:
+            gateway = YooKassaGateway("123456", "test_secret", str(server.make_url("/v3")))
+            payments = [await gateway.create_payment(10**9 + i, 100.0, "Заказ", "https://t.me/test_bot") for i in range(5)]
+            fake.succeed(payments[0].id)
+            fake.succeed(payments[3].id)
+            fake.payments[payments[1].id]["status"] = "canceled"
+            order_ids = _orders(user_id, [p.id for p in payments])
+            # платежа нет в Юкассе (404) — зависший заказ истекает
+            stale_id = _orders(user_id, ["stale-payment"], created_at=datetime.utcnow() - timedelta(days=2))[0]
+
+            reconciler = PaymentReconciler(gateway, batch_size=2, concurrency=2, pending_ttl=24 * 3600)
+            reconciler._bot = bot
+            first = await reconciler.run_once()
+            second = await reconciler.run_once()
+            await gateway.close()
+            return order_ids, stale_id, first, second
+
+    order_ids, stale_id, first, second = asyncio.run(scenario())
+    assert _statuses(order_ids) == ["paid", "expired", "pending", "paid", "pending"]
+    assert _statuses([stale_id]) == ["expired"]
+    # в общей тестовой БД могут быть чужие заказы, поэтому считаем не меньше своих
+    assert first["paid"] >= 2 and first["expired"] >= 2
+    assert second["paid"] == 0
+    assert [chat_id for chat_id, _ in bot.sent] == [user_id, user_id]
+    assert f"Номер заказа: {order_ids[0]}" in bot.sent[0][1]
+
+
+def test_unreachable_payment_is_not_expired():
+    fake = FakeYooKassa()
+
+    async def scenario():
+        async with TestServer(fake.create_app()) as server:
+            gateway = YooKassaGateway("123456", "test_secret", str(server.make_url("/v3")), max_retries=0)
+            payment = await gateway.create_payment(2 * 10**9, 100.0, "Заказ", "https://t.me/test_bot")
+            order_id = _orders(random.randint(10**9, 2 * 10**9), [payment.id],
+                               created_at=datetime.utcnow() - timedelta(days=2))[0]
+            fake.fail_next = 10**6  # Юкасса отвечает 503
+            await PaymentReconciler(gateway, pending_ttl=24 * 3600).run_once()
+            assert _statuses([order_id]) == ["pending"]
+
+            # оплата дошла позже — заказ всё ещё можно перевести в paid
+            fake.fail_next = 0
+            fake.succeed(payment.id)
+            await PaymentReconciler(gateway, pending_ttl=24 * 3600).run_once()
+            await gateway.close()
+            return order_id
+
+    assert _statuses([asyncio.run(scenario())]) == ["paid"]
+
+
+def test_order_without_payment_expires_after_ttl():
+    user_id = random.randint(10**9, 2 * 10**9)
+    # Юкасса не ответила при оформлении — платежа нет, и сверка его не запрашивает
+    stale_id, fresh_id = _orders(user_id, [None]) + _orders(user_id, [None])
+    with DatabaseManager.get_session() as db:
+        db.get(Order, stale_id).created_at = datetime.utcnow() - timedelta(days=2)
+        db.commit()
+
+    async def scenario():
+        async with TestServer(FakeYooKassa().create_app()) as server:
+            gateway = YooKassaGateway("123456", "test_secret", str(server.make_url("/v3")), max_retries=0)
+            result = await PaymentReconciler(gateway, pending_ttl=24 * 3600).run_once()
+            await gateway.close()
+            return result
+
+    result = asyncio.run(scenario())
+    assert result["expired"] >= 1
+    assert _statuses([stale_id, fresh_id]) == ["expired", "pending"]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Тест приёма уведомлений Юкассы: заказ находится по payment_id, повтор уведомления ничего не меняет,
+поддельные адреса и уведомления не меняют статус
+"""
+
+import asyncio
+import random
+import uuid
+from aiohttp.test_utils import TestClient, TestServer
+from database import DatabaseManager, Order
+from fake_yookassa import FakeYooKassa
+from payment_gateway import YooKassaGateway
+from payment_webhook import create_payment_webhook_app
+
+LOCAL = ["127.0.0.0/8", "::1"]
+
+
+def _pending_order(fake: FakeYooKassa, user_id: int, amount: str = "100.00") -> tuple[int, str]:
+    payment_id = str(uuid.uuid4())
+    with DatabaseManager.get_session() as db:
+        order = Order(user_id=user_id, items=[], total_price=100.0, status="pending", payment_id=payment_id)
+        db.add(order)
+        db.commit()
+        order_id = order.id
+    fake.payments[payment_id] = {"id": payment_id, "status": "pending", "paid": False,
+                                 "amount": {"value": amount, "currency": "RUB"}, "metadata": {"order_id": str(order_id)}}
+    return order_id, payment_id
+
+
+async def _with_webhook(fake: FakeYooKassa, bot, check, **options):
+    """Поднимает фейковую Юкассу и приёмник уведомлений, который проверяет платежи в ней"""
+    async with TestServer(fake.create_app()) as yookassa:
+        gateway = YooKassaGateway("123456", "test_secret", str(yookassa.make_url("/v3")), max_retries=0)
+        app = create_payment_webhook_app(bot, gateway=gateway, **options)
+        async with TestClient(TestServer(app)) as client:
+            result = await check(client)
+        await gateway.close()
+    return result
+
+
+def _status(order_id: int) -> str:
+    with DatabaseManager.get_session() as db:
+        return db.get(Order, order_id).status
+
+
+def test_notifications_update_orders_once(recording_bot):
+    user_id = random.randint(10**9, 2 * 10**9)
+    fake = FakeYooKassa()
+    bot = recording_bot
+    paid_id, paid_payment = _pending_order(fake, user_id)
+    canceled_id, canceled_payment = _pending_order(fake, user_id)
+
+    async def check(client):
+        assert await fake.notify(client, "/webhook/yookassa", "payment.succeeded", paid_payment) == 200
+        assert await fake.notify(client, "/webhook/yookassa", "payment.succeeded", paid_payment) == 200
+        assert await fake.notify(client, "/webhook/yookassa", "payment.canceled", canceled_payment) == 200
+        unknown = await client.post("/webhook/yookassa", json={"event": "payment.succeeded", "object": {"id": "nope"}})
+        assert unknown.status == 200
+        malformed = await client.post("/webhook/yookassa", data=b"not json")
+        assert malformed.status == 400
+
+    asyncio.run(_with_webhook(fake, bot, check, allowed_ips=LOCAL))
+    assert _status(paid_id) == "paid"
+    assert _status(canceled_id) == "expired"
+    assert bot.sent == [(user_id, bot.sent[0][1])]
+    assert f"Номер заказа: {paid_id}" in bot.sent[0][1]
+
+
+def test_notifications_from_unknown_addresses_are_rejected(recording_bot):
+    fake = FakeYooKassa()
+    order_id, payment_id = _pending_order(fake, random.randint(10**9, 2 * 10**9))
+
+    async def check(client):
+        return await fake.notify(client, "/webhook/yookassa", "payment.succeeded", payment_id)
+
+    # только адреса Юкассы
+    assert asyncio.run(_with_webhook(fake, recording_bot, check)) == 403
+    assert _status(order_id) == "pending"
+
+
+def test_spoofed_forwarded_for_is_rejected(recording_bot):
+    fake = FakeYooKassa()
+    order_id, payment_id = _pending_order(fake, random.randint(10**9, 2 * 10**9))
+    body = {"event": "payment.succeeded", "object": {"id": payment_id}}
+
+    async def check(client):
+        fake.succeed(payment_id)
+        statuses = []
+        for forwarded_for in ("185.71.76.1, 6.6.6.6", "185.71.76.1"):
+            response = await client.post("/webhook/yookassa", json=body, headers={"X-Forwarded-For": forwarded_for})
+            statuses.append(response.status)
+        return statuses
+
+    # без доверенного прокси заголовок не учитывается вовсе
+    assert asyncio.run(_with_webhook(fake, recording_bot, check)) == [403, 403]
+    # за доверенным прокси берётся только адрес, который дописал он сам (правый)
+    assert asyncio.run(_with_webhook(fake, recording_bot, check, trusted_proxies=LOCAL)) == [403, 200]
+    assert _status(order_id) == "paid"
+
+
+def test_notification_is_checked_against_payment_in_yookassa(recording_bot):
+    user_id = random.randint(10**9, 2 * 10**9)
+    fake = FakeYooKassa()
+    bot = recording_bot
+    unpaid_id, unpaid_payment = _pending_order(fake, user_id)
+    cheap_id, cheap_payment = _pending_order(fake, user_id, amount="1.00")
+
+    async def check(client):
+        # платёж в Юкассе не оплачен — поддельное payment.succeeded ничего не меняет
+        forged = {"event": "payment.succeeded", "object": {"id": unpaid_payment, "status": "succeeded", "paid": True}}
+        assert (await client.post("/webhook/yookassa", json=forged)).status == 200
+        # оплачен, но на другую сумму
+        assert await fake.notify(client, "/webhook/yookassa", "payment.succeeded", cheap_payment) == 200
+
+    asyncio.run(_with_webhook(fake, bot, check, allowed_ips=LOCAL))
+    assert _status(unpaid_id) == "pending"
+    assert _status(cheap_id) == "pending"
+    assert bot.sent == []
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Тест ограничителя исходящих запросов: темп по чату и повтор после flood control
+"""
+
+import asyncio
+import time
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, AnswerCallbackQuery
+from rate_limiter import RateLimiter, RateLimitMiddleware
+
+bot = Bot(token="123456:TEST_TOKEN_LIMITER")
+
+
+def test_chat_messages_are_paced_after_burst():
+    limiter = RateLimiter(chat_rate=20, chat_burst=2, global_rate=1000)
+    middleware = RateLimitMiddleware(limiter)
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(time.monotonic())
+        return True
+
+    async def scenario():
+        started = time.monotonic()
+        await asyncio.gather(*(middleware(make_request, bot, SendMessage(chat_id=1, text="x")) for _ in range(6)))
+        return started
+
+    started = asyncio.run(scenario())
+    # 2 сообщения всплеском, ещё 4 — по 1/20 с
+    assert len(sent) == 6
+    assert sent[-1] - started >= 4 / 20 * 0.9
+    assert limiter.queue_depth() == 0
+    assert limiter.max_queue_depth >= 4
+
+
+def test_other_chats_and_methods_are_not_blocked():
+    limiter = RateLimiter(chat_rate=1, chat_burst=1, global_rate=1000)
+    middleware = RateLimitMiddleware(limiter)
+
+    async def make_request(bot, method):
+        return True
+
+    async def scenario():
+        started = time.monotonic()
+        await asyncio.gather(*(middleware(make_request, bot, SendMessage(chat_id=chat, text="x")) for chat in range(20)))
+        await middleware(make_request, bot, AnswerCallbackQuery(callback_query_id="1"))
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 0.5
+
+
+def test_retry_after_is_honoured():
+    limiter = RateLimiter(chat_rate=100, chat_burst=5, global_rate=1000, max_retries=2)
+    middleware = RateLimitMiddleware(limiter)
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0.2)
+        return True
+
+    assert asyncio.run(middleware(make_request, bot, SendMessage(chat_id=7, text="x"))) is True
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.18
+    assert limiter.metrics()["retry_after_count"] == 1
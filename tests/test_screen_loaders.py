@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Тест загрузчиков экранов: холодный экран — одна сессия БД, тёплый — ни одной
+"""
+
+import asyncio
+import catalog_cache as catalog_cache_module
+import screen_loaders
+from catalog_cache import CatalogCache
+
+
+def test_each_screen_is_one_session_cold_and_none_warm(monkeypatch, seed_catalog, counting_sessions):
+    category_id, title_id, product_ids, size_id = seed_catalog(products=5)
+    sessions = counting_sessions
+    monkeypatch.setattr(screen_loaders, "catalog_cache", CatalogCache(session_factory=sessions))
+
+    async def scenario():
+        screen = await screen_loaders.load_category_screen(category_id)
+        assert screen.category.id == category_id
+        assert [t.id for t in screen.titles] == [title_id]
+        assert sessions.calls == 1
+
+        screen = await screen_loaders.load_title_screen(title_id, 2)
+        assert [p.id for p in screen.products] == sorted(product_ids, reverse=True)[:2]
+        assert screen.title.id == title_id and screen.total == 5
+        assert sessions.calls == 2
+
+        screen = await screen_loaders.load_product_screen(product_ids[0])
+        assert screen.product.id == product_ids[0]
+        assert [s.id for s in screen.sizes] == [size_id]
+        # и ещё одна — фоновое построение матрицы размеров
+        await screen_loaders.catalog_cache.wait_size_matrix()
+        assert sessions.calls == 4
+
+        await screen_loaders.load_category_screen(category_id)
+        await screen_loaders.load_title_screen(title_id)
+        await screen_loaders.load_product_screen(product_ids[1])
+        assert sessions.calls == 4
+
+    asyncio.run(scenario())
+
+
+def test_batch_session_is_not_shared_between_caches(counting_sessions):
+    sessions = counting_sessions
+    cache, other = CatalogCache(session_factory=sessions), CatalogCache(session_factory=sessions)
+
+    async def scenario():
+        async with cache.batch():
+            await cache.categories()
+            await cache.sizes()
+            await other.categories()
+        assert sessions.calls == 2
+        assert catalog_cache_module._batch_session.get() is None
+
+    asyncio.run(scenario())
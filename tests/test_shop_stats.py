@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Тест статистики админки: счётчики и сводки совпадают с подсчётом по таблицам после записи любым путём
+"""
+
+import asyncio
+import random
+from sqlalchemy import func, select
+from database import DatabaseManager, Category, Title, Product, Size, Order
+from catalog_service import delete_category
+from order_service import mark_pending_orders
+from shop_stats import get_shop_stats, revenue_by_delivery_method
+
+
+def _live_counts():
+    with DatabaseManager.get_session() as db:
+        counts = tuple(db.scalar(select(func.count()).select_from(model)) for model in (Category, Title, Product, Size, Order))
+        revenue = db.scalar(select(func.coalesce(func.sum(Order.total_price), 0)).where(Order.status == "paid"))
+        by_method = dict(db.execute(
+            select(func.coalesce(Order.delivery_method, ""), func.sum(Order.total_price))
+            .where(Order.status == "paid")
+            .group_by(Order.delivery_method)
+        ).all())
+    return counts, revenue, by_method
+
+
+def _stats():
+    async def scenario():
+        stats = await get_shop_stats()
+        methods = await revenue_by_delivery_method()
+        return stats, methods
+
+    stats, methods = asyncio.run(scenario())
+    counts = (stats.categories, stats.titles, stats.products, stats.sizes, stats.orders)
+    return counts, stats.revenue, {row.key: row.revenue for row in methods if row.paid_orders}
+
+
+def test_counters_match_tables_after_catalog_and_order_writes():
+    user_id = random.randint(10**9, 2 * 10**9)
+    with DatabaseManager.get_session() as db:
+        category = Category(name=f"stats-{user_id}")
+        db.add(category)
+        db.flush()
+        title = Title(name="stats", category_id=category.id)
+        db.add(title)
+        db.flush()
+        db.add_all([Product(name=f"stats-{i}", title_id=title.id, is_active=True) for i in range(3)])
+        orders = [Order(user_id=user_id, items=[], total_price=100.0 * (i + 1), delivery_method=method, status="pending")
+                  for i, method in enumerate(["cdek", "post", "cdek"])]
+        db.add_all(orders)
+        db.commit()
+        category_id = category.id
+        order_ids = [o.id for o in orders]
+    assert _stats() == _live_counts()
+
+    async def writes():
+        await mark_pending_orders(order_ids[:2], "paid")
+        await mark_pending_orders(order_ids[2:], "expired")
+        async with DatabaseManager.get_async_session() as db:
+            await delete_category(db, category_id)
+            await db.commit()
+
+    asyncio.run(writes())
+    counts, revenue, by_method = _stats()
+    assert (counts, revenue, by_method) == _live_counts()
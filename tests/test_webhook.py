@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Тест webhook-сервера: маршрутизация по пути, проверка секрета, прогон записанных обновлений
+"""
+
+import asyncio
+import pytest
+from pathlib import Path
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, CallbackQuery
+from replay_updates import load_updates, post_updates
+from webhook_server import WebhookTarget, create_app
+
+FIXTURES = Path(__file__).parent / "fixtures" / "updates"
+SECRET = "test-secret"
+
+
+def make_target(name: str, path: str, token: str, received: list) -> WebhookTarget:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def on_message(message: Message):
+        received.append((name, message.text))
+
+    @dp.callback_query()
+    async def on_callback(callback: CallbackQuery):
+        received.append((name, callback.data))
+
+    return WebhookTarget(path, dp, Bot(token=token))
+
+
+async def replay(bot: str, files: list[str], secret: str = SECRET):
+    received = []
+    targets = [
+        make_target("bot1", "/webhook/bot1", "123456:TEST_TOKEN_BOT1", received),
+        make_target("bot2", "/webhook/bot2", "654321:TEST_TOKEN_BOT2", received),
+    ]
+    app = create_app(targets, secret_token=SECRET, handle_in_background=False)
+    async with TestClient(TestServer(app)) as client:
+        statuses = await post_updates(client, f"/webhook/{bot}", load_updates(files), secret_token=secret)
+        health = await client.get("/healthz")
+        assert health.status == 200
+    return statuses, received
+
+
+def test_updates_are_routed_by_path():
+    statuses, received = asyncio.run(replay("bot2", [FIXTURES / "bot2_catalog.json"]))
+    assert statuses == [200, 200]
+    assert received == [("bot2", "/start"), ("bot2", "catalog")]
+
+    statuses, received = asyncio.run(replay("bot1", [FIXTURES / "bot1_start.json"]))
+    assert statuses == [200]
+    assert received == [("bot1", "/start")]
+
+
+def test_wrong_secret_is_rejected():
+    statuses, received = asyncio.run(replay("bot1", [FIXTURES / "bot1_start.json"], secret="wrong"))
+    assert statuses == [401]
+    assert received == []
+
+
+def test_default_app_serves_both_bots():
+    app = create_app(secret_token=SECRET)
+    paths = {resource.canonical for resource in app.router.resources()}
+    assert {"/webhook/bot1", "/webhook/bot2", "/webhook/yookassa", "/healthz"} <= paths
+
+
+def test_app_without_secret_is_refused():
+    with pytest.raises(ValueError):
+        create_app([], secret_token="")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Webhook-режим: оба бота на одном aiohttp-сервере.
+
+Каждый бот получает обновления POST-запросами на свой путь
+(WEBHOOK_PATH_BOT1 / WEBHOOK_PATH_BOT2). WEBHOOK_SECRET обязателен: пути
+предсказуемы, и без секрета любой мог бы прислать поддельное обновление
+от имени администратора. Запросы без совпадающего заголовка
+X-Telegram-Bot-Api-Secret-Token отклоняются.
+На PAYMENT_WEBHOOK_PATH принимаются уведомления Юкассы (payment_webhook.py).
+GET /healthz — проверка живости для балансировщика.
+"""
+
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from payment_webhook import PaymentWebhookHandler
+from config import (
+    WEBHOOK_BASE_URL, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_PATH_BOT1, WEBHOOK_PATH_BOT2, WEBHOOK_SECRET
+)
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookTarget(NamedTuple):
+    """Путь вебхука и бот с диспетчером, которые его обслуживают"""
+    path: str
+    dispatcher: Dispatcher
+    bot: Bot
+
+
+def default_targets() -> list[WebhookTarget]:
+    """Оба бота проекта"""
+    import bot1_main
+    import bot2_catalog
+    return [
+        WebhookTarget(WEBHOOK_PATH_BOT1, bot1_main.dp, bot1_main.bot),
+        WebhookTarget(WEBHOOK_PATH_BOT2, bot2_catalog.dp, bot2_catalog.bot),
+    ]
+
+
+async def healthcheck(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+def create_app(targets: Optional[list[WebhookTarget]] = None, secret_token: str = WEBHOOK_SECRET,
+               handle_in_background: bool = True, payment_bot: Optional[Bot] = None) -> web.Application:
+    """Собирает aiohttp-приложение с обработчиком на каждого бота.
+
+    handle_in_background=True отвечает Telegram сразу, не дожидаясь
+    обработчика; False удобнее в тестах — ответ приходит после обработки.
+    payment_bot — бот, который сообщает об оплате по уведомлению Юкассы
+    (для ботов проекта — основной).
+    """
+    if not secret_token:
+        raise ValueError("WEBHOOK_SECRET не задан: webhook-режим без секрета не запускается")
+    if targets is None:
+        targets = default_targets()
+        payment_bot = payment_bot or targets[0].bot
+    app = web.Application()
+    for target in targets:
+        SimpleRequestHandler(
+            dispatcher=target.dispatcher,
+            bot=target.bot,
+            secret_token=secret_token,
+            handle_in_background=handle_in_background
+        ).register(app, path=target.path)
+        setup_application(app, target.dispatcher, bot=target.bot)
+    if payment_bot is not None:
+        PaymentWebhookHandler(payment_bot).register(app)
+    app.router.add_get("/healthz", healthcheck)
+    return app
+
+
+async def set_webhooks(targets: list[WebhookTarget], base_url: str = WEBHOOK_BASE_URL,
+                       secret_token: str = WEBHOOK_SECRET):
+    """Регистрирует вебхуки в Telegram (повторный вызов с тем же адресом безопасен)"""
+    for target in targets:
+        url = f"{base_url.rstrip('/')}{target.path}"
+        await target.bot.set_webhook(
+            url,
+            secret_token=secret_token or None,
+            allowed_updates=target.dispatcher.resolve_used_update_types()
+        )
+        logger.info(f"Вебхук установлен: {url}")
+
+
+async def main():
+    """Запуск обоих ботов в webhook-режиме"""
+    targets = default_targets()
+    # Приложение собирается до регистрации вебхуков: без секрета запуск прерывается сразу
+    app = create_app(targets, payment_bot=targets[0].bot)
+    if WEBHOOK_BASE_URL:
+        await set_webhooks(targets)
+    else:
+        logger.warning("WEBHOOK_BASE_URL не задан: вебхуки в Telegram не регистрируются")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info(f"Webhook-сервер слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())